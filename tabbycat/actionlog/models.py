@@ -62,6 +62,7 @@ class ActionLogEntry(models.Model):
         DRAW_CREATE                       = 'dr.crea', _("Created draw")
         DRAW_REGENERATE                   = 'dr.rege', _("Regenerated draw")
         DRAW_RELEASE                      = 'dr.rele', _("Released draw")
+        DRAW_UPDATE                       = 'dr.upda', _("Updated draw for availability changes")
         DRAW_UNRELEASE                    = 'dr.unre', _("Unreleased draw")
         FEEDBACK_QUESTION_CREATE          = 'fq.crea', _("Created feedback question")
         FEEDBACK_QUESTION_EDIT            = 'fq.edit', _("Edited feedback question")
@@ -1,8 +1,12 @@
 import logging
 from warnings import warn
 
+from django.db import transaction
+
 from adjallocation.models import DebateAdjudicator
 
+from .index import queue_debates
+
 logger = logging.getLogger(__name__)
 
 
@@ -196,10 +200,75 @@ class AdjudicatorAllocation:
         self.trainees = []
 
     def save(self):
-        self.container.related_adjudicator_set.exclude(adjudicator__in=self.all()).delete()
-        for adj, t in self.with_debateadj_types():
-            if not adj:
-                continue
-            _, created = self.container.related_adjudicator_set.update_or_create(
-                    adjudicator=adj, defaults={'type': t})
-            logger.debug("%s: %s, %s, %s", "Created" if created else "Updated", self.container, adj, t)
+        save_allocations([self])
+
+
+def save_allocations(allocations):
+    """Saves the given allocations to the database. All containers must be
+    of the same model (e.g., all debates or all preformed panels).
+
+    This compares the allocations with the existing adjudicator rows of all
+    their containers at once, then deletes, updates and creates rows as
+    needed, using one query for each, in a single transaction. This is
+    equivalent to, but much faster than, calling `save()` on each allocation.
+    Containers that aren't in `allocations` are left alone.
+
+    Returns the set of primary keys of containers whose adjudicators changed.
+    """
+
+    allocations = list(allocations)
+    if not allocations:
+        return set()
+
+    manager = allocations[0].container.related_adjudicator_set
+
+    wanted = {}
+    for aa in allocations:
+        for adj, t in aa.with_debateadj_types():
+            if adj:
+                wanted[(aa.container.pk, adj.pk)] = t
+
+    return save_adjudicator_rows(manager.model, manager.field.name,
+        [aa.container.pk for aa in allocations], wanted)
+
+
+def save_adjudicator_rows(model, fk_name, container_ids, wanted):
+    """Does the work of `save_allocations()`, given the adjudicator row model
+    (e.g. `DebateAdjudicator`), the name of its foreign key to containers
+    (e.g. 'debate'), the primary keys of the containers to save, and a dict
+    mapping `(container_id, adjudicator_id)` tuples to `DebateAdjudicator.TYPE_*`
+    constants for every adjudicator that should be in those containers.
+
+    Returns the set of primary keys of containers whose adjudicators changed.
+    """
+    wanted = dict(wanted)
+
+    with transaction.atomic():
+        existing = model.objects.filter(**{fk_name + '__in': container_ids}).select_for_update()
+        to_delete = []
+        to_update = []
+        changed = set()
+        for row in existing:
+            container_id = getattr(row, fk_name + '_id')
+            t = wanted.pop((container_id, row.adjudicator_id), None)
+            if t is None:
+                to_delete.append(row.pk)
+                changed.add(container_id)
+            elif row.type != t:
+                row.type = t
+                to_update.append(row)
+                changed.add(container_id)
+        to_create = [model(**{fk_name + '_id': container_id, 'adjudicator_id': adj_id, 'type': t})
+                     for (container_id, adj_id), t in wanted.items()]
+        changed.update(container_id for container_id, adj_id in wanted)
+
+        model.objects.filter(pk__in=to_delete).delete()
+        model.objects.bulk_update(to_update, ['type'])
+        model.objects.bulk_create(to_create)
+
+        if model is DebateAdjudicator and to_create:
+            queue_debates({container_id for container_id, adj_id in wanted})  # bulk_create() doesn't send signals
+
+    logger.debug("Saved adjudicators for %d %ss: deleted %d, updated %d, created %d",
+        len(container_ids), fk_name, len(to_delete), len(to_update), len(to_create))
+    return changed
@@ -7,6 +7,7 @@ from draw.models import Debate
 from participants.models import Team
 
 from ..conflicts import ConflictsInfo, HistoryInfo
+from ..models import DebateAdjudicator
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,50 @@ class AdjudicatorAllocationError(RuntimeError):
     pass
 
 
+def residual_allocation_problem(containers, adjudicators, changed_containers=(), changed_adjudicators=()):
+    """Returns the part of an allocation problem that needs to be re-solved
+    after some changes, as a tuple `(containers, adjudicators)` that can be
+    passed to an allocator.
+
+    A container (debate or preformed panel) needs to be reallocated if it is
+    in `changed_containers`, if it has no chair, or if any adjudicator on its
+    panel is in `changed_adjudicators` or isn't in `adjudicators` (e.g.,
+    because they were withdrawn or marked unavailable). All other panels are
+    kept as they are, so the adjudicators returned are those in `adjudicators`
+    who aren't on a kept panel. All containers must be of the same model."""
+
+    containers = list(containers)
+    adjudicators = list(adjudicators)
+    if not containers:
+        return [], adjudicators
+
+    manager = containers[0].related_adjudicator_set
+    fk_name = manager.field.name
+    rows = manager.model.objects.filter(**{fk_name + '__in': containers}).values_list(
+        fk_name + '_id', 'adjudicator_id', 'type')
+
+    available_ids = {adj.id for adj in adjudicators}
+    changed_adj_ids = {getattr(adj, 'id', adj) for adj in changed_adjudicators}
+    affected_ids = {getattr(container, 'id', container) for container in changed_containers}
+    panels = {}
+    chaired = set()
+    for container_id, adj_id, adjtype in rows:
+        panels.setdefault(container_id, set()).add(adj_id)
+        if adjtype == DebateAdjudicator.TYPE_CHAIR:
+            chaired.add(container_id)
+        if adj_id in changed_adj_ids or adj_id not in available_ids:
+            affected_ids.add(container_id)
+
+    affected = [c for c in containers if c.id in affected_ids or c.id not in chaired]
+    kept_adj_ids = set().union(*(adj_ids for container_id, adj_ids in panels.items()
+                                 if container_id not in affected_ids and container_id in chaired))
+    residual_adjs = [adj for adj in adjudicators if adj.id not in kept_adj_ids]
+
+    logger.info("Residual allocation problem: %d of %d %ss, %d of %d adjudicators",
+        len(affected), len(containers), fk_name, len(residual_adjs), len(adjudicators))
+    return affected, residual_adjs
+
+
 class BaseAdjudicatorAllocator:
 
     def __init__(self, debates, adjudicators, round):
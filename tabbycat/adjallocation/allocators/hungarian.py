@@ -1,9 +1,11 @@
 import logging
 import random
 from math import exp
+from time import perf_counter
 
+import numpy as np
 from django.utils.translation import gettext as _, ngettext
-from munkres import Munkres
+from scipy.optimize import linear_sum_assignment
 
 from .base import AdjudicatorAllocationError, BaseAdjudicatorAllocator, register
 from ..allocation import AdjudicatorAllocation
@@ -24,14 +26,16 @@ class BaseHungarianAllocator(BaseAdjudicatorAllocator):
         self.history_penalty = t.pref('adj_history_penalty')
         self.no_panellists = t.pref('no_panellist_position')
         self.no_trainees = t.pref('no_trainee_position')
+        self.refinement_time = t.pref('adj_refinement_time')
         self.feedback_weight = self.round.feedback_weight
         self.user_warnings = []  # Surfaced to users for non-error disclosures
 
-        self.munkres = Munkres()
-
     def allocate(self):
         self.populate_adj_scores(self.adjudicators)
-        return self.run_allocation(), self.user_warnings
+        allocation = self.run_allocation()
+        if self.refinement_time > 0:
+            self.refine_allocation(allocation, self.refinement_time / 1000)
+        return allocation, self.user_warnings
 
     def populate_adj_scores(self, adjudicators):
         score_min = self.min_score
@@ -85,20 +89,61 @@ class BaseHungarianAllocator(BaseAdjudicatorAllocator):
 
         return cost
 
+    def calc_cost_matrix(self, debates, adjudicators, adjustments=0.0, chairs=None):
+        """Array version of calc_cost(). Returns an array whose (i, j) element
+        is the cost of putting `adjudicators[j]` in `debates[i]`, with
+        adjustment `adjustments[i]` and chair `chairs[i]`. A debate can appear
+        in `debates` more than once, once for each position on its panel."""
+        n = len(debates)
+        adjustments = np.broadcast_to(np.asarray(adjustments, dtype=float), (n,))
+        scores = np.array([adj._normalized_score for adj in adjudicators], dtype=float)
+        costs = np.zeros((n, len(adjudicators)))
+
+        # Conflicts and history with teams, summed over the teams in each debate
+        teams = list({team.id: team for debate in debates for team in debate.teams}.values())
+        if teams:
+            team_index = {team.id: k for k, team in enumerate(teams)}
+            incidence = np.zeros((n, len(teams)))
+            for i, debate in enumerate(debates):
+                for team in debate.teams:
+                    incidence[i, team_index[team.id]] += 1
+            team_costs = (self.conflict_penalty * self.conflicts.conflict_adj_team_matrix(adjudicators, teams) +
+                          self.history_penalty * self.history.seen_adj_team_matrix(adjudicators, teams))
+            costs += incidence @ team_costs.T
+
+        # Conflicts and history with the chair
+        if chairs is not None:
+            rows = [i for i, chair in enumerate(chairs) if chair]
+            chairs = [chairs[i] for i in rows]
+            costs[rows] += (self.conflict_penalty * self.conflicts.conflict_adj_adj_matrix(adjudicators, chairs) +
+                            self.history_penalty * self.history.seen_adj_adj_matrix(adjudicators, chairs)).T
+
+        # Normalise debate importances back to the 1-5 (not ±2) range expected
+        impt = np.array([debate.importance for debate in debates], dtype=float) + 3 + adjustments
+        diff = 5 + impt[:, None] - scores[None, :]
+        costs += np.where(diff > 0.25, 1000 * np.exp(diff - 0.25), 0)
+
+        costs += self.max_score - scores[None, :]
+
+        return costs
+
+    @staticmethod
+    def solve(cost_matrix):
+        """Returns a list of (row, column) pairs that minimizes the total cost."""
+        rows, cols = linear_sum_assignment(cost_matrix)
+        return list(zip(rows.tolist(), cols.tolist()))
+
     def allocate_trainees(self, trainees, allocation, debates):
         if len(trainees) > 0 and len(debates) > 0:
             allocation_by_debate = {aa.container: aa for aa in allocation}
 
             logger.info("costing trainees")
-            cost_matrix = []
-            for debate in debates:
-                chair = allocation_by_debate[debate].chair
-                row = [self.calc_cost(debate, adj, adjustment=-2.0, chair=chair) for adj in trainees]
-                cost_matrix.append(row)
-
-            logger.info("optimizing trainees (matrix size: %d positions by %d trainees)", len(cost_matrix), len(cost_matrix[0]))
-            indices = self.munkres.compute(cost_matrix)
-            total_cost = sum(cost_matrix[i][j] for i, j in indices)
+            chairs = [allocation_by_debate[debate].chair for debate in debates]
+            cost_matrix = self.calc_cost_matrix(debates, trainees, adjustments=-2.0, chairs=chairs)
+
+            logger.info("optimizing trainees (matrix size: %d positions by %d trainees)", *cost_matrix.shape)
+            indices = self.solve(cost_matrix)
+            total_cost = sum(cost_matrix[i, j] for i, j in indices)
             logger.info('total cost for %d trainees: %f', len(indices), total_cost)
 
             result = ((debates[i], trainees[j]) for i, j in indices if i < len(debates))
@@ -106,6 +151,126 @@ class BaseHungarianAllocator(BaseAdjudicatorAllocator):
                 allocation_by_debate[debate].trainees.append(trainee)
                 logger.info("allocating to %s: %s (t)", debate, trainee)
 
+    def panel_cost_matrices(self, debates, positions, adjs):
+        """Returns the matrices used to evaluate whole panels in
+        `refine_allocation()`, for the adjudicators `adjs`:
+        - a list with an array for each debate, whose (r, k) element is the
+          cost of putting adjudicator k in the r-th position on the panel of
+          `debates[i]`, where `positions[i]` lists the adjustments of the
+          positions, ignoring the rest of the panel, and
+        - a symmetric array whose (k, l) element is the cost of adjudicators k
+          and l being on the same panel."""
+        rows = [debate for debate, adjustments in zip(debates, positions) for _ in adjustments]
+        adjustments = [adjustment for adjustments in positions for adjustment in adjustments]
+        unary = self.calc_cost_matrix(rows, adjs, adjustments)
+        unary = np.split(unary, np.cumsum([len(adjustments) for adjustments in positions])[:-1])
+
+        conflicts = self.conflicts.conflict_adj_adj_matrix(adjs, adjs)
+        history = self.history.seen_adj_adj_matrix(adjs, adjs)
+        pairs = (self.conflict_penalty * np.maximum(conflicts, conflicts.T) +
+                 self.history_penalty * np.maximum(history, history.T))
+        np.fill_diagonal(pairs, 0)
+        return unary, pairs
+
+    def panel_positions(self, aa):
+        """Returns the adjustments of the positions on the panel of `aa`, as
+        used by `run_allocation()`, with voting positions first in descending
+        order, then trainee positions. If the panel has fewer voting
+        adjudicators than positions, the least demanding are used, as that's
+        what the Hungarian algorithm would fill."""
+        n_voting = 1 + len(aa.panellists)
+        adjustments = sorted(self.position_adjustments.get(aa.container, ()))[:n_voting]
+        adjustments += [0.0] * (n_voting - len(adjustments))
+        return sorted(adjustments, reverse=True) + [-2.0] * len(aa.trainees)
+
+    def refine_allocation(self, allocation, time_limit):
+        """Improves `allocation` in place by simulated annealing, for at most
+        `time_limit` seconds. Each step exchanges two voting adjudicators (or
+        two trainees) between different panels. Panels are costed with the
+        same position adjustments as in `run_allocation()`, but unlike the
+        Hungarian algorithm, this evaluates conflicts and history between every
+        pair of adjudicators on a panel, not just those involving the chair.
+        The best allocation found is kept, and the highest-scoring voting
+        adjudicator on each panel is then made its chair."""
+        allocation = [aa for aa in allocation if aa.chair is not None]
+        if len(allocation) < 2:
+            return
+
+        voting = [adj for aa in allocation for adj in [aa.chair] + aa.panellists]
+        trainees = [adj for aa in allocation for adj in aa.trainees]
+        adjs = voting + trainees
+        debates = [aa.container for aa in allocation]
+        unary, pairs = self.panel_cost_matrices(debates, [self.panel_positions(aa) for aa in allocation], adjs)
+        scores = [adj._normalized_score for adj in adjs]
+
+        # Each panel is a list of indices into adjs
+        panels = []
+        k = 0
+        for aa in allocation:
+            size = 1 + len(aa.panellists)
+            panels.append(list(range(k, k + size)))
+            k += size
+        for aa, panel in zip(allocation, panels):
+            panel.extend(range(k, k + len(aa.trainees)))
+            k += len(aa.trainees)
+        n_voting = len(voting)
+
+        def panel_cost(i, panel):
+            # The highest-scoring voting adjudicators take the most demanding
+            # positions, which minimizes the cost, as the cost of a position
+            # grows convexly with its adjustment less the adjudicator's score
+            members = sorted((k for k in panel if k < n_voting), key=lambda k: -scores[k])
+            members.extend(k for k in panel if k >= n_voting)
+            return unary[i][np.arange(len(members)), members].sum() + pairs[np.ix_(panel, panel)].sum() / 2
+
+        panel_costs = [panel_cost(i, panel) for i, panel in enumerate(panels)]
+        cost = initial_cost = sum(panel_costs)
+        best_cost, best_panels = cost, [list(panel) for panel in panels]
+
+        # Temperatures decrease geometrically over the time limit
+        start_temp = max(self.history_penalty, 1) / 10
+        end_temp = start_temp / 1000
+        temp = start_temp
+        start = perf_counter()
+        iterations = 0
+
+        while True:
+            if iterations % 100 == 0:
+                elapsed = (perf_counter() - start) / time_limit
+                if elapsed >= 1:
+                    break
+                temp = start_temp * (end_temp / start_temp) ** elapsed
+            iterations += 1
+
+            p, q = random.sample(range(len(panels)), 2)
+            panel_p, panel_q = panels[p], panels[q]
+            i = random.randrange(len(panel_p))
+            j = random.randrange(len(panel_q))
+            a, b = panel_p[i], panel_q[j]
+            if (a < n_voting) != (b < n_voting):
+                continue
+
+            panel_p[i], panel_q[j] = b, a
+            cost_p, cost_q = panel_cost(p, panel_p), panel_cost(q, panel_q)
+            delta = cost_p + cost_q - panel_costs[p] - panel_costs[q]
+            if delta > 0 and random.random() >= exp(-delta / temp):
+                panel_p[i], panel_q[j] = a, b
+                continue
+
+            panel_costs[p], panel_costs[q] = cost_p, cost_q
+            cost += delta
+            if cost < best_cost - 1e-9:
+                best_cost, best_panels = cost, [list(panel) for panel in panels]
+
+        logger.info("refined allocation in %d iterations: cost %f -> %f", iterations, initial_cost, best_cost)
+
+        for aa, panel in zip(allocation, best_panels):
+            panel_voting = sorted((adjs[k] for k in panel if k < n_voting),
+                                  key=lambda a: a._normalized_score, reverse=True)
+            aa.chair = panel_voting[0]
+            aa.panellists = panel_voting[1:]
+            aa.trainees = [adjs[k] for k in panel if k >= n_voting]
+
     def check_matrix_exists(self, n_debates, n_voting):
         if n_voting == 0:
             info = _("There are no adjudicators eligible to be a chair or "
@@ -158,6 +323,7 @@ class VotingHungarianAllocator(BaseHungarianAllocator):
         debates_sorted = sorted(self.debates, key=lambda d: (-d.importance, d.room_rank))
         solo_debates = debates_sorted[:len(solos)]
         panel_debates = debates_sorted[len(solos):]
+        self.position_adjustments = {debate: [0.0] for debate in solo_debates}
 
         logger.info("There are %d debates (%d solo, %d panel), %d solos, %d panellists "
                 "(including chairs) and %d trainees.", len(debates_sorted), len(solo_debates),
@@ -180,14 +346,11 @@ class VotingHungarianAllocator(BaseHungarianAllocator):
 
         if len(solos) > 0 and len(solo_debates) > 0:
             logger.info("costing solos")
-            cost_matrix = []
-            for debate in solo_debates:
-                row = [self.calc_cost(debate, adj) for adj in solos]
-                cost_matrix.append(row)
-
-            logger.info("optimizing solos (matrix size: %d positions by %d adjudicators)", len(cost_matrix), len(cost_matrix[0]))
-            indices = self.munkres.compute(cost_matrix)
-            total_cost = sum(cost_matrix[i][j] for i, j in indices)
+            cost_matrix = self.calc_cost_matrix(solo_debates, solos)
+
+            logger.info("optimizing solos (matrix size: %d positions by %d adjudicators)", *cost_matrix.shape)
+            indices = self.solve(cost_matrix)
+            total_cost = sum(cost_matrix[i, j] for i, j in indices)
             logger.info('total cost for %d solo debates: %f', len(solos), total_cost)
 
             result = ((solo_debates[i], solos[j]) for i, j in indices if i < len(solo_debates))
@@ -202,18 +365,20 @@ class VotingHungarianAllocator(BaseHungarianAllocator):
         # Allocate panellists
         if len(panellists) > 0 and len(panel_debates) > 0:
             logger.info("costing panellists")
-            cost_matrix = []
+            positions = []
+            adjustments = []
             for i, debate in enumerate(panel_debates):
                 for j in range(3):
                     # for the top half of these debates, the final panellist
                     # can be of lower quality than the other 2
-                    adjustment = -1.0 if i < len(panel_debates)/2 and j == 2 else 0.0
-                    row = [self.calc_cost(debate, adj, adjustment) for adj in panellists]
-                    cost_matrix.append(row)
-
-            logger.info("optimizing panellists (matrix size: %d positions by %d adjudicators)", len(cost_matrix), len(cost_matrix[0]))
-            indices = self.munkres.compute(cost_matrix)
-            total_cost = sum(cost_matrix[i][j] for i, j in indices)
+                    positions.append(debate)
+                    adjustments.append(-1.0 if i < len(panel_debates)/2 and j == 2 else 0.0)
+                    self.position_adjustments.setdefault(debate, []).append(adjustments[-1])
+            cost_matrix = self.calc_cost_matrix(positions, panellists, adjustments)
+
+            logger.info("optimizing panellists (matrix size: %d positions by %d adjudicators)", *cost_matrix.shape)
+            indices = self.solve(cost_matrix)
+            total_cost = sum(cost_matrix[i, j] for i, j in indices)
             logger.info('total cost for %d panel debates: %f', len(panel_debates), total_cost)
 
             # transfer the indices to the debates
@@ -289,17 +454,21 @@ class ConsensusHungarianAllocator(BaseHungarianAllocator):
 
         # Allocate voting
         logger.info("costing voting adjudicators")
-        cost_matrix = []
+        positions = []
+        adjustments = []
         for debate, njudges in zip(debates_sorted, judges_per_room):
             for i in range(njudges):
-                row = [self.calc_cost(debate, adj, adjustment=-i) for adj in voting]
-                cost_matrix.append(row)
+                positions.append(debate)
+                adjustments.append(-i)
+        self.position_adjustments = {debate: [-i for i in range(njudges)]
+                                     for debate, njudges in zip(debates_sorted, judges_per_room)}
+        cost_matrix = self.calc_cost_matrix(positions, voting, adjustments)
 
         logger.info("optimizing voting adjudicators (matrix size: %d positions by %d adjudicators)",
-                len(cost_matrix), len(cost_matrix[0]))
-        indices = self.munkres.compute(cost_matrix)
+                *cost_matrix.shape)
+        indices = self.solve(cost_matrix)
         indices.sort()
-        total_cost = sum(cost_matrix[i][j] for i, j in indices)
+        total_cost = sum(cost_matrix[i, j] for i, j in indices)
         logger.info('total cost for %d debates: %f', n_debates, total_cost)
 
         # transfer the indices to the debates
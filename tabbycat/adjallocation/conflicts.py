@@ -4,14 +4,46 @@ import logging
 from itertools import combinations, product
 from typing import Dict, List, Tuple, TypedDict
 
-from adjallocation.models import (AdjudicatorAdjudicatorConflict, AdjudicatorInstitutionConflict,
-                     AdjudicatorTeamConflict, TeamInstitutionConflict)
-from draw.models import Debate
-from participants.models import Adjudicator, Team
+import numpy as np
+
+from participants.models import Adjudicator, Institution, Team
+
+from .index import get_conflicts, get_conflicts_index, get_history_indices
 
 logger = logging.getLogger(__name__)
 
 
+def _pairs_matrix(pairs, rows, cols):
+    """Returns a boolean array whose (i, j) element is True if
+    `(rows[i].id, cols[j].id)` is in `pairs`."""
+    matrix = np.zeros((len(rows), len(cols)), dtype=bool)
+    row_index, col_index = {}, {}
+    for i, obj in enumerate(rows):
+        row_index.setdefault(obj.id, []).append(i)
+    for j, obj in enumerate(cols):
+        col_index.setdefault(obj.id, []).append(j)
+    for id1, id2 in pairs:
+        if id1 in row_index and id2 in col_index:
+            matrix[np.ix_(row_index[id1], col_index[id2])] = True
+    return matrix
+
+
+def _overlap_matrix(sets1, sets2):
+    """Returns a boolean array whose (i, j) element is True if `sets1[i]`
+    and `sets2[j]` have an element in common."""
+    index = {}
+    for s in list(sets1) + list(sets2):
+        for x in s:
+            index.setdefault(x, len(index))
+    incidence1 = np.zeros((len(sets1), len(index)), dtype=int)
+    incidence2 = np.zeros((len(sets2), len(index)), dtype=int)
+    for i, s in enumerate(sets1):
+        incidence1[i, [index[x] for x in s]] = 1
+    for j, s in enumerate(sets2):
+        incidence2[j, [index[x] for x in s]] = 1
+    return (incidence1 @ incidence2.T) > 0
+
+
 class AdjudicatorConflicts(TypedDict):
     class Conflict(TypedDict):
         ago: int
@@ -28,9 +60,8 @@ class ConflictsInfo:
     """Manages information about conflicts between participants.
 
     The main purpose of this class is to streamline queries about conflicts.
-    This class hits the database once, on creation, with one query per type of
-    conflict (adjudicator-team, adjudicator-adjudicator, adjudicator-institution
-    and adjudicator-team). It then can be used to find efficiently whether
+    This class loads the conflicts index of the tournament (see `index.py`)
+    once, on creation, usually in one cache hit. It then can be used to find efficiently whether
     particular participants conflict, without a need for further SQL queries or
     excessive data processing.
 
@@ -49,13 +80,26 @@ class ConflictsInfo:
         self._fetch_conflicts_from_db()
 
     def _fetch_conflicts_from_db(self):
-        """Fetches relevant conflicts from the database, based on `self.teams`
-        and `self.adjudicators`."""
+        """Fetches relevant conflicts from the conflicts index (see `index.py`),
+        based on `self.teams` and `self.adjudicators`."""
 
         # Refresh `self.adjudicator_ids` and `self.team_ids`
         self.adjudicator_ids = {adj.id for adj in self.adjudicators}
         self.team_ids = {team.id for team in self.teams}
 
+        # Conflicts indices are per tournament. Shared adjudicators are in
+        # every tournament's index, but if there's no tournament to go by,
+        # their conflicts come straight from the database.
+        tournament_ids = {team.tournament_id for team in self.teams}
+        tournament_ids.update(adj.tournament_id for adj in self.adjudicators if adj.tournament_id is not None)
+        if not tournament_ids:
+            index = get_conflicts(self.adjudicator_ids)
+        elif len(tournament_ids) == 1:
+            index = get_conflicts_index(tournament_ids.pop())
+        else:
+            indices = [get_conflicts_index(tournament_id) for tournament_id in tournament_ids]
+            index = {kind: set().union(*(i[kind] for i in indices)) for kind in indices[0]}
+
         # Adjudicator-team and adjudicator-adjudicator conflicts are stored as
         # sets of primary keys. Primary keys to avoid having to select_related
         # all the teams and adjudicators from the database, and sets so that
@@ -63,49 +107,34 @@ class ConflictsInfo:
         # rather than an array (O(n)). Adjudicator pairs are stored both ways
         # round, i.e. under both `(adj1.id, adj2.id)` and `(adj2.id, adj1.id)`.
 
-        adjteamconflict_instances = AdjudicatorTeamConflict.objects.filter(
-            adjudicator__in=self.adjudicators,
-            team__in=self.teams,
-        ).distinct()
-        self.adjteamconflicts = {(c.adjudicator_id, c.team_id) for c in adjteamconflict_instances}
-
-        adjadjconflict_instances = AdjudicatorAdjudicatorConflict.objects.filter(
-            adjudicator1__in=self.adjudicators,
-            adjudicator2__in=self.adjudicators,
-        ).distinct()
-        self.adjadjconflicts = set()
-        for conflict in adjadjconflict_instances:
-            self.adjadjconflicts.add((conflict.adjudicator1_id, conflict.adjudicator2_id))
-            self.adjadjconflicts.add((conflict.adjudicator2_id, conflict.adjudicator1_id))
+        self.adjteamconflicts = {(adj_id, team_id) for adj_id, team_id in index['adjteam']
+                                 if adj_id in self.adjudicator_ids and team_id in self.team_ids}
+        self.adjadjconflicts = {(adj1_id, adj2_id) for adj1_id, adj2_id in index['adjadj']
+                                if adj1_id in self.adjudicator_ids and adj2_id in self.adjudicator_ids}
 
         # Adjudicator-institution and team-institution conflicts are stored as
-        # sets, which in turn are in dicts whose keys are the adjudicator/team
-        # primary keys. The sets contain the entire institution objects, since
-        # it's useful in some contexts to be able to grab institution details
-        # quickly from them. They're sets to allow the use of the set
-        # intersection operator to check for institution overlap.
-
-        teaminstconflict_instances = TeamInstitutionConflict.objects.filter(
-            team__in=self.teams,
-        ).select_related('institution').distinct()
+        # sets of institution primary keys, which in turn are in dicts whose
+        # keys are the adjudicator/team primary keys. They're sets to allow the
+        # use of the set intersection operator to check for institution overlap.
+        # The institutions themselves are only fetched if they're needed.
+
         self.teaminstconflicts = {team_id: set() for team_id in self.team_ids}
-        for conflict in teaminstconflict_instances:
-            if conflict.team_id in self.teaminstconflicts:
-                self.teaminstconflicts[conflict.team_id].add(conflict.institution)
-            else:
-                logger.warning("Couldnt add conflict for team ID %s to \
-                                institution %s" % (conflict.team_id, conflict.institution))
-
-        adjinstconflict_instances = AdjudicatorInstitutionConflict.objects.filter(
-            adjudicator__in=self.adjudicators,
-        ).select_related('institution').distinct()
+        for team_id, institution_id in index['teaminst']:
+            if team_id in self.teaminstconflicts:
+                self.teaminstconflicts[team_id].add(institution_id)
+
         self.adjinstconflicts = {adj_id: set() for adj_id in self.adjudicator_ids}
-        for conflict in adjinstconflict_instances:
-            if conflict.adjudicator_id in self.adjinstconflicts:
-                self.adjinstconflicts[conflict.adjudicator_id].add(conflict.institution)
-            else:
-                logger.warning("Couldnt add conflict for adjudicator ID %s to \
-                                institution %s" % (conflict.adjudicator_id, conflict.institution))
+        for adj_id, institution_id in index['adjinst']:
+            if adj_id in self.adjinstconflicts:
+                self.adjinstconflicts[adj_id].add(institution_id)
+
+        self._institutions = None
+
+    def _get_institutions(self, institution_ids):
+        if self._institutions is None:
+            all_ids = set().union(*self.teaminstconflicts.values(), *self.adjinstconflicts.values())
+            self._institutions = Institution.objects.in_bulk(all_ids)
+        return {self._institutions[institution_id] for institution_id in institution_ids}
 
     def personal_conflict_adj_team(self, adj, team):
         """Returns True if the adjudicator and team personally conflict."""
@@ -121,11 +150,11 @@ class ConflictsInfo:
 
     def conflicting_institutions_adj_team(self, adj, team):
         """Returns a set of institutions that the adjudicator and team share."""
-        return self.adjinstconflicts[adj.id] & self.teaminstconflicts[team.id]
+        return self._get_institutions(self.adjinstconflicts[adj.id] & self.teaminstconflicts[team.id])
 
     def conflicting_institutions_adj_adj(self, adj1, adj2):
         """Returns a set of institutions that the two adjudicators share."""
-        return self.adjinstconflicts[adj1.id] & self.adjinstconflicts[adj2.id]
+        return self._get_institutions(self.adjinstconflicts[adj1.id] & self.adjinstconflicts[adj2.id])
 
     def institutional_conflict_adj_team(self, adj, team):
         """Returns True if the adjudicator and team share at least one institution."""
@@ -145,6 +174,25 @@ class ConflictsInfo:
         return (self.personal_conflict_adj_adj(adj1, adj2) or
                 self.institutional_conflict_adj_adj(adj1, adj2))
 
+    # Matrix versions of the above, for allocators that cost many pairs of
+    # participants at once. Rows and columns are in the order given.
+
+    def conflict_adj_team_matrix(self, adjudicators, teams):
+        """Returns a boolean array whose (i, j) element is True if
+        `adjudicators[i]` and `teams[j]` conflict."""
+        personal = _pairs_matrix(self.adjteamconflicts, adjudicators, teams)
+        institutional = _overlap_matrix([self.adjinstconflicts[adj.id] for adj in adjudicators],
+                                             [self.teaminstconflicts[team.id] for team in teams])
+        return personal | institutional
+
+    def conflict_adj_adj_matrix(self, adjudicators1, adjudicators2):
+        """Returns a boolean array whose (i, j) element is True if
+        `adjudicators1[i]` and `adjudicators2[j]` conflict."""
+        personal = _pairs_matrix(self.adjadjconflicts, adjudicators1, adjudicators2)
+        institutional = _overlap_matrix([self.adjinstconflicts[adj.id] for adj in adjudicators1],
+                                             [self.adjinstconflicts[adj.id] for adj in adjudicators2])
+        return personal | institutional
+
     def serialized_by_participant(self):
         """Returns a tuple of two dicts, mapping primary keys of teams and
         adjudicators respectively to a three-key dict
@@ -164,11 +212,11 @@ class ConflictsInfo:
         for adj1_id, adj2_id in self.adjadjconflicts:
             adjudicators[adj1_id]['adjudicator'].append({'id': adj2_id})
 
-        for team_id, institutions in self.teaminstconflicts.items():
-            teams[team_id]['institution'] = [{'id': inst.id} for inst in institutions]
+        for team_id, institution_ids in self.teaminstconflicts.items():
+            teams[team_id]['institution'] = [{'id': inst_id} for inst_id in institution_ids]
 
-        for adj_id, institutions in self.adjinstconflicts.items():
-            adjudicators[adj_id]['institution'] = [{'id': inst.id} for inst in institutions]
+        for adj_id, institution_ids in self.adjinstconflicts.items():
+            adjudicators[adj_id]['institution'] = [{'id': inst_id} for inst_id in institution_ids]
 
         return teams, adjudicators
 
@@ -180,10 +228,11 @@ class HistoryInfo:
     round.
 
     The main purpose of this class is to streamline queries about history. This
-    class hits the database once, on creation, with queries for
-    `DebateAdjudicator` and `DebateTeam`. It then can be used to find
-    efficiently whether particular participants have seen each other, without a
-    need for further SQL queries or excessive data processing.
+    class loads the history indices (see `index.py`) of previous rounds once,
+    on creation, usually with one query for the rounds and one cache hit. It
+    then can be used to find efficiently whether particular participants have
+    seen each other, without a need for further SQL queries or excessive data
+    processing.
 
     Although the attributes `self.adjteamhistories` and  `self.adjadjhistories`
     aren't marked as such, they should be treated a private implementation
@@ -197,20 +246,11 @@ class HistoryInfo:
         self._fetch_histories_from_db()
 
     def _fetch_histories_from_db(self):
-        """Fetches history information from the database, based on `self.teams`
-        and `self.adjudicators`."""
-
-        # The prefetches don't need `.select_related('adjudicator')` and
-        # `.select_related('team')`, because we only deal with the primary keys
-        # of adjudicators and teams.
+        """Fetches history information from the history indices (see
+        `index.py`) of all rounds before `self.round`."""
 
-        debates = Debate.objects.filter(
-            round__tournament=self.tournament,
-            round__seq__lt=self.round.seq,
-        ).prefetch_related(
-            'debateadjudicator_set',
-            'debateteam_set',
-        ).select_related('round')
+        rounds = dict(self.tournament.round_set.filter(seq__lt=self.round.seq).values_list('id', 'seq'))
+        indices = get_history_indices(rounds.keys())
 
         # Histories are stored in a dict, where keys are (adj.id, team.id) or
         # (adj1.id, adj2.id) tuples, and values are lists of `seq` integers
@@ -227,16 +267,13 @@ class HistoryInfo:
         self.adjteamhistories = {}
         self.adjadjhistories = {}
 
-        for debate in debates:
-            r = debate.round.seq
+        for round_id, r in sorted(rounds.items(), key=lambda item: item[1]):
+            for adj_ids, team_ids in indices[round_id].values():
+                for pair in product(adj_ids, team_ids):
+                    self.adjteamhistories.setdefault(pair, []).append(r)
 
-            for da, dt in product(debate.debateadjudicator_set.all(), debate.debateteam_set.all()):
-                pair = (da.adjudicator_id, dt.team_id)
-                self.adjteamhistories.setdefault(pair, []).append(r)
-
-            for da1, da2 in combinations(debate.debateadjudicator_set.all(), 2):
-                pair = (da1.adjudicator_id, da2.adjudicator_id)
-                self.adjadjhistories.setdefault(pair, []).append(r)
+                for pair in combinations(adj_ids, 2):
+                    self.adjadjhistories.setdefault(pair, []).append(r)
 
     def seen_adj_team(self, adj, team):
         """Returns True if the adjudicator has seen this team in the history
@@ -248,6 +285,16 @@ class HistoryInfo:
         covered by this object."""
         return (adj1.id, adj2.id) in self.adjadjhistories
 
+    def seen_adj_team_matrix(self, adjudicators, teams):
+        """Returns a boolean array whose (i, j) element is True if
+        `adjudicators[i]` has seen `teams[j]`."""
+        return _pairs_matrix(self.adjteamhistories.keys(), adjudicators, teams)
+
+    def seen_adj_adj_matrix(self, adjudicators1, adjudicators2):
+        """Returns a boolean array whose (i, j) element is True if
+        `adjudicators1[i]` and `adjudicators2[j]` have judged together."""
+        return _pairs_matrix(self.adjadjhistories.keys(), adjudicators1, adjudicators2)
+
     def serialized_by_participant(self) -> Tuple[Dict[int, TeamConflicts], Dict[int, AdjudicatorConflicts]]:
         """Returns a tuple of two dicts, mapping primary keys of teams and
         adjudicators respectively to a two-key dict
@@ -12,12 +12,13 @@ from draw.consumers import BaseAdjudicatorContainerConsumer, EditDebateOrPanelWo
 from participants.prefetch import populate_win_counts
 from tournaments.models import Round
 from users.permissions import Permission
+from utils.jobs import run_in_job_pool
 
-from .allocators.base import AdjudicatorAllocationError
+from .allocation import AdjudicatorAllocation, save_allocations
+from .allocators.base import AdjudicatorAllocationError, residual_allocation_problem
 from .allocators.hungarian import ConsensusHungarianAllocator, VotingHungarianAllocator
-from .models import PreformedPanel
-from .preformed import copy_panels_to_debates
-from .preformed.anticipated import calculate_anticipated_draw
+from .models import PreformedPanel, PreformedPanelAdjudicator
+from .preformed import copy_panels_to_debates, create_anticipated_panels
 from .preformed.direct import DirectPreformedPanelAllocator
 from .preformed.hungarian import HungarianPreformedPanelAllocator
 from .serializers import (EditPanelAdjsPanelSerializer,
@@ -30,6 +31,8 @@ logger = logging.getLogger(__name__)
 class PanelEditConsumer(BaseAdjudicatorContainerConsumer):
     group_prefix = 'panels'
     model = PreformedPanel
+    adjudicator_model = PreformedPanelAdjudicator
+    container_field = 'panel'
     importance_serializer = SimplePanelImportanceSerializer
     adjudicators_serializer = SimplePanelAllocationSerializer
     access_permission = Permission.EDIT_PREFORMEDPANELS
@@ -40,7 +43,8 @@ class AdjudicatorAllocationWorkerConsumer(EditDebateOrPanelWorkerMixin):
     def _apply_allocation_settings(self, round, settings):
         t = round.tournament
         for key, value in settings.items():
-            if key in ("usePreformedPanels", "allocationMethod"):
+            if key in ("usePreformedPanels", "allocationMethod", "incremental",
+                       "changedDebates", "changedAdjudicators"):
                 # Passing this here is much easier than splitting the function
                 continue # (Not actually a preference; just a toggle from Vue)
             # No way to force front-end to only accept floats/integers :(
@@ -53,6 +57,7 @@ class AdjudicatorAllocationWorkerConsumer(EditDebateOrPanelWorkerMixin):
             else:
                 t.preferences[key] = value
 
+    @run_in_job_pool
     def allocate_debate_adjs(self, event):
         round = Round.objects.get(pk=event['extra']['round_id'])
         self._apply_allocation_settings(round, event['extra']['settings'])
@@ -82,7 +87,7 @@ class AdjudicatorAllocationWorkerConsumer(EditDebateOrPanelWorkerMixin):
                 allocator = DirectPreformedPanelAllocator(debates, panels, round)
 
             debates, panels = allocator.allocate()
-            copy_panels_to_debates(debates, panels)
+            changed = copy_panels_to_debates(debates, panels)
 
             self.log_action(event['extra'], round, ActionLogEntry.ActionType.PREFORMED_PANELS_DEBATES_AUTO)
 
@@ -95,6 +100,16 @@ class AdjudicatorAllocationWorkerConsumer(EditDebateOrPanelWorkerMixin):
             debates = round.debate_set.all()
             adjs = round.active_adjudicators.all()
 
+            if event['extra']['settings'].get('incremental'):
+                # Only reallocate debates affected by changes, keeping all other panels
+                debates, adjs = residual_allocation_problem(debates, adjs,
+                    changed_containers=event['extra']['settings'].get('changedDebates', []),
+                    changed_adjudicators=event['extra']['settings'].get('changedAdjudicators', []))
+                if not debates:
+                    self.return_message(event['extra']['group_name'],
+                        _("No debates were affected by changes, so no adjudicators were reallocated."), 'info')
+                    return
+
             try:
                 if round.ballots_per_debate == 'per-adj':
                     allocator = VotingHungarianAllocator(debates, adjs, round)
@@ -105,8 +120,12 @@ class AdjudicatorAllocationWorkerConsumer(EditDebateOrPanelWorkerMixin):
                 self.return_error(event['extra']['group_name'], str(e))
                 return
 
-            for alloc in allocation:
-                alloc.save()
+            if event['extra']['settings'].get('incremental'):
+                # Clear affected debates that the allocator left without a panel
+                allocated = {aa.container for aa in allocation}
+                allocation.extend(AdjudicatorAllocation(d) for d in debates if d not in allocated)
+
+            changed = save_allocations(allocation)
 
             self.log_action(event['extra'], round, ActionLogEntry.ActionType.ADJUDICATORS_AUTO)
 
@@ -121,11 +140,13 @@ class AdjudicatorAllocationWorkerConsumer(EditDebateOrPanelWorkerMixin):
                 msg = _("Successfully auto-allocated adjudicators to debates.")
                 level = 'success'
 
-        # TODO: return debates directly from allocator function?
-        content = self.reserialize_debates(SimpleDebateAllocationSerializer, round)
+        # Only send the debates that changed; the others are already up to date
+        content = self.reserialize_debates(SimpleDebateAllocationSerializer, round,
+            round.debate_set.filter(id__in=changed))
 
         self.return_response(content, event['extra']['group_name'], msg, level)
 
+    @run_in_job_pool
     def allocate_panel_adjs(self, event):
         round = Round.objects.get(pk=event['extra']['round_id'])
         self._apply_allocation_settings(round, event['extra']['settings'])
@@ -150,11 +171,11 @@ class AdjudicatorAllocationWorkerConsumer(EditDebateOrPanelWorkerMixin):
             self.return_error(event['extra']['group_name'], str(e))
             return
 
-        for alloc in allocation:
-            alloc.save()
+        changed = save_allocations(allocation)
 
         self.log_action(event['extra'], round, ActionLogEntry.ActionType.PREFORMED_PANELS_ADJUDICATOR_AUTO)
-        content = self.reserialize_panels(SimplePanelAllocationSerializer, round)
+        content = self.reserialize_panels(SimplePanelAllocationSerializer, round,
+            round.preformedpanel_set.filter(id__in=changed))
 
         if user_warnings:
             msg = ngettext(
@@ -169,22 +190,35 @@ class AdjudicatorAllocationWorkerConsumer(EditDebateOrPanelWorkerMixin):
 
         self.return_response(content, event['extra']['group_name'], mark_safe(msg), level)
 
+    def _save_importances(self, instances, importances):
+        """Sets and saves importances, given as a list parallel to `instances`,
+        and returns the instances whose importance changed."""
+        changed = []
+        for instance, importance in zip(instances, importances):
+            if instance.importance != importance:
+                instance.importance = importance
+                changed.append(instance)
+        if changed:
+            type(changed[0]).objects.bulk_update(changed, ['importance'])
+        return changed
+
     def _prioritise_by_bracket(self, instances, bracket_attrname):
-        instances = instances.order_by('-' + bracket_attrname)
+        instances = list(instances.order_by('-' + bracket_attrname))
         nimportancelevels = 4
         importance = 1
         boundary = round(len(instances) / nimportancelevels)
         n = 0
+        importances = []
         for k, group in groupby(instances, key=attrgetter(bracket_attrname)):
             group = list(group)
-            for panel in group:
-                panel.importance = importance
-                panel.save()
+            importances.extend([importance] * len(group))
             n += len(group)
             if n >= boundary:
                 importance -= 1
                 boundary = round((nimportancelevels - 2 - importance) * len(instances) / nimportancelevels)
+        return self._save_importances(instances, importances)
 
+    @run_in_job_pool
     def prioritise_debates(self, event):
         # TODO: Debates and panels should really be unified in a single function
         round = Round.objects.get(pk=event['extra']['round_id'])
@@ -197,30 +231,32 @@ class AdjudicatorAllocationWorkerConsumer(EditDebateOrPanelWorkerMixin):
             open_category = round.tournament.breakcategory_set.filter(is_general=True).first()
             if open_category:
                 safe, dead = calculate_live_thresholds(open_category, round.tournament, round)
+                importances = []
                 for debate in debates:
                     points_now = [team.points_count for team in debate.teams]
                     highest = max(points_now)
                     lowest = min(points_now)
                     if lowest >= safe:
-                        debate.importance = 0
+                        importances.append(0)
                     elif highest <= dead:
-                        debate.importance = -2
+                        importances.append(-2)
                     else:
-                        debate.importance = 1
-                    debate.save()
+                        importances.append(1)
+                changed = self._save_importances(debates, importances)
             else:
                 self.return_error(event['extra']['group_name'],
                     _("You have no break category set as 'is general' so debate importances can't be calculated."))
                 return
 
         elif priority_method == 'bracket':
-            self._prioritise_by_bracket(debates, 'bracket')
+            changed = self._prioritise_by_bracket(debates, 'bracket')
 
         self.log_action(event['extra'], round, ActionLogEntry.ActionType.DEBATE_IMPORTANCE_AUTO)
-        content = self.reserialize_debates(SimpleDebateImportanceSerializer, round, debates)
+        content = self.reserialize_debates(SimpleDebateImportanceSerializer, round, changed)
         msg = _("Succesfully auto-prioritised debates.")
         self.return_response(content, event['extra']['group_name'], msg, 'success')
 
+    @run_in_job_pool
     def prioritise_panels(self, event):
         rd = Round.objects.get(pk=event['extra']['round_id'])
         panels = rd.preformedpanel_set.all()
@@ -230,14 +266,16 @@ class AdjudicatorAllocationWorkerConsumer(EditDebateOrPanelWorkerMixin):
             open_category = rd.tournament.breakcategory_set.filter(is_general=True).first()
             if open_category:
                 safe, dead = calculate_live_thresholds(open_category, rd.tournament, rd)
+                panels = list(panels)
+                importances = []
                 for panel in panels:
                     if panel.liveness > 0:
-                        panel.importance = 1
+                        importances.append(1)
                     elif panel.bracket_min >= safe:
-                        panel.importance = 0
+                        importances.append(0)
                     else:
-                        panel.importance = -2
-                    panel.save()
+                        importances.append(-2)
+                changed = self._save_importances(panels, importances)
             else:
                 self.return_error(event['extra']['group_name'],
                     _("You have no break category set as 'is general' so panel importances can't be calculated."))
@@ -245,23 +283,17 @@ class AdjudicatorAllocationWorkerConsumer(EditDebateOrPanelWorkerMixin):
 
         elif priority_method == 'bracket':
             panels = panels.annotate(bracket_mid=(F('bracket_max') + F('bracket_min')) / 2)
-            self._prioritise_by_bracket(panels, 'bracket_mid')
+            changed = self._prioritise_by_bracket(panels, 'bracket_mid')
 
         self.log_action(event['extra'], rd, ActionLogEntry.ActionType.PREFORMED_PANELS_IMPORTANCE_AUTO)
-        content = self.reserialize_panels(SimplePanelImportanceSerializer, rd, panels)
+        content = self.reserialize_panels(SimplePanelImportanceSerializer, rd, changed)
         msg = _("Succesfully auto-prioritised preformed panels.")
         self.return_response(content, event['extra']['group_name'], msg, 'success')
 
+    @run_in_job_pool
     def create_preformed_panels(self, event):
         round = Round.objects.get(pk=event['extra']['round_id'])
-        for i, (bracket_min, bracket_max, liveness) in enumerate(
-                calculate_anticipated_draw(round), start=1):
-            PreformedPanel.objects.update_or_create(round=round, room_rank=i,
-                defaults={
-                    'bracket_max': bracket_max,
-                    'bracket_min': bracket_min,
-                    'liveness': liveness,
-                })
+        create_anticipated_panels(round)
 
         self.log_action(event['extra'], round, ActionLogEntry.ActionType.PREFORMED_PANELS_CREATE)
         content = self.reserialize_panels(EditPanelAdjsPanelSerializer, round)
@@ -0,0 +1,216 @@
+"""Coalescing of edits made on the adjudicator allocation screens.
+
+Each drag and drop on the Edit Adjudicators or Edit Preformed Panels pages
+sends a websocket message with new importances or adjudicators for a few
+debates or panels. When several people edit a round at once, applying and
+re-broadcasting every message as it arrives floods the channel layer, and an
+editor whose page is slightly out of date can undo someone else's change.
+
+So instead, consumers add each message to a queue for the round, kept in the
+cache. The consumer then waits `COALESCE_WINDOW` seconds for others to arrive,
+without blocking other consumers (see `EditQueue.apply_later()`), and applies
+all queued messages in one transaction, in the order they were queued, and
+broadcasts one update with the result. Only one consumer applies a round's
+queue at a time.
+
+Messages with adjudicators include the allocation each debate or panel had on
+the editor's page before they changed it. Only the differences between that
+and the new allocation are applied (see `merge_allocation_edits()`), so
+adjudicators that the editor didn't move stay where other editors put them.
+"""
+
+import asyncio
+import logging
+import time
+
+from channels.db import database_sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+from .allocation import save_adjudicator_rows
+from .models import DebateAdjudicator
+
+logger = logging.getLogger(__name__)
+
+EDIT_QUEUE_KEY = "allocation_edits_%s_%d"  # (group prefix, round ID)
+COALESCE_WINDOW = 0.1  # seconds
+QUEUE_TIMEOUT = 60
+LOCK_TIMEOUT = 30  # so that a consumer that died while applying doesn't block the queue forever
+MISSING_EDIT_TIMEOUT = 5  # so that a consumer that died while queueing doesn't block the queue forever
+
+
+class EditQueue:
+    """A queue of edits to the debates or panels of a round. Each queued
+    message gets a sequence number from a counter in the cache, so messages
+    from all consumers are applied in the order they were queued."""
+
+    def __init__(self, prefix, round_id):
+        key = EDIT_QUEUE_KEY % (prefix, round_id)
+        self.queued_key = key + "_queued"
+        self.applied_key = key + "_applied"
+        self.lock_key = key + "_lock"
+        self.item_key = key + "_%d"
+        self.missing_key = key + "_%d_missing"
+
+    def push(self, edit):
+        cache.add(self.queued_key, 0, None)
+        seq = cache.incr(self.queued_key)
+        cache.set(self.item_key % seq, edit, QUEUE_TIMEOUT)
+        return seq
+
+    def pending(self):
+        return cache.get(self.queued_key, 0) > cache.get(self.applied_key, 0)
+
+    def pop(self):
+        """Removes and returns all queued edits, in order. If a sequence number
+        doesn't have an edit yet (because the consumer that queued it hasn't
+        stored it yet), it and the edits after it are left in the queue. But if
+        it's still missing after `MISSING_EDIT_TIMEOUT` seconds, the consumer
+        probably died before storing it, so it's skipped."""
+        first = cache.get(self.applied_key, 0) + 1
+        queued = cache.get(self.queued_key, 0)
+        items = cache.get_many([self.item_key % seq for seq in range(first, queued + 1)])
+
+        applied = first - 1
+        skipped = []
+        for seq in range(first, queued + 1):
+            if self.item_key % seq not in items:
+                cache.add(self.missing_key % seq, time.time(), QUEUE_TIMEOUT)
+                missing_since = cache.get(self.missing_key % seq)
+                if missing_since is not None and time.time() - missing_since < MISSING_EDIT_TIMEOUT:
+                    break
+                skipped.append(seq)
+            applied = seq
+
+        if skipped:
+            logger.warning("Skipped %d queued edits that were never stored", len(skipped))
+
+        keys = [self.item_key % seq for seq in range(first, applied + 1)]
+        cache.set(self.applied_key, applied, None)
+        cache.delete_many(keys + [self.missing_key % seq for seq in range(first, applied + 1)])
+        return [items[key] for key in keys if key in items]
+
+    def acquire(self):
+        return cache.add(self.lock_key, True, LOCK_TIMEOUT)
+
+    def release(self):
+        cache.delete(self.lock_key)
+
+    def apply(self, func):
+        """Calls `func` with the list of queued edits, unless another consumer is
+        already applying this queue. Edits queued while `func` runs are applied
+        after it returns, by whichever consumer gets the lock.
+
+        Returns True if edits are left in the queue because one that was queued
+        before them hasn't been stored yet, in which case this should be called
+        again later."""
+        while self.pending() and self.acquire():
+            try:
+                edits = self.pop()
+                if not edits:
+                    return self.pending()
+                func(edits)
+            finally:
+                self.release()
+        return False
+
+    async def apply_later(self, func):
+        """Waits `COALESCE_WINDOW` seconds for more edits to arrive, then calls
+        `apply()` in a thread, as often as needed. Consumers should await this
+        from the event loop, rather than sleep in a synchronous handler, since
+        synchronous consumers share one thread."""
+        while True:
+            await asyncio.sleep(COALESCE_WINDOW)
+            if not await database_sync_to_async(self.apply)(func):
+                break
+
+
+def _positions(allocation):
+    """Converts an allocation as sent by the front-end, like
+    `{"C": [1], "P": [2, 3], "T": []}`, to a dict mapping adjudicator IDs to
+    `DebateAdjudicator.TYPE_*` constants."""
+    return {int(adj_id): t for t, adj_ids in allocation.items() for adj_id in adj_ids}
+
+
+def merge_allocation_edits(current, rounds, edits):
+    """Applies `edits` to `current`, which maps container IDs to dicts mapping
+    adjudicator IDs to `DebateAdjudicator.TYPE_*` constants, in place. `rounds`
+    maps container IDs to round IDs. Each edit is a tuple
+    `(container_id, allocation, previous)`, where `allocation` is the new
+    allocation of the container as sent by the front-end, and `previous` is
+    the allocation it replaced on the editor's page, or None if not known.
+
+    Adjudicators that were removed from `previous` are removed from the
+    container, and adjudicators that were added or changed position are put
+    in that position, being removed from any other container in the same
+    round. If an edit makes a new chair, the existing chair becomes a
+    panellist. If `previous` is None, the container's allocation is replaced.
+
+    Returns the set of IDs of containers whose adjudicators changed.
+    """
+    where = {}
+    for container_id, panel in current.items():
+        for adj_id in panel:
+            where[(rounds[container_id], adj_id)] = container_id
+
+    changed = set()
+    for container_id, allocation, previous in edits:
+        panel = current.setdefault(container_id, {})
+        round_id = rounds[container_id]
+        allocation = _positions(allocation)
+        previous = _positions(previous) if previous is not None else dict(panel)
+
+        for adj_id in previous.keys() - allocation.keys():
+            if panel.pop(adj_id, None) is not None:
+                del where[(round_id, adj_id)]
+                changed.add(container_id)
+
+        for adj_id, t in allocation.items():
+            if previous.get(adj_id) == t:
+                continue
+
+            other_id = where.get((round_id, adj_id))
+            if other_id is not None and other_id != container_id:
+                del current[other_id][adj_id]
+                changed.add(other_id)
+
+            if t == DebateAdjudicator.TYPE_CHAIR:
+                for chair_id in [a for a, at in panel.items() if at == t and a != adj_id]:
+                    panel[chair_id] = DebateAdjudicator.TYPE_PANEL
+                    changed.add(container_id)
+
+            if panel.get(adj_id) != t:
+                panel[adj_id] = t
+                where[(round_id, adj_id)] = container_id
+                changed.add(container_id)
+
+    return changed
+
+
+def apply_allocation_edits(container_model, adjudicator_model, fk_name, edits):
+    """Merges `edits` (see `merge_allocation_edits()`) with the adjudicators
+    in the database and saves the result, in one transaction. Every container
+    in the rounds of the edited containers is considered, so that adjudicators
+    moved by an edit are removed from wherever they are now.
+
+    Returns the set of IDs of containers whose adjudicators changed.
+    """
+    ids = {container_id for container_id, allocation, previous in edits}
+
+    with transaction.atomic():
+        edited_rounds = container_model.objects.filter(id__in=ids).values('round_id')
+        rounds = dict(container_model.objects.filter(round_id__in=edited_rounds).values_list('id', 'round_id'))
+        rows = adjudicator_model.objects.filter(**{fk_name + '__round_id__in': edited_rounds}).select_for_update()
+
+        current = {}
+        for container_id, adj_id, t in rows.values_list(fk_name + '_id', 'adjudicator_id', 'type'):
+            current.setdefault(container_id, {})[adj_id] = t
+
+        edits = [edit for edit in edits if edit[0] in rounds]  # skip containers that were deleted
+        changed = merge_allocation_edits(current, rounds, edits)
+        if not changed:
+            return changed
+
+        wanted = {(container_id, adj_id): t for container_id in changed
+                  for adj_id, t in current.get(container_id, {}).items()}
+        return save_adjudicator_rows(adjudicator_model, fk_name, list(changed), wanted)
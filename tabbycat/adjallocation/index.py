@@ -0,0 +1,264 @@
+"""Cached indices of conflicts and adjudicator history.
+
+Building a `ConflictsInfo` or `HistoryInfo` directly from the database takes
+several queries, and in the case of history, goes through every debate in the
+tournament so far. So instead, they load their data from indices kept in the
+cache:
+
+- Each tournament has a conflicts index, which holds the conflicts of its teams
+  and adjudicators (including shared adjudicators), as a dict mapping each kind
+  of conflict ('adjteam', 'adjadj', 'adjinst' or 'teaminst') to a set of pairs
+  of primary keys. Adjudicator pairs are stored both ways round.
+- Each round has a history index, which maps the primary key of each debate in
+  the round to a tuple `(adjudicator_ids, team_ids)`.
+
+Indices are built from the database when they're first needed, and then kept
+up to date by the signal handlers in `signals.py`. These queue the conflicts
+and debates that changed, and when the current transaction commits, the
+indices they affect are deleted from the cache, to be rebuilt by the next
+reader. Deleting, rather than updating, an index means that two processes
+applying changes at the same time can't overwrite each other's updates. This
+way, a bulk change (like deleting a draw) deletes each index once, and changes
+that are rolled back never affect the cache. While there are changes that
+haven't been applied yet, indices are read from the database instead of the
+cache. Fixtures loaded with `loaddata` aren't added to the indices; run the
+`clearcache` command after loading them.
+
+Code that changes conflicts, debate adjudicators or debate teams in a way that
+doesn't send signals (e.g. `bulk_create()`) should call `queue_debates()` or
+`clear_conflicts_index()` itself.
+"""
+
+import logging
+import threading
+import weakref
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from draw.models import Debate, DebateTeam
+from participants.models import Adjudicator, Team
+from tournaments.models import Tournament
+
+from .models import (AdjudicatorAdjudicatorConflict, AdjudicatorInstitutionConflict,
+                     AdjudicatorTeamConflict, DebateAdjudicator, TeamInstitutionConflict)
+
+logger = logging.getLogger(__name__)
+
+CONFLICTS_INDEX_KEY = "adjallocation_conflicts_index_%d"  # tournament ID
+HISTORY_INDEX_KEY = "adjallocation_history_index_%d"  # round ID
+INDEX_TIMEOUT = 60 * 60 * 24  # so that an index that missed an update doesn't last forever
+
+CONFLICT_MODELS = {
+    'adjteam': (AdjudicatorTeamConflict, 'adjudicator_id', 'team_id'),
+    'adjadj': (AdjudicatorAdjudicatorConflict, 'adjudicator1_id', 'adjudicator2_id'),
+    'adjinst': (AdjudicatorInstitutionConflict, 'adjudicator_id', 'institution_id'),
+    'teaminst': (TeamInstitutionConflict, 'team_id', 'institution_id'),
+}
+
+
+def _adjudicator_in(field, tournament_id):
+    return Q(**{field + '__tournament_id': tournament_id}) | Q(**{field + '__tournament__isnull': True})
+
+
+# Conflicts in the index of a tournament
+CONFLICT_FILTERS = {
+    'adjteam': lambda tournament_id: Q(team__tournament_id=tournament_id),
+    'adjadj': lambda tournament_id: _adjudicator_in('adjudicator1', tournament_id) & _adjudicator_in('adjudicator2', tournament_id),
+    'adjinst': lambda tournament_id: _adjudicator_in('adjudicator', tournament_id),
+    'teaminst': lambda tournament_id: Q(team__tournament_id=tournament_id),
+}
+
+
+class _QueuedChanges:
+    """Changes queued by one call to `queue_conflicts()` or `queue_debates()`,
+    and the function passed to `transaction.on_commit()` to apply them. If the
+    transaction is rolled back, Django discards it, and with it the changes."""
+
+    def __init__(self, conflicts=None, debate_ids=(), round_ids=()):
+        self.conflicts = conflicts or {}
+        self.debates = set(debate_ids)
+        self.rounds = set(round_ids)
+
+    def __call__(self):
+        _pending.queued.discard(self)
+        for kind, ids in self.conflicts.items():
+            _pending.conflicts.setdefault(kind, set()).update(ids)
+        _pending.debates |= self.debates
+        _pending.rounds |= self.rounds
+        if not _pending.queued:  # last of this transaction's changes, so apply them all at once
+            conflicts, debate_ids, round_ids = _pending.conflicts, _pending.debates, _pending.rounds
+            _pending.clear()
+            if conflicts:
+                _apply_conflicts(conflicts)
+            if debate_ids or round_ids:
+                _apply_debates(debate_ids, round_ids)
+
+
+class _PendingChanges(threading.local):
+    """Changes that haven't yet been applied to the cached indices. `queued`
+    only holds weak references, so changes that were rolled back drop out of
+    it. The other attributes hold changes that were committed, until the last
+    of them is applied."""
+
+    def __init__(self):
+        self.queued = weakref.WeakSet()
+        self.clear()
+
+    def clear(self):
+        self.conflicts = {}
+        self.debates = set()
+        self.rounds = set()
+
+    def has_conflicts(self):
+        return any(queued.conflicts for queued in self.queued)
+
+    def has_debates(self):
+        return any(queued.debates or queued.rounds for queued in self.queued)
+
+
+_pending = _PendingChanges()
+
+
+def _queue(queued):
+    _pending.queued.add(queued)
+    transaction.on_commit(queued)
+
+
+# ==============================================================================
+# Conflicts
+# ==============================================================================
+
+def _conflict_pairs(kind, tournament_id=None, ids=None):
+    """Returns the set of pairs of primary keys of conflict `kind` in the
+    index of the given tournament, or involving `ids` if given."""
+    model, field1, field2 = CONFLICT_MODELS[kind]
+    rows = model.objects.all()
+    if tournament_id is not None:
+        rows = rows.filter(CONFLICT_FILTERS[kind](tournament_id))
+    if ids is not None:
+        q = Q(**{field1 + '__in': ids})
+        if kind == 'adjadj':
+            q |= Q(**{field2 + '__in': ids})
+        rows = rows.filter(q)
+    pairs = set(rows.values_list(field1, field2))
+    if kind == 'adjadj':
+        pairs |= {(adj2, adj1) for adj1, adj2 in pairs}
+    return pairs
+
+
+def get_conflicts_index(tournament_id):
+    """Returns the conflicts index of the tournament, building it if it isn't
+    in the cache."""
+    if _pending.has_conflicts():
+        return {kind: _conflict_pairs(kind, tournament_id) for kind in CONFLICT_MODELS}
+
+    index = cache.get(CONFLICTS_INDEX_KEY % tournament_id)
+    if index is None:
+        index = {kind: _conflict_pairs(kind, tournament_id) for kind in CONFLICT_MODELS}
+        cache.set(CONFLICTS_INDEX_KEY % tournament_id, index, INDEX_TIMEOUT)
+        logger.debug("Built conflicts index for tournament %d", tournament_id)
+    return index
+
+
+def get_conflicts(adjudicator_ids):
+    """Returns the conflicts of the given adjudicators, in the same form as a
+    conflicts index, from the database. This is for adjudicators that aren't
+    covered by a tournament's index, i.e. shared adjudicators when no teams or
+    tournament adjudicators are involved."""
+    return {kind: _conflict_pairs(kind, ids=adjudicator_ids) if kind in ('adjadj', 'adjinst') else set()
+            for kind in CONFLICT_MODELS}
+
+
+def queue_conflicts(kind, ids):
+    """Queues the conflicts of kind `kind` of the participants with primary
+    keys `ids` (adjudicators, or teams for 'teaminst') for updating."""
+    _queue(_QueuedChanges(conflicts={kind: set(ids)}))
+
+
+def clear_conflicts_index(tournament_ids=None):
+    """Deletes the conflicts indices of the given tournaments, or of all
+    tournaments if none are given."""
+    if tournament_ids is None:
+        tournament_ids = Tournament.objects.values_list('id', flat=True)
+    cache.delete_many([CONFLICTS_INDEX_KEY % tournament_id for tournament_id in tournament_ids])
+
+
+def _apply_conflicts(changed):
+    team_ids = changed.get('teaminst', set())
+    adj_ids = set().union(*(ids for kind, ids in changed.items() if kind != 'teaminst'))
+    team_tournaments = dict(Team.objects.filter(id__in=team_ids).values_list('id', 'tournament_id'))
+    adj_tournaments = dict(Adjudicator.objects.filter(id__in=adj_ids).values_list('id', 'tournament_id'))
+
+    # Conflicts of shared adjudicators are in every tournament's index, and
+    # those of deleted participants can't be traced, so they affect them all
+    if len(team_tournaments) < len(team_ids) or len(adj_tournaments) < len(adj_ids) or None in adj_tournaments.values():
+        clear_conflicts_index()
+        logger.debug("Cleared conflicts indices of all tournaments")
+    else:
+        tournament_ids = set(team_tournaments.values()) | set(adj_tournaments.values())
+        clear_conflicts_index(tournament_ids)
+        logger.debug("Cleared conflicts indices of %d tournaments", len(tournament_ids))
+
+
+# ==============================================================================
+# History
+# ==============================================================================
+
+def _debate_participants(**filters):
+    """Returns a dict mapping (round ID, debate ID) tuples to tuples
+    `(adjudicator_ids, team_ids)`, for debates matching `filters`."""
+    adjs = DebateAdjudicator.objects.filter(**filters).order_by('debate_id', 'id').values_list(
+        'debate__round_id', 'debate_id', 'adjudicator_id')
+    teams = DebateTeam.objects.filter(**filters).order_by('debate_id', 'id').values_list(
+        'debate__round_id', 'debate_id', 'team_id')
+
+    participants = {}
+    for round_id, debate_id, adj_id in adjs:
+        participants.setdefault((round_id, debate_id), ([], []))[0].append(adj_id)
+    for round_id, debate_id, team_id in teams:
+        participants.setdefault((round_id, debate_id), ([], []))[1].append(team_id)
+    return {key: (tuple(adj_ids), tuple(team_ids)) for key, (adj_ids, team_ids) in participants.items()}
+
+
+def get_history_indices(round_ids):
+    """Returns a dict mapping each of `round_ids` to the history index of that
+    round. Indices that aren't in the cache are built from the database, with
+    two queries in total."""
+    round_ids = list(round_ids)
+    if _pending.has_debates():
+        cached = {}
+    else:
+        cached = cache.get_many([HISTORY_INDEX_KEY % round_id for round_id in round_ids])
+    indices = {round_id: cached[HISTORY_INDEX_KEY % round_id] for round_id in round_ids
+               if HISTORY_INDEX_KEY % round_id in cached}
+
+    missing = [round_id for round_id in round_ids if round_id not in indices]
+    if missing:
+        built = {round_id: {} for round_id in missing}
+        for (round_id, debate_id), participants in _debate_participants(debate__round_id__in=missing).items():
+            built[round_id][debate_id] = participants
+        if not _pending.has_debates():
+            cache.set_many({HISTORY_INDEX_KEY % round_id: index for round_id, index in built.items()}, INDEX_TIMEOUT)
+        logger.debug("Built history indices for %d rounds", len(missing))
+        indices.update(built)
+
+    return indices
+
+
+def queue_debates(debate_ids, round_ids=()):
+    """Queues the participants of the debates with primary keys `debate_ids`
+    for updating. Debates that no longer exist are removed from the indices
+    of `round_ids`."""
+    _queue(_QueuedChanges(debate_ids=debate_ids, round_ids=round_ids))
+
+
+def clear_history_index(round_id):
+    cache.delete(HISTORY_INDEX_KEY % round_id)
+
+
+def _apply_debates(debate_ids, round_ids):
+    round_ids = round_ids | set(Debate.objects.filter(id__in=debate_ids).values_list('round_id', flat=True))
+    cache.delete_many([HISTORY_INDEX_KEY % round_id for round_id in round_ids])
+    logger.debug("Cleared history indices of %d rounds for %d debates", len(round_ids), len(debate_ids))
@@ -1,5 +1,8 @@
 from itertools import zip_longest
 
+from ..allocation import AdjudicatorAllocation, save_allocations
+from ..models import PreformedPanel
+from .anticipated import calculate_anticipated_draw
 from .base import registry
 # These imports add the allocator classes in those files to the registry.
 from . import dumb
@@ -15,11 +18,34 @@ def copy_panels_to_debates(debates, panels):
     debate just has its adjudicators cleared. Panels without a corresponding
     debate are ignored. The iterable `debates` must not contain `None`
     (otherwise this function will stop copying there).
+
+    Returns the set of primary keys of debates whose adjudicators changed.
     """
+    allocations = []
     for debate, panel in zip_longest(debates, panels, fillvalue=None):
         if debate is None:
             break
-        debate.debateadjudicator_set.all().delete()
-        if panel is not None:
-            for ppa in panel.preformedpaneladjudicator_set.all():
-                debate.debateadjudicator_set.create(adjudicator=ppa.adjudicator, type=ppa.type)
+        if panel is None:
+            allocations.append(AdjudicatorAllocation(debate))
+        else:
+            aa = panel.adjudicators
+            allocations.append(AdjudicatorAllocation(debate, aa.chair, aa.panellists, aa.trainees))
+    return save_allocations(allocations)
+
+
+def create_anticipated_panels(round):
+    """Creates a preformed panel for each room of the anticipated draw of
+    `round`, or updates the brackets and liveness of the panel already in
+    that room."""
+    existing = {panel.room_rank: panel for panel in round.preformedpanel_set.all()}
+    to_create, to_update = [], []
+    for i, (bracket_min, bracket_max, liveness) in enumerate(calculate_anticipated_draw(round), start=1):
+        panel = existing.get(i)
+        if panel is None:
+            to_create.append(PreformedPanel(round=round, room_rank=i, bracket_max=bracket_max,
+                bracket_min=bracket_min, liveness=liveness))
+        else:
+            panel.bracket_max, panel.bracket_min, panel.liveness = bracket_max, bracket_min, liveness
+            to_update.append(panel)
+    PreformedPanel.objects.bulk_create(to_create)
+    PreformedPanel.objects.bulk_update(to_update, ['bracket_max', 'bracket_min', 'liveness'])
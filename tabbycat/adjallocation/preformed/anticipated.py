@@ -1,13 +1,56 @@
 """Functions for computing an anticipated draw."""
 
 import itertools
+from uuid import uuid4
+
+from django.core.cache import cache
 
 from breakqual.utils import calculate_live_thresholds, determine_liveness
 from draw.generator.utils import ispow2, partial_break_round_split
 from participants.prefetch import populate_win_counts
 
+ANTICIPATED_DRAW_KEY = "anticipated_draw_%d_%s"  # (round ID, tournament's anticipated draw version)
+ANTICIPATED_DRAW_VERSION_KEY = "anticipated_draw_version_%d"  # tournament ID
+ANTICIPATED_DRAW_TIMEOUT = 60 * 60 * 24
+
+
+def _anticipated_draw_version(tournament_id):
+    """Returns a token that identifies the current state of the draws, results,
+    rounds, break categories, teams and preferences that anticipated draws in
+    the tournament depend on. A new token is issued whenever any of these
+    change (see `invalidate_anticipated_draws()`), so that draws cached under
+    the old token are never read again."""
+    key = ANTICIPATED_DRAW_VERSION_KEY % tournament_id
+    version = cache.get(key)
+    if version is None:
+        # Another process might be issuing a token at the same time
+        version = uuid4().hex
+        if not cache.add(key, version, ANTICIPATED_DRAW_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_anticipated_draws(tournament_ids):
+    """Discards cached anticipated draws for all rounds of the given
+    tournaments. This is called by the signal handlers in `signals.py`; code
+    that changes draws, results or rounds without sending signals (e.g.
+    `bulk_create()`) should call it itself, once the transaction commits."""
+    cache.delete_many([ANTICIPATED_DRAW_VERSION_KEY % tournament_id for tournament_id in tournament_ids])
+
 
 def calculate_anticipated_draw(round):
+    """Returns the anticipated draw for `round` (see
+    `_calculate_anticipated_draw()`), from the cache if nothing it depends on
+    has changed since it was last calculated."""
+    key = ANTICIPATED_DRAW_KEY % (round.id, _anticipated_draw_version(round.tournament_id))
+    draw = cache.get(key)
+    if draw is None:
+        draw = _calculate_anticipated_draw(round)
+        cache.set(key, draw, ANTICIPATED_DRAW_TIMEOUT)
+    return draw
+
+
+def _calculate_anticipated_draw(round):
     """Calculates an anticipated draw for the next round, based on the draw for
     the last round. Returns a list of tuples
         `(bracket_min, bracket_max, liveness)`,
@@ -112,4 +155,4 @@ def calculate_anticipated_draw(round):
     else:
         liveness = [0] * len(debates)
 
-    return zip(brackets_min, brackets_max, liveness)
+    return list(zip(brackets_min, brackets_max, liveness))
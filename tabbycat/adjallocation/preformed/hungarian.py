@@ -1,6 +1,7 @@
 import logging
 
-from munkres import Munkres
+import numpy as np
+from scipy.optimize import linear_sum_assignment
 
 from .base import BasePreformedPanelAllocator, register
 
@@ -20,8 +21,6 @@ class HungarianPreformedPanelAllocator(BasePreformedPanelAllocator):
         self.history_penalty = t.pref('adj_history_penalty')
         self.mismatch_penalty = t.pref('preformed_panel_mismatch_penalty')
 
-        self.munkres = Munkres()
-
     def calc_cost(self, debate, panel):
         cost = 0
 
@@ -35,23 +34,53 @@ class HungarianPreformedPanelAllocator(BasePreformedPanelAllocator):
 
         return cost
 
+    def calc_cost_matrix(self, debates, panels):
+        """Array version of calc_cost(). Returns an array whose (i, j) element
+        is the cost of putting `panels[j]` in `debates[i]`."""
+        debate_importances = np.array([debate.importance for debate in debates], dtype=float)
+        panel_importances = np.array([panel.importance for panel in panels], dtype=float)
+        costs = self.mismatch_penalty * (debate_importances[:, None] - panel_importances[None, :]) ** 2
+
+        # Conflicts and history between each panel's adjudicators and each
+        # debate's teams, via incidence matrices of debates to teams and panels
+        # to adjudicators
+        teams = list({team.id: team for debate in debates for team in debate.teams}.values())
+        adjs = list({adj.id: adj for panel in panels for adj in panel.adjudicators.all()}.values())
+        if not teams or not adjs:
+            return costs
+
+        team_index = {team.id: k for k, team in enumerate(teams)}
+        debate_incidence = np.zeros((len(debates), len(teams)))
+        for i, debate in enumerate(debates):
+            for team in debate.teams:
+                debate_incidence[i, team_index[team.id]] += 1
+
+        adj_index = {adj.id: k for k, adj in enumerate(adjs)}
+        panel_incidence = np.zeros((len(panels), len(adjs)))
+        for j, panel in enumerate(panels):
+            for adj in panel.adjudicators.all():
+                panel_incidence[j, adj_index[adj.id]] += 1
+
+        team_costs = (self.conflict_penalty * self.conflicts.conflict_adj_team_matrix(adjs, teams) +
+                      self.history_penalty * self.history.seen_adj_team_matrix(adjs, teams))
+        costs += debate_incidence @ team_costs.T @ panel_incidence.T
+
+        return costs
+
     def allocate(self):
-        cost_matrix = [
-            [self.calc_cost(debate, panel) for panel in self.panels]
-            for debate in self.debates
-        ]
+        debates = list(self.debates)
+        panels = list(self.panels)
+        cost_matrix = self.calc_cost_matrix(debates, panels)
 
-        logger.info("optimizing panels (matrix size: %d debates by %d panels", len(cost_matrix), len(cost_matrix[0]))
-        indices = self.munkres.compute(cost_matrix)
-        indices.sort()
-        total_cost = sum(cost_matrix[i][j] for i, j in indices)
-        logger.info("total cost: %f", total_cost)
+        logger.info("optimizing panels (matrix size: %d debates by %d panels)", *cost_matrix.shape)
+        rows, cols = linear_sum_assignment(cost_matrix)
+        logger.info("total cost: %f", cost_matrix[rows, cols].sum())
 
         # Need to make sure all debates show up in the returned debates list,
         # corresponding to `None` if it didn't get assigned a panel.
-        panels = [None] * len(self.debates)
-        for r, c in indices:
-            logger.info("debate %d, panel %d: cost %f", r, c, cost_matrix[r][c])
-            panels[r] = self.panels[c]
+        allocated = [None] * len(debates)
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            logger.debug("debate %d, panel %d: cost %f", r, c, cost_matrix[r, c])
+            allocated[r] = panels[c]
 
-        return list(self.debates), panels
+        return debates, allocated
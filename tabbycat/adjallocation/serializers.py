@@ -28,13 +28,22 @@ class EditPanelOrDebateAdjSerializer(AdjudicatorSerializer, VueDraggableItemMixi
 class EditDebateAdjsDebateSerializer(DebateSerializerMixin):
     """ Returns debates for the Edit Adjudicator Allocation view"""
 
+    field_prefetches = {
+        **DebateSerializerMixin.field_prefetches,
+        'adjudicators': ('debateadjudicator_set',),
+    }
+
     def adjudicator_representation(self, debate_or_panel_adj):
-        return debate_or_panel_adj.adjudicator.pk
+        return debate_or_panel_adj.adjudicator_id
 
 
 class EditPanelAdjsPanelSerializer(EditDebateAdjsDebateSerializer):
     """ Returns panels for the Edit Panels Allocation view"""
 
+    field_prefetches = {
+        'adjudicators': ('preformedpaneladjudicator_set',),
+    }
+
     def debate_or_panel_adjudicators(self, obj):
         return obj.preformedpaneladjudicator_set.all()
 
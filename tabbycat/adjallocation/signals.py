@@ -0,0 +1,158 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from breakqual.models import BreakCategory
+from draw.models import Debate, DebateTeam
+from options.models import TournamentPreferenceModel
+from participants.models import Team
+from results.models import BallotSubmission, TeamScore
+from tournaments.models import Round
+
+from .index import clear_conflicts_index, clear_history_index, CONFLICT_MODELS, queue_conflicts, queue_debates
+from .models import (AdjudicatorAdjudicatorConflict, AdjudicatorInstitutionConflict,
+                     AdjudicatorTeamConflict, DebateAdjudicator, TeamInstitutionConflict)
+from .preformed.anticipated import invalidate_anticipated_draws
+
+CONFLICT_KINDS = {model: kind for kind, (model, field1, field2) in CONFLICT_MODELS.items()}
+
+
+@receiver(post_delete, sender=AdjudicatorTeamConflict)
+@receiver(post_save, sender=AdjudicatorTeamConflict)
+@receiver(post_delete, sender=AdjudicatorAdjudicatorConflict)
+@receiver(post_save, sender=AdjudicatorAdjudicatorConflict)
+@receiver(post_delete, sender=AdjudicatorInstitutionConflict)
+@receiver(post_save, sender=AdjudicatorInstitutionConflict)
+@receiver(post_delete, sender=TeamInstitutionConflict)
+@receiver(post_save, sender=TeamInstitutionConflict)
+def update_conflicts_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    kind = CONFLICT_KINDS[sender]
+    model, field1, field2 = CONFLICT_MODELS[kind]
+    ids = [getattr(instance, field1)]
+    if kind == 'adjadj':
+        ids.append(getattr(instance, field2))
+    queue_conflicts(kind, ids)
+
+
+# Conflicts are also many-to-many fields of teams and adjudicators, whose
+# add(), remove() and clear() methods don't send post_save or post_delete.
+@receiver(m2m_changed, sender=AdjudicatorTeamConflict)
+@receiver(m2m_changed, sender=AdjudicatorAdjudicatorConflict)
+@receiver(m2m_changed, sender=AdjudicatorInstitutionConflict)
+@receiver(m2m_changed, sender=TeamInstitutionConflict)
+def update_conflicts_index_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    kind = CONFLICT_KINDS[sender]
+    if kind == 'adjadj':
+        queue_conflicts(kind, {instance.pk} | set(pk_set or ()))
+    elif not reverse:
+        queue_conflicts(kind, [instance.pk])
+    elif pk_set is not None:
+        queue_conflicts(kind, pk_set)
+    else:
+        # Cleared from the other side (e.g. an institution's conflicts), so we
+        # don't know whose conflicts changed
+        clear_conflicts_index()
+
+
+@receiver(post_delete, sender=DebateAdjudicator)
+@receiver(post_save, sender=DebateAdjudicator)
+@receiver(post_delete, sender=DebateTeam)
+@receiver(post_save, sender=DebateTeam)
+def update_history_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    queue_debates([instance.debate_id])
+
+
+@receiver(pre_save, sender=DebateAdjudicator)
+@receiver(pre_save, sender=DebateTeam)
+def update_history_index_for_previous_debate(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Queues the debate that an existing row was in before this save, in
+    case it was moved to another debate."""
+    if raw or instance.pk is None or (update_fields is not None and 'debate' not in update_fields):
+        return
+    queue_debates(sender.objects.filter(pk=instance.pk).values_list('debate_id', flat=True))
+
+
+@receiver(post_delete, sender=Debate)
+def remove_debate_from_history_index(sender, instance, **kwargs):
+    queue_debates([instance.id], [instance.round_id])
+
+
+@receiver(post_delete, sender=Round)
+def delete_history_index(sender, instance, **kwargs):
+    clear_history_index(instance.id)
+
+
+def _invalidate_anticipated_draws(tournament_ids):
+    tournament_ids = set(tournament_ids)
+    transaction.on_commit(lambda: invalidate_anticipated_draws(tournament_ids))
+
+
+# Tournaments are looked up straight away, since after a deletion commits, the
+# rows linking the instance to its tournament might be gone. When this handler
+# runs, the instance's own row is already deleted, so lookups go through its
+# foreign keys. Deletions cascade from children to parents, so the rows those
+# point to still exist.
+
+@receiver(post_delete, sender=Debate)
+@receiver(post_save, sender=Debate)
+def invalidate_anticipated_draws_for_debate(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _invalidate_anticipated_draws(Round.objects.filter(id=instance.round_id).values_list('tournament_id', flat=True))
+
+
+@receiver(post_delete, sender=BallotSubmission)
+@receiver(post_save, sender=BallotSubmission)
+def invalidate_anticipated_draws_for_ballot(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rounds = Round.objects.filter(debate__id=instance.debate_id)
+    _invalidate_anticipated_draws(rounds.values_list('tournament_id', flat=True))
+
+
+@receiver(post_delete, sender=DebateTeam)
+@receiver(post_save, sender=DebateTeam)
+def invalidate_anticipated_draws_for_debate_team(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _invalidate_anticipated_draws(Team.objects.filter(id=instance.team_id).values_list('tournament_id', flat=True))
+
+
+@receiver(post_delete, sender=TeamScore)
+@receiver(post_save, sender=TeamScore)
+def invalidate_anticipated_draws_for_team_score(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    teams = Team.objects.filter(debateteam__id=instance.debate_team_id)
+    _invalidate_anticipated_draws(teams.values_list('tournament_id', flat=True))
+
+
+@receiver(post_delete, sender=Round)
+@receiver(post_save, sender=Round)
+@receiver(post_delete, sender=BreakCategory)
+@receiver(post_save, sender=BreakCategory)
+@receiver(post_delete, sender=Team)
+@receiver(post_save, sender=Team)
+def invalidate_anticipated_draws_for_tournament(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _invalidate_anticipated_draws([instance.tournament_id])
+
+
+@receiver(m2m_changed, sender=Team.break_categories.through)
+def invalidate_anticipated_draws_for_eligibility(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _invalidate_anticipated_draws([instance.tournament_id])
+
+
+@receiver(post_delete, sender=TournamentPreferenceModel)
+@receiver(post_save, sender=TournamentPreferenceModel)
+def invalidate_anticipated_draws_for_preference(sender, instance, raw=False, **kwargs):
+    if not raw and instance.section == 'debate_rules' and instance.name == 'teams_in_debate':
+        _invalidate_anticipated_draws([instance.instance_id])
@@ -0,0 +1,76 @@
+from django.test import TestCase
+
+from utils.tests import CompletedTournamentTestMixin
+
+from ..allocation import AdjudicatorAllocation, save_allocations
+from ..allocators.base import residual_allocation_problem
+from ..models import DebateAdjudicator
+
+
+class SaveAllocationsTests(CompletedTournamentTestMixin, TestCase):
+    round_seq = 4
+
+    def get_rows(self, debates):
+        return {(da.debate_id, da.adjudicator_id, da.type)
+                for da in DebateAdjudicator.objects.filter(debate__in=debates)}
+
+    def test_save_allocations(self):
+        debates = list(self.round.debate_set.order_by('id')[:3])
+        adjs = list(self.tournament.adjudicator_set.order_by('id')[:5])
+        untouched = list(self.round.debate_set.order_by('id')[3:])
+        before = self.get_rows(untouched)
+
+        allocations = [
+            AdjudicatorAllocation(debates[0], chair=adjs[0], panellists=[adjs[1], adjs[2]]),
+            AdjudicatorAllocation(debates[1], chair=adjs[3], trainees=[adjs[4]]),
+            AdjudicatorAllocation(debates[2]),
+        ]
+        changed = save_allocations(allocations)
+        self.assertLessEqual(changed, {debate.id for debate in debates})
+
+        self.assertEqual(self.get_rows(debates), {
+            (debates[0].id, adjs[0].id, DebateAdjudicator.TYPE_CHAIR),
+            (debates[0].id, adjs[1].id, DebateAdjudicator.TYPE_PANEL),
+            (debates[0].id, adjs[2].id, DebateAdjudicator.TYPE_PANEL),
+            (debates[1].id, adjs[3].id, DebateAdjudicator.TYPE_CHAIR),
+            (debates[1].id, adjs[4].id, DebateAdjudicator.TYPE_TRAINEE),
+        })
+        self.assertEqual(self.get_rows(untouched), before)
+
+        # Swap roles, so that existing rows are updated
+        allocations[0].chair, allocations[0].panellists = adjs[1], [adjs[0], adjs[2]]
+        self.assertEqual(save_allocations(allocations), {debates[0].id})
+        self.assertIn((debates[0].id, adjs[1].id, DebateAdjudicator.TYPE_CHAIR), self.get_rows(debates))
+        self.assertIn((debates[0].id, adjs[0].id, DebateAdjudicator.TYPE_PANEL), self.get_rows(debates))
+
+
+class ResidualAllocationProblemTests(CompletedTournamentTestMixin, TestCase):
+    round_seq = 4
+
+    def setUp(self):
+        super().setUp()
+        self.debates = list(self.round.debate_set.order_by('id'))
+        adjs = list(self.tournament.adjudicator_set.order_by('id'))
+        save_allocations([AdjudicatorAllocation(debate, chair=adjs[2*i], panellists=[adjs[2*i+1]])
+                          for i, debate in enumerate(self.debates)])
+        self.adjs = adjs[:2*len(self.debates)]
+        self.spare = adjs[2*len(self.debates):]
+
+    def test_nothing_changed(self):
+        debates, adjs = residual_allocation_problem(self.debates, self.adjs + self.spare)
+        self.assertEqual(debates, [])
+        self.assertEqual(adjs, self.spare)
+
+    def test_changes(self):
+        withdrawn = self.adjs[5]  # on the third debate
+        available = [adj for adj in self.adjs + self.spare if adj != withdrawn]
+        debates, adjs = residual_allocation_problem(self.debates, available,
+            changed_containers=[self.debates[0].id], changed_adjudicators=[self.adjs[2]])
+        self.assertEqual(debates, self.debates[:3])
+        self.assertEqual(adjs, self.adjs[:5] + self.spare)
+
+    def test_no_chair(self):
+        DebateAdjudicator.objects.filter(debate=self.debates[1], type=DebateAdjudicator.TYPE_CHAIR).delete()
+        debates, adjs = residual_allocation_problem(self.debates, self.adjs + self.spare)
+        self.assertEqual(debates, [self.debates[1]])
+        self.assertEqual(adjs, self.adjs[2:4] + self.spare)
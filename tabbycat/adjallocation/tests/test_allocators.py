@@ -0,0 +1,206 @@
+import random
+import unittest
+from itertools import permutations
+from types import SimpleNamespace
+
+from ..allocators.hungarian import ConsensusHungarianAllocator, VotingHungarianAllocator
+from ..conflicts import ConflictsInfo, HistoryInfo
+from ..preformed.hungarian import HungarianPreformedPanelAllocator
+
+
+class FakeDebate(SimpleNamespace):
+    __hash__ = object.__hash__  # allocators use debates as dict keys
+
+
+def make_allocator(cls, seed=0, ndebates=12, nadjs=40, nteams=24, ninstitutions=6):
+    """Makes an allocator with random participants, conflicts and history,
+    without using the database."""
+    rng = random.Random(seed)
+    teams = [SimpleNamespace(id=i) for i in range(nteams)]
+    adjs = [SimpleNamespace(id=100 + i, trainee=(i % 10 == 0), _weighted_score=rng.uniform(1, 5),
+                            _normalized_score=rng.uniform(0, 5)) for i in range(nadjs)]
+    debates = [FakeDebate(teams=teams[2*i:2*i+2], importance=rng.randint(-2, 2), room_rank=i)
+               for i in range(ndebates)]
+
+    conflicts = ConflictsInfo.__new__(ConflictsInfo)
+    conflicts.adjudicator_ids = {adj.id for adj in adjs}
+    conflicts.team_ids = {team.id for team in teams}
+    conflicts.adjteamconflicts = {(rng.choice(adjs).id, rng.choice(teams).id) for _ in range(30)}
+    conflicts.adjadjconflicts = set()
+    for _ in range(20):
+        adj1, adj2 = rng.sample(adjs, 2)
+        conflicts.adjadjconflicts |= {(adj1.id, adj2.id), (adj2.id, adj1.id)}
+    conflicts.teaminstconflicts = {team.id: set(rng.sample(range(ninstitutions), rng.randint(0, 1))) for team in teams}
+    conflicts.adjinstconflicts = {adj.id: set(rng.sample(range(ninstitutions), rng.randint(0, 2))) for adj in adjs}
+
+    history = HistoryInfo.__new__(HistoryInfo)
+    history.adjteamhistories = {(rng.choice(adjs).id, rng.choice(teams).id): [1] for _ in range(40)}
+    history.adjadjhistories = {tuple(adj.id for adj in rng.sample(adjs, 2)): [1] for _ in range(40)}
+
+    allocator = cls.__new__(cls)
+    allocator.debates = debates
+    allocator.adjudicators = adjs
+    allocator.conflicts = conflicts
+    allocator.history = history
+    allocator.min_score = 0.0
+    allocator.max_score = 5.0
+    allocator.min_voting_score = 2.0
+    allocator.conflict_penalty = 1e6
+    allocator.history_penalty = 1e4
+    allocator.no_panellists = False
+    allocator.no_trainees = False
+    allocator.refinement_time = 0
+    allocator.user_warnings = []
+    return allocator
+
+
+class TestHungarianCostMatrix(unittest.TestCase):
+
+    def test_matches_calc_cost(self):
+        for seed in range(3):
+            allocator = make_allocator(VotingHungarianAllocator, seed=seed)
+            debates = [d for d in allocator.debates for _ in range(2)]
+            adjs = allocator.adjudicators
+            adjustments = [-1.0 * (i % 3) for i in range(len(debates))]
+            chairs = [adjs[i] if i % 4 else None for i in range(len(debates))]
+
+            with self.subTest(seed=seed):
+                matrix = allocator.calc_cost_matrix(debates, adjs, adjustments, chairs)
+                self.assertEqual(matrix.shape, (len(debates), len(adjs)))
+                for i, (debate, adjustment, chair) in enumerate(zip(debates, adjustments, chairs)):
+                    for j, adj in enumerate(adjs):
+                        expected = allocator.calc_cost(debate, adj, adjustment, chair)
+                        self.assertAlmostEqual(matrix[i, j], expected, delta=1e-9 * abs(expected))
+
+
+class TestPreformedCostMatrix(unittest.TestCase):
+
+    def make_allocator(self, seed):
+        rng = random.Random(seed)
+        base = make_allocator(VotingHungarianAllocator, seed=seed)
+        adjs = base.adjudicators
+        panels = [SimpleNamespace(importance=rng.randint(-2, 2),
+                                  adjudicators=SimpleNamespace(all=lambda adjs=rng.sample(adjs, 3): adjs))
+                  for _ in range(len(base.debates) + 2)]
+
+        allocator = HungarianPreformedPanelAllocator.__new__(HungarianPreformedPanelAllocator)
+        allocator.debates = base.debates
+        allocator.panels = panels
+        allocator.conflicts = base.conflicts
+        allocator.history = base.history
+        allocator.conflict_penalty = 1e6
+        allocator.history_penalty = 1e4
+        allocator.mismatch_penalty = 1e2
+        return allocator
+
+    def test_matches_calc_cost(self):
+        for seed in range(3):
+            allocator = self.make_allocator(seed)
+            with self.subTest(seed=seed):
+                matrix = allocator.calc_cost_matrix(allocator.debates, allocator.panels)
+                for i, debate in enumerate(allocator.debates):
+                    for j, panel in enumerate(allocator.panels):
+                        self.assertAlmostEqual(matrix[i, j], allocator.calc_cost(debate, panel))
+
+    def test_allocate(self):
+        allocator = self.make_allocator(0)
+        debates, panels = allocator.allocate()
+        self.assertEqual(debates, allocator.debates)
+        self.assertNotIn(None, panels)
+        self.assertEqual(len(set(map(id, panels))), len(panels))
+
+
+class TestHungarianAllocators(unittest.TestCase):
+
+    def check_allocation(self, allocation, allocator):
+        allocated = [adj for aa in allocation for adj in [aa.chair] + aa.panellists + aa.trainees if adj is not None]
+        self.assertEqual(len(allocated), len(set(id(adj) for adj in allocated)))
+        self.assertEqual({aa.container.room_rank for aa in allocation}, {d.room_rank for d in allocator.debates})
+        for aa in allocation:
+            self.assertIsNotNone(aa.chair)
+
+    def test_voting(self):
+        allocator = make_allocator(VotingHungarianAllocator)
+        self.check_allocation(allocator.run_allocation(), allocator)
+
+    def test_consensus(self):
+        allocator = make_allocator(ConsensusHungarianAllocator)
+        allocation = allocator.run_allocation()
+        self.check_allocation(allocation, allocator)
+        voting = [adj for adj in allocator.adjudicators if adj._weighted_score >= 2.0 and not adj.trainee]
+        self.assertEqual(sum(1 + len(aa.panellists) for aa in allocation), len(voting))
+
+
+class TestRefineAllocation(unittest.TestCase):
+
+    def allocation_cost(self, allocator, allocation):
+        """Returns the cost of `allocation`, with each panel's voting
+        adjudicators in the cheapest of the positions that the allocator costed
+        for that debate, plus conflicts and history between all panellists."""
+        cost = 0.0
+        for aa in allocation:
+            panel = [aa.chair] + aa.panellists
+            cost += min(sum(allocator.calc_cost(aa.container, adj, adjustment) for adj, adjustment in zip(panel, positions))
+                        for positions in permutations(allocator.position_adjustments[aa.container], len(panel)))
+            for adj in aa.trainees:
+                cost += allocator.calc_cost(aa.container, adj, -2.0)
+            members = panel + aa.trainees
+            for k, adj1 in enumerate(members):
+                for adj2 in members[k+1:]:
+                    cost += allocator.conflict_penalty * max(allocator.conflicts.conflict_adj_adj(adj1, adj2),
+                                                             allocator.conflicts.conflict_adj_adj(adj2, adj1))
+                    cost += allocator.history_penalty * max(allocator.history.seen_adj_adj(adj1, adj2),
+                                                            allocator.history.seen_adj_adj(adj2, adj1))
+        return cost
+
+    def test_refine(self):
+        for cls in [VotingHungarianAllocator, ConsensusHungarianAllocator]:
+            allocator = make_allocator(cls, seed=4)
+            allocation = allocator.run_allocation()
+            sizes = [(len(aa.panellists), len(aa.trainees)) for aa in allocation]
+            before = self.allocation_cost(allocator, allocation)
+            allocator.refine_allocation(allocation, 0.1)
+
+            with self.subTest(cls=cls.__name__):
+                self.assertLessEqual(self.allocation_cost(allocator, allocation), before + 1e-6)
+                self.assertEqual([(len(aa.panellists), len(aa.trainees)) for aa in allocation], sizes)
+                allocated = [adj for aa in allocation for adj in [aa.chair] + aa.panellists + aa.trainees]
+                self.assertEqual(len(allocated), len(set(id(adj) for adj in allocated)))
+                for aa in allocation:
+                    for adj in aa.panellists:
+                        self.assertGreaterEqual(aa.chair._normalized_score, adj._normalized_score)
+
+    def test_never_increases_allocator_cost(self):
+        # Without conflicts or history between adjudicators, the cost is just
+        # what the Hungarian algorithm minimized, position adjustments and all
+        for cls in [VotingHungarianAllocator, ConsensusHungarianAllocator]:
+            for seed in range(3):
+                allocator = make_allocator(cls, seed=seed)
+                allocator.conflicts.adjadjconflicts = set()
+                allocator.history.adjadjhistories = {}
+                allocation = allocator.run_allocation()
+                before = self.allocation_cost(allocator, allocation)
+                allocator.refine_allocation(allocation, 0.05)
+                with self.subTest(cls=cls.__name__, seed=seed):
+                    self.assertLessEqual(self.allocation_cost(allocator, allocation), before * (1 + 1e-9))
+
+    def test_removes_panellist_conflicts(self):
+        allocator = make_allocator(ConsensusHungarianAllocator, ndebates=2, nadjs=6)
+        for adj in allocator.adjudicators:
+            adj.trainee = False
+            adj._weighted_score = 3.0
+        allocator.conflicts.adjadjconflicts = set()
+        allocator.conflicts.adjinstconflicts = {adj.id: set() for adj in allocator.adjudicators}
+        allocator.history.adjadjhistories = {}
+        allocation = allocator.run_allocation()
+
+        # Conflict the two panellists on each panel, which the Hungarian
+        # allocator can't see because neither is the chair
+        for aa in allocation:
+            adj1, adj2 = aa.panellists
+            allocator.conflicts.adjadjconflicts |= {(adj1.id, adj2.id), (adj2.id, adj1.id)}
+        allocator.refine_allocation(allocation, 0.1)
+
+        for aa in allocation:
+            adj1, adj2 = aa.panellists
+            self.assertFalse(allocator.conflicts.conflict_adj_adj(adj1, adj2))
@@ -0,0 +1,143 @@
+import asyncio
+import time
+import unittest
+
+from django.core.cache import cache
+
+from ..edits import EditQueue, merge_allocation_edits, MISSING_EDIT_TIMEOUT
+
+
+class TestMergeAllocationEdits(unittest.TestCase):
+
+    def setUp(self):
+        self.current = {
+            1: {10: 'C', 11: 'P', 12: 'P'},
+            2: {20: 'C', 21: 'P', 22: 'P'},
+            3: {30: 'C'},
+        }
+        self.rounds = {1: 1, 2: 1, 3: 1}
+
+    def test_move(self):
+        changed = merge_allocation_edits(self.current, self.rounds, [
+            (1, {'C': [10], 'P': [11], 'T': []}, {'C': [10], 'P': [11, 12], 'T': []}),
+            (3, {'C': [30], 'P': [12], 'T': []}, {'C': [30], 'P': [], 'T': []}),
+        ])
+        self.assertEqual(changed, {1, 3})
+        self.assertEqual(self.current[1], {10: 'C', 11: 'P'})
+        self.assertEqual(self.current[3], {30: 'C', 12: 'P'})
+
+    def test_concurrent_edits_kept(self):
+        # Editor A moves 12 from debate 1 to debate 2
+        # Editor B, not having seen that, moves 30 from debate 3 to debate 1
+        changed = merge_allocation_edits(self.current, self.rounds, [
+            (1, {'C': [10], 'P': [11], 'T': []}, {'C': [10], 'P': [11, 12], 'T': []}),
+            (2, {'C': [20], 'P': [21, 22], 'T': [12]}, {'C': [20], 'P': [21, 22], 'T': []}),
+            (1, {'C': [10], 'P': [11, 12], 'T': [30]}, {'C': [10], 'P': [11, 12], 'T': []}),
+            (3, {'C': [], 'P': [], 'T': []}, {'C': [30], 'P': [], 'T': []}),
+        ])
+        self.assertEqual(changed, {1, 2, 3})
+        self.assertEqual(self.current[1], {10: 'C', 11: 'P', 30: 'T'})
+        self.assertEqual(self.current[2], {20: 'C', 21: 'P', 22: 'P', 12: 'T'})
+        self.assertEqual(self.current[3], {})
+
+    def test_moved_without_source(self):
+        # Adjudicator moved into debate 3 is removed from debate 2 even though
+        # the edit to debate 2 wasn't sent
+        merge_allocation_edits(self.current, self.rounds, [
+            (3, {'C': [30], 'P': [21], 'T': []}, {'C': [30], 'P': [], 'T': []}),
+        ])
+        self.assertEqual(self.current[2], {20: 'C', 22: 'P'})
+        self.assertEqual(self.current[3], {30: 'C', 21: 'P'})
+
+    def test_new_chair(self):
+        merge_allocation_edits(self.current, self.rounds, [
+            (1, {'C': [22], 'P': [11, 12], 'T': []}, {'C': [], 'P': [11, 12], 'T': []}),
+        ])
+        self.assertEqual(self.current[1], {10: 'P', 11: 'P', 12: 'P', 22: 'C'})
+
+    def test_without_previous(self):
+        changed = merge_allocation_edits(self.current, self.rounds, [
+            (1, {'C': [11], 'P': [], 'T': []}, None),
+        ])
+        self.assertEqual(changed, {1})
+        self.assertEqual(self.current[1], {11: 'C'})
+
+    def test_other_rounds(self):
+        self.rounds[3] = 2
+        merge_allocation_edits(self.current, self.rounds, [
+            (3, {'C': [30], 'P': [21], 'T': []}, {'C': [30], 'P': [], 'T': []}),
+        ])
+        self.assertEqual(self.current[2], {20: 'C', 21: 'P', 22: 'P'})
+
+    def test_no_change(self):
+        changed = merge_allocation_edits(self.current, self.rounds, [
+            (1, {'C': [10], 'P': [11, 12], 'T': []}, {'C': [10], 'P': [11, 12], 'T': []}),
+        ])
+        self.assertEqual(changed, set())
+
+
+class TestEditQueue(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_order(self):
+        queue = EditQueue('debates', 1)
+        for i in range(3):
+            queue.push({'importance': [{'id': 1, 'importance': i}]})
+        EditQueue('debates', 2).push({'importance': []})
+
+        applied = []
+        queue.apply(applied.append)
+        self.assertEqual(applied, [[{'importance': [{'id': 1, 'importance': i}]} for i in range(3)]])
+        self.assertFalse(queue.pending())
+        self.assertTrue(EditQueue('debates', 2).pending())
+
+    def test_locked(self):
+        queue = EditQueue('debates', 1)
+        queue.push({'importance': []})
+        self.assertTrue(queue.acquire())
+        applied = []
+        queue.apply(applied.append)
+        self.assertEqual(applied, [])
+        queue.release()
+        queue.apply(applied.append)
+        self.assertEqual(len(applied), 1)
+
+    def test_edits_queued_while_applying(self):
+        queue = EditQueue('panels', 1)
+        queue.push({'adjudicators': []})
+        applied = []
+
+        def apply(edits):
+            applied.append(edits)
+            if len(applied) == 1:
+                queue.push({'importance': []})  # as if from another consumer, which can't get the lock
+
+        queue.apply(apply)
+        self.assertEqual(applied, [[{'adjudicators': []}], [{'importance': []}]])
+
+    def test_missing_item(self):
+        queue = EditQueue('debates', 1)
+        cache.add(queue.queued_key, 0, None)
+        cache.incr(queue.queued_key)  # edit not stored yet
+        queue.push({'importance': []})
+        self.assertEqual(queue.pop(), [])
+        self.assertTrue(queue.pending())
+        self.assertTrue(queue.apply(self.fail))
+
+    def test_missing_item_skipped(self):
+        queue = EditQueue('debates', 1)
+        cache.add(queue.queued_key, 0, None)
+        cache.incr(queue.queued_key)  # consumer died before storing its edit
+        queue.push({'importance': []})
+        cache.set(queue.missing_key % 1, time.time() - MISSING_EDIT_TIMEOUT - 1)
+        self.assertEqual(queue.pop(), [{'importance': []}])
+        self.assertFalse(queue.pending())
+
+    def test_apply_later(self):
+        queue = EditQueue('debates', 1)
+        queue.push({'importance': []})
+        applied = []
+        asyncio.run(queue.apply_later(applied.append))
+        self.assertEqual(applied, [[{'importance': []}]])
@@ -0,0 +1,161 @@
+from itertools import combinations, product
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from draw.models import Debate
+from results.models import BallotSubmission
+from utils.tests import CompletedTournamentTestMixin
+
+from ..conflicts import ConflictsInfo, HistoryInfo
+from ..index import CONFLICTS_INDEX_KEY, HISTORY_INDEX_KEY
+from ..models import AdjudicatorTeamConflict, DebateAdjudicator
+from ..preformed.anticipated import _calculate_anticipated_draw, calculate_anticipated_draw
+
+
+class ConflictsAndHistoryIndexTests(CompletedTournamentTestMixin, TestCase):
+    round_seq = 4
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def expected_histories(self):
+        adjteam, adjadj = {}, {}
+        for debate in Debate.objects.filter(round__tournament=self.tournament, round__seq__lt=self.round.seq):
+            adjs = list(debate.debateadjudicator_set.order_by('id').values_list('adjudicator_id', flat=True))
+            teams = list(debate.debateteam_set.values_list('team_id', flat=True))
+            for pair in product(adjs, teams):
+                adjteam.setdefault(pair, []).append(debate.round.seq)
+            for pair in combinations(adjs, 2):
+                adjadj.setdefault(pair, []).append(debate.round.seq)
+        return adjteam, adjadj
+
+    def assertHistoriesCorrect(self):  # noqa: N802
+        history = HistoryInfo(self.round)
+        adjteam, adjadj = self.expected_histories()
+        self.assertEqual({k: sorted(v) for k, v in history.adjteamhistories.items()}, adjteam)
+        self.assertEqual({k: sorted(v) for k, v in history.adjadjhistories.items()}, adjadj)
+
+    def test_history_index(self):
+        self.assertHistoriesCorrect()
+        prev = self.tournament.round_set.get(seq=2)
+        self.assertIsNotNone(cache.get(HISTORY_INDEX_KEY % prev.id))
+
+        with self.assertNumQueries(1):  # just the rounds
+            HistoryInfo(self.round)
+
+        # Move an adjudicator into another debate of a previous round
+        debates = list(prev.debate_set.order_by('id')[:2])
+        da = debates[0].debateadjudicator_set.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            da.debate = debates[1]
+            da.save()
+        self.assertHistoriesCorrect()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            debates[1].delete()
+        self.assertIsNone(cache.get(HISTORY_INDEX_KEY % prev.id))
+        self.assertHistoriesCorrect()
+        self.assertNotIn(debates[1].id, cache.get(HISTORY_INDEX_KEY % prev.id))
+
+    def test_conflicts_index(self):
+        teams = self.tournament.team_set.all()
+        adjs = self.tournament.adjudicator_set.all()
+        key = CONFLICTS_INDEX_KEY % self.tournament.id
+        ConflictsInfo(teams=teams, adjudicators=adjs)
+        self.assertIsNotNone(cache.get(key))
+
+        adj = adjs.first()
+        team = teams.exclude(adj_team_conflicts=adj).first()
+        self.assertFalse(ConflictsInfo(teams=teams, adjudicators=adjs).personal_conflict_adj_team(adj, team))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            conflict = AdjudicatorTeamConflict.objects.create(adjudicator=adj, team=team)
+        self.assertIsNone(cache.get(key))
+        self.assertTrue(ConflictsInfo(teams=teams, adjudicators=adjs).personal_conflict_adj_team(adj, team))
+        self.assertIn((adj.id, team.id), cache.get(key)['adjteam'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            conflict.delete()
+        self.assertFalse(ConflictsInfo(teams=teams, adjudicators=adjs).personal_conflict_adj_team(adj, team))
+
+        # Through the many-to-many field
+        with self.captureOnCommitCallbacks(execute=True):
+            adj.team_conflicts.add(team)
+        self.assertTrue(ConflictsInfo(teams=teams, adjudicators=adjs).personal_conflict_adj_team(adj, team))
+
+    def test_pending_changes_bypass_cache(self):
+        HistoryInfo(self.round)
+        prev = self.tournament.round_set.get(seq=3)
+        da = DebateAdjudicator.objects.filter(debate__round=prev).first()
+        da.delete()  # not committed, so the cached index isn't updated yet
+        self.assertHistoriesCorrect()
+
+
+class AnticipatedDrawCacheTests(CompletedTournamentTestMixin, TestCase):
+    round_seq = 4
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def assertAnticipatedDrawCorrect(self):  # noqa: N802
+        self.round.refresh_from_db()
+        self.assertEqual(calculate_anticipated_draw(self.round), _calculate_anticipated_draw(self.round))
+
+    def test_cached(self):
+        self.assertAnticipatedDrawCorrect()
+        with self.assertNumQueries(0):
+            calculate_anticipated_draw(self.round)
+
+    def test_previous_round_weight(self):
+        self.assertAnticipatedDrawCorrect()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.round.prev.weight = 3
+            self.round.prev.save()
+        self.assertAnticipatedDrawCorrect()
+
+    def test_previous_round_room_ranks(self):
+        self.assertAnticipatedDrawCorrect()
+        debates = list(self.round.prev.debate_set.order_by('room_rank'))
+        with self.captureOnCommitCallbacks(execute=True):
+            for debate in debates:
+                debate.room_rank = len(debates) + 1 - debate.room_rank
+                debate.save()
+        self.assertAnticipatedDrawCorrect()
+
+    def test_teams_in_debate(self):
+        self.assertAnticipatedDrawCorrect()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tournament.preferences['debate_rules__teams_in_debate'] = 4
+        self.assertAnticipatedDrawCorrect()
+
+    def test_open_category_break_size(self):
+        self.assertAnticipatedDrawCorrect()
+        category = self.tournament.breakcategory_set.get(is_general=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            category.break_size = 2
+            category.save()
+        self.assertAnticipatedDrawCorrect()
+
+    def delete_ballots(self, debates):
+        # So that deleting the debates or teams doesn't also delete ballots,
+        # which would invalidate the anticipated draw by itself
+        with self.captureOnCommitCallbacks(execute=True):
+            BallotSubmission.objects.filter(debate__in=debates).delete()
+
+    def test_delete_previous_round_draw(self):
+        self.delete_ballots(self.round.prev.debate_set.all())
+        self.assertAnticipatedDrawCorrect()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.round.prev.debate_set.all().delete()
+        self.assertAnticipatedDrawCorrect()
+
+    def test_delete_debate_team(self):
+        debate = self.round.prev.debate_set.order_by('room_rank').last()
+        self.delete_ballots([debate])
+        self.assertAnticipatedDrawCorrect()
+        with self.captureOnCommitCallbacks(execute=True):
+            debate.debateteam_set.first().delete()
+        self.assertAnticipatedDrawCorrect()
@@ -0,0 +1,42 @@
+from django.test import TestCase
+
+from draw.serializers import EditDebateTeamsDebateSerializer
+from utils.serializers import prefetch_for_serializer
+from utils.tests import CompletedTournamentTestMixin
+from venues.serializers import EditDebateVenuesDebateSerializer, SimpleDebateVenueSerializer
+
+from ..serializers import (EditDebateAdjsDebateSerializer, SimpleDebateAllocationSerializer,
+                           SimpleDebateImportanceSerializer)
+
+
+class PrefetchForSerializerTests(CompletedTournamentTestMixin, TestCase):
+    round_seq = 4
+
+    serializers = [
+        EditDebateAdjsDebateSerializer,
+        EditDebateTeamsDebateSerializer,
+        EditDebateVenuesDebateSerializer,
+        SimpleDebateAllocationSerializer,
+        SimpleDebateImportanceSerializer,
+        SimpleDebateVenueSerializer,
+    ]
+
+    def serialize(self, serializer, debates):
+        debates = prefetch_for_serializer(serializer, debates)
+        return serializer(debates, many=True, context={'sides': self.tournament.sides}).data
+
+    def test_fixed_number_of_queries(self):
+        for serializer in self.serializers:
+            with self.subTest(serializer=serializer.__name__):
+                # one query for the debates, and one for each lookup
+                nqueries = 1 + sum(len(lookup.split('__')) for lookup in serializer.prefetch_lookups())
+                with self.assertNumQueries(nqueries):
+                    data = self.serialize(serializer, self.round.debate_set.all())
+                self.assertEqual(len(data), self.round.debate_set.count())
+
+    def test_list(self):
+        debates = list(self.round.debate_set.order_by('id')[:3])
+        expected = SimpleDebateAllocationSerializer(self.round.debate_set.order_by('id')[:3], many=True).data
+        with self.assertNumQueries(2):
+            data = self.serialize(SimpleDebateAllocationSerializer, debates)
+        self.assertEqual(data, expected)
@@ -1,6 +1,7 @@
 import json
 import logging
 
+from django.conf import settings
 from django.contrib import messages
 from django.db.models import Prefetch
 from django.forms import ChoiceField, ModelChoiceField
@@ -53,6 +54,7 @@ class BaseEditDebateOrPanelAdjudicatorsView(DebateDragAndDropMixin, Administrato
             'draw_rules__adj_min_voting_score',
             'draw_rules__adj_conflict_penalty',
             'draw_rules__adj_history_penalty',
+            'draw_rules__adj_refinement_time',
             'draw_rules__preformed_panel_mismatch_penalty',
             'draw_rules__no_trainee_position',
             'draw_rules__no_panellist_position',
@@ -64,6 +66,7 @@ class BaseEditDebateOrPanelAdjudicatorsView(DebateDragAndDropMixin, Administrato
         info['clashes'] = self.get_adjudicator_conflicts()
         info['histories'] = self.get_history_conflicts()
         info['hasPreformedPanels'] = self.round.preformedpanel_set.exists()
+        info['usesJobPool'] = settings.WORKER_JOB_PROCESSES > 0
         return info
 
     def get_serialised_allocatable_items(self):
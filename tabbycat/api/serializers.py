@@ -299,6 +299,8 @@ class RoundSerializer(serializers.ModelSerializer):
             with_permission = partial(has_permission, user=kwargs['context']['request'].user, tournament=kwargs['context']['tournament'])
             if not with_permission(permission=Permission.VIEW_FEEDBACK_OVERVIEW):
                 self.fields.pop('feedback_weight')
+            if not with_permission(permission=Permission.VIEW_ADMIN_DRAW):
+                self.fields.pop('draw_profile')
 
             # Can't show in a ListSerializer
             if not with_permission(permission=Permission.VIEW_MOTION) and (isinstance(self.instance, QuerySet) or self.instance.motions_status != Round.MotionsStatus.MOTIONS_RELEASED):
@@ -114,6 +114,15 @@ class RoundSerializerTests(CompletedTournamentTestMixin, APITestCase):
         response = self.client.get(reverse_tournament('api-round-list', self.tournament))
         self.assertIsNotNone(response.data[0].get('feedback_weight'))
 
+    def test_exclude_draw_profile_public(self):
+        response = self.client.get(reverse_tournament('api-round-list', self.tournament))
+        self.assertNotIn('draw_profile', response.data[0])
+
+    def test_include_draw_profile_admin(self):
+        self.client.login(username="admin", password="admin")
+        response = self.client.get(reverse_tournament('api-round-list', self.tournament))
+        self.assertIn('draw_profile', response.data[0])
+
     def test_seq_validation(self):
         client = APIClient()
         client.login(username="admin", password="admin")
@@ -23,8 +23,7 @@ from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
 from actionlog.models import ActionLogEntry
-from adjallocation.models import PreformedPanel
-from adjallocation.preformed.anticipated import calculate_anticipated_draw
+from adjallocation.preformed import create_anticipated_panels
 from availability.models import RoundAvailability
 from breakqual.models import BreakCategory
 from breakqual.views import GenerateBreakMixin
@@ -1463,12 +1462,7 @@ class PreformedPanelViewSet(RoundAPIMixin, AdministratorAPIMixin, ModelViewSet):
     @extend_schema(summary="Add blank preformed panels")
     def add_blank(self, request, *args, **kwargs):
         """Adds new complete set of panels, with calculated bracket and liveness."""
-        for i, (bracket_min, bracket_max, liveness) in enumerate(calculate_anticipated_draw(self.round), start=1):
-            PreformedPanel.objects.update_or_create(round=self.round, room_rank=i, defaults={
-                'bracket_max': bracket_max,
-                'bracket_min': bracket_min,
-                'liveness': liveness,
-            })
+        create_anticipated_panels(self.round)
         self.log_action(type=self.action_log_type_created, agent=ActionLogEntry.Agent.API)
 
         return self.get(request, *args, **kwargs)
@@ -26,6 +26,14 @@ class BaseAidaBreakGenerator(StandardBreakGenerator):
         """Excludes teams that are subject to the institution cap."""
         raise NotImplementedError
 
+    def _remove_capped_teams(self):
+        """Moves the teams in `self.capped_teams` from `self.eligible_teams`
+        to `self.excluded_teams`."""
+        capped = set(self.capped_teams)
+        self.eligible_teams = [tsi for tsi in self.eligible_teams if tsi not in capped]
+        for tsi in self.capped_teams:
+            self.excluded_teams[tsi] = BreakingTeam.Remark.CAPPED
+
 
 @register
 class Aida1996BreakGenerator(BaseAidaBreakGenerator):
@@ -46,9 +54,7 @@ class Aida1996BreakGenerator(BaseAidaBreakGenerator):
                 logger.info("Capped out, institution rank %d, cap %d: %s", institution_rank, self.institution_cap, tsi.team)
                 self.capped_teams.append(tsi)
 
-        for tsi in self.capped_teams:
-            self.eligible_teams.remove(tsi)
-            self.excluded_teams[tsi] = BreakingTeam.Remark.CAPPED
+        self._remove_capped_teams()
 
 
 class BaseAida2016BreakGenerator(BaseAidaBreakGenerator):
@@ -86,9 +92,7 @@ class BaseAida2016BreakGenerator(BaseAidaBreakGenerator):
         self.reinsert_capped_teams()
 
         # Now, exclude capped teams accordingly
-        for tsi in self.capped_teams:
-            self.eligible_teams.remove(tsi)
-            self.excluded_teams[tsi] = BreakingTeam.Remark.CAPPED
+        self._remove_capped_teams()
 
     def reinsert_capped_teams(self):
         """Unexcludes teams that were subject to the post-cutoff cap if there
@@ -115,8 +119,8 @@ class BaseAida2016BreakGenerator(BaseAidaBreakGenerator):
                 self.break_rank_correction = tsi, excess
                 break
 
-        for tsi in reinsert:
-            self.capped_teams.remove(tsi)
+        reinsert = set(reinsert)
+        self.capped_teams = [tsi for tsi in self.capped_teams if tsi not in reinsert]
 
 
 class BaseAida2016AustralsBreakGenerator(BaseAida2016BreakGenerator):
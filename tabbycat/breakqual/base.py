@@ -4,7 +4,7 @@ generator (which just takes the top teams)."""
 import logging
 from itertools import groupby
 
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from django.utils.encoding import force_str
 from django.utils.translation import ngettext
 
@@ -144,29 +144,38 @@ class BaseBreakGenerator:
         institution cap. Such cases should be accounted for directly in the
         `compute_break()` method.
         """
-        existing_remark_teams = self.team_queryset.filter(
-            breakingteam__break_category=self.category,
-            breakingteam__remark__isnull=False,
-        ).exclude(Q(breakingteam__remark__exact='') | Q(breakingteam__remark=BreakingTeam.Remark.RESERVE))
-        different_break_teams = self.team_queryset.exclude(
-            breakingteam__remark__in=[BreakingTeam.Remark.INELIGIBLE, BreakingTeam.Remark.RESERVE],
-            breakingteam__break_category__priority__gt=self.category.priority,
-        ).filter(
-            breakingteam__break_category__priority__gt=self.category.priority,
-        )
-        ineligible_teams = self.team_queryset.exclude(break_categories=self.category)
+        remarks = self.team_queryset.annotate(
+            has_existing_remark=Exists(self.category.breakingteam_set.filter(
+                team=OuterRef('pk'), remark__isnull=False,
+            ).exclude(Q(remark__exact='') | Q(remark=BreakingTeam.Remark.RESERVE))),
+            is_eligible=Exists(self.category.team_set.filter(pk=OuterRef('pk'))),
+            broke_in_different_break=Exists(BreakingTeam.objects.filter(
+                team=OuterRef('pk'), break_category__priority__gt=self.category.priority,
+            ).exclude(remark__in=[BreakingTeam.Remark.INELIGIBLE, BreakingTeam.Remark.RESERVE])),
+        ).values_list('id', 'has_existing_remark', 'is_eligible', 'broke_in_different_break').order_by()
+
+        existing_remark_team_ids = set()
+        ineligible_team_ids = set()
+        different_break_team_ids = set()
+        for team_id, has_existing_remark, is_eligible, broke_in_different_break in remarks:
+            if has_existing_remark:
+                existing_remark_team_ids.add(team_id)
+            if not is_eligible:
+                ineligible_team_ids.add(team_id)
+            if broke_in_different_break:
+                different_break_team_ids.add(team_id)
 
         self.excluded_teams = {}
         self.eligible_teams = []
 
         for tsi in self.standings:
-            if tsi.team in existing_remark_teams:
+            if tsi.team.id in existing_remark_team_ids:
                 logger.debug("Excluding %s because it has an existing remark", tsi.team)
                 self.excluded_teams[tsi] = None
-            elif tsi.team in ineligible_teams:
+            elif tsi.team.id in ineligible_team_ids:
                 logger.debug("Excluding %s because it is ineligible", tsi.team)
                 self.excluded_teams[tsi] = BreakingTeam.Remark.INELIGIBLE
-            elif tsi.team in different_break_teams:
+            elif tsi.team.id in different_break_team_ids:
                 logger.debug("Excluding %s because it broke in a different break", tsi.team)
                 self.excluded_teams[tsi] = BreakingTeam.Remark.DIFFERENT_BREAK
             else:
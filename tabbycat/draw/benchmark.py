@@ -0,0 +1,247 @@
+"""Benchmarks for draw generators.
+
+This module builds synthetic tournaments -- pools of teams with points,
+institutions, side histories and histories against other teams, as though a
+number of rounds had already been held -- and times draw generators on them.
+Like the draw generators themselves, it works only with Python objects and
+doesn't touch the database, so it measures only the cost of the draw
+algorithms.
+
+It's used by the `benchmarkdraw` management command.
+"""
+
+import gc
+import platform
+import random
+import time
+import tracemalloc
+from importlib.metadata import PackageNotFoundError, version
+
+from .generator import DrawGenerator, TeamHistoryMatrix
+from .generator.pairing import ResultPairing
+from .types import DebateSide
+
+
+class SyntheticTeam:
+    """Implements the team interface expected by draw generators."""
+
+    def __init__(self, id, institution, strength):
+        self.id = id
+        self.institution = institution
+        self.strength = strength
+        self.points = 0
+        self.hist = []
+        self.side_history = []
+        self.pullup_debates = 0
+        self.subrank = None
+        self.allocated_side = None
+
+    def __repr__(self):
+        return "<SyntheticTeam {0} of {1}>".format(self.id, self.institution)
+
+    @property
+    def institution_id(self):
+        return self.institution
+
+    def seen(self, other):
+        return self.hist.count(other.id)
+
+    def same_institution(self, other):
+        return self.institution is not None and self.institution == other.institution
+
+
+class SyntheticTournament:
+    """A pool of `n` synthetic teams, after `rounds` simulated preliminary
+    rounds.
+
+    Institution sizes are skewed, as in real tournaments: a few institutions
+    send many teams, and most send one or two. About one in twenty teams has
+    no institution. Each simulated round is (roughly) power-paired by folding
+    adjacent teams, and the stronger team in each debate usually wins.
+    """
+
+    def __init__(self, n, teams_in_debate=2, rounds=5, seed=0):
+        self.n = n
+        self.teams_in_debate = teams_in_debate
+        self.rng = random.Random(seed)
+        self.teams = self._make_teams()
+        self.history = TeamHistoryMatrix(self.teams)
+        for _ in range(rounds):
+            self._simulate_round()
+        self._annotate()
+
+    def _make_teams(self):
+        n_institutions = max(self.n // 4, 1)
+        institutions = list(range(1, n_institutions + 1))
+        weights = [1 / k for k in institutions]
+        teams = []
+        for i in range(1, self.n + 1):
+            institution = None if self.rng.random() < 0.05 else self.rng.choices(institutions, weights)[0]
+            team = SyntheticTeam(i, institution, self.rng.gauss(0, 1))
+            team.side_history = [0] * self.teams_in_debate
+            teams.append(team)
+        return teams
+
+    def _simulate_round(self):
+        k = self.teams_in_debate
+        teams = sorted(self.teams, key=lambda t: (-t.points, self.rng.random()))
+        for start in range(0, len(teams) - len(teams) % k, k):
+            debate = teams[start:start+k]
+            self.rng.shuffle(debate)
+            top_points = max(t.points for t in debate)
+
+            for side, team in enumerate(debate):
+                team.side_history[side] += 1
+                team.hist.extend(t.id for t in debate if t is not team)
+                if team.points < top_points:
+                    team.pullup_debates += 1
+            self.history.add_debate([t.id for t in debate])
+
+            ranking = sorted(debate, key=lambda t: t.strength + self.rng.gauss(0, 1), reverse=True)
+            for points, team in enumerate(reversed(ranking)):
+                team.points += points if k > 2 else int(points > 0)
+
+    def _annotate(self):
+        self.teams.sort(key=lambda t: (-t.points, -t.strength))
+        subranks = {}
+        for team in self.teams:
+            subranks[team.points] = subranks.get(team.points, 0) + 1
+            team.subrank = subranks[team.points]
+        for i, team in enumerate(self.teams):
+            team.allocated_side = [DebateSide.AFF, DebateSide.NEG][i % 2]
+
+
+class DrawBenchmark:
+    """A draw generator configuration to benchmark. `options` are passed to
+    `DrawGenerator`."""
+
+    def __init__(self, name, teams_in_debate, draw_type, **options):
+        self.name = name
+        self.teams_in_debate = teams_in_debate
+        self.draw_type = draw_type
+        self.options = options
+
+    def get_teams(self, tournament):
+        if self.draw_type == "elimination":
+            return []  # no teams bypassed the previous round
+        teams = tournament.teams
+        return teams[:len(teams) - len(teams) % self.teams_in_debate]
+
+    def get_results(self, tournament):
+        """For subsequent elimination rounds, returns results for a previous
+        round in which the largest power-of-two number of teams debated, and
+        the higher-ranked team in each debate won."""
+        if self.draw_type != "elimination":
+            return None
+        teams = tournament.teams[:2 ** (len(tournament.teams).bit_length() - 1)]
+        half = len(teams) // 2
+        return [ResultPairing([top, bottom], 0, i, winner=top)
+                for i, (top, bottom) in enumerate(zip(teams[:half], reversed(teams[half:])), start=1)]
+
+    def generate(self, tournament):
+        teams = self.get_teams(tournament)
+        results = self.get_results(tournament)
+        history = tournament.history if self.options.get("avoid_history", True) else None
+        generator = DrawGenerator(self.teams_in_debate, self.draw_type, teams, results, history=history, **self.options)
+        return generator.generate()
+
+    def run(self, tournament):
+        """Generates a draw for `tournament`, and returns a tuple
+        `(seconds, number_of_pairings)`."""
+        gc.collect()
+        start = time.perf_counter()
+        pairings = self.generate(tournament)
+        elapsed = time.perf_counter() - start
+        return elapsed, len(pairings)
+
+    def measure_memory(self, tournament):
+        """Generates a draw for `tournament`, and returns the peak memory (in
+        bytes) allocated while doing so. This is separate from `run()`, because
+        tracing allocations slows generators down a lot."""
+        gc.collect()
+        tracemalloc.start()
+        try:
+            self.generate(tournament)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+
+DRAW_BENCHMARKS = [
+    DrawBenchmark("power_paired_australs", 2, "power_paired", avoid_conflicts="one_up_one_down"),
+    DrawBenchmark("power_paired_graph", 2, "power_paired", avoid_conflicts="graph",
+        odd_bracket="pullup_top", pairing_method="slide"),
+    DrawBenchmark("power_paired_graph_one", 2, "power_paired", avoid_conflicts="graph_one",
+        odd_bracket="pullup_top", pairing_method="slide", pullup_penalty=10),
+    DrawBenchmark("power_paired_graph_preallocated", 2, "power_paired", avoid_conflicts="graph",
+        odd_bracket="pullup_top", pairing_method="slide", side_allocations="preallocated"),
+    DrawBenchmark("random", 2, "random"),
+    DrawBenchmark("random_graph", 2, "random", avoid_conflicts="graph"),
+    DrawBenchmark("bp_hungarian", 4, "power_paired"),
+    DrawBenchmark("bp_random", 4, "random"),
+    DrawBenchmark("first_elimination", 2, "first_elimination"),
+    DrawBenchmark("elimination", 2, "elimination"),
+]
+
+DEFAULT_SIZES = [50, 100, 250, 500, 1000]
+
+
+def get_environment():
+    """Returns a dict describing the environment, so that benchmark results can
+    be compared like with like."""
+    environment = {"python": platform.python_version(), "machine": platform.machine()}
+    for package in ["numpy", "scipy", "networkx", "munkres"]:
+        try:
+            environment[package] = version(package)
+        except PackageNotFoundError:
+            environment[package] = None
+    return environment
+
+
+def run_benchmarks(benchmarks=DRAW_BENCHMARKS, sizes=DEFAULT_SIZES, rounds=5, repeat=3, seed=0, callback=None):
+    """Runs each benchmark on a synthetic tournament of each size, and returns
+    a list of dicts, one for each combination. Times are the minimum over
+    `repeat` runs; memory is the peak traced allocation during a separate run,
+    so that tracing doesn't inflate the times.
+    If given, `callback` is called with each dict as it's produced."""
+    results = []
+    tournaments = {}
+    for benchmark in benchmarks:
+        for n in sizes:
+            key = (n, benchmark.teams_in_debate)
+            if key not in tournaments:
+                tournaments[key] = SyntheticTournament(n, benchmark.teams_in_debate, rounds, seed)
+            times = []
+            for i in range(repeat):
+                elapsed, npairings = benchmark.run(tournaments[key])
+                times.append(elapsed)
+            peak_memory = benchmark.measure_memory(tournaments[key])
+            result = {
+                "generator": benchmark.name,
+                "teams": n,
+                "debates": npairings,
+                "time": min(times),
+                "times": times,
+                "peak_memory": peak_memory,
+            }
+            results.append(result)
+            if callback is not None:
+                callback(result)
+    return results
+
+
+def compare_results(baseline, results, tolerance=0.2):
+    """Compares `results` against `baseline` (both lists of dicts as returned
+    by `run_benchmarks()`), and returns a list of `(result, baseline_result,
+    ratio)` tuples for results whose time was more than `tolerance` (as a
+    fraction) slower than the baseline."""
+    baseline = {(r["generator"], r["teams"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = baseline.get((result["generator"], result["teams"]))
+        if base is None or base["time"] <= 0:
+            continue
+        ratio = result["time"] / base["time"]
+        if ratio > 1 + tolerance:
+            regressions.append((result, base, ratio))
+    return regressions
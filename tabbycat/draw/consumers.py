@@ -4,12 +4,19 @@ from asgiref.sync import async_to_sync
 from channels.consumer import SyncConsumer
 from channels.generic.websocket import JsonWebsocketConsumer
 from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils.translation import ngettext
 
 from actionlog.models import ActionLogEntry
+from adjallocation.edits import apply_allocation_edits, EditQueue
+from adjallocation.models import DebateAdjudicator
 from adjallocation.serializers import SimpleDebateAllocationSerializer, SimpleDebateImportanceSerializer
+from standings.round_results import invalidate_results_matrix
 from tournaments.mixins import RoundWebsocketMixin
 from users.permissions import Permission
+from utils.jobs import get_job_pool
 from utils.mixins import SuperuserRequiredWebsocketMixin
+from utils.serializers import prefetch_for_serializer
 from venues.serializers import SimpleDebateVenueSerializer
 
 from .models import Debate, DebateTeam
@@ -47,64 +54,87 @@ class BaseAdjudicatorContainerConsumer(SuperuserRequiredWebsocketMixin, RoundWeb
                       'group_name': self.group_name()},
         })
 
-    def get_debates_or_panels(self, debates_or_panels):
-        """ Retrieve either the debates or panels from the JSON id keys """
+    def get_debates_or_panels(self, debates_or_panels, serializer=None):
+        """ Retrieve either the debates or panels from the JSON id keys, with
+        what `serializer` needs prefetched if given """
         ids = [id for (id, d_or_p) in debates_or_panels.items()]
-        debates_or_panels = list(self.model.objects.filter(id__in=ids))
+        debates_or_panels = self.model.objects.filter(id__in=ids)
+        if serializer is not None:
+            debates_or_panels = prefetch_for_serializer(serializer, debates_or_panels)
+        debates_or_panels = list(debates_or_panels)
         # TODO: error handling if return items fewer/more than expected
         return debates_or_panels
 
-    def receive_importance(self, content):
-        """ Update importances on the django data then reserialize/return it """
-        changes = {int(c['id']): c for c in content['importance']}
-        debates_or_panels = self.get_debates_or_panels(changes)
-        for d_or_p in debates_or_panels:
-            d_or_p.importance = changes[d_or_p.id]['importance']
-            d_or_p.save()
-
-        serialized = self.importance_serializer(debates_or_panels, many=True)
-        content_to_return = content.copy()
-        del content_to_return['importance'] # Reserialise as debatesOrPanels
-        self.return_attributes(content_to_return, serialized)
+    def queue_edit(self, edit):
+        """ Queue an edit, and have this consumer apply the queue (with any
+        edits from other consumers) once the coalescing window has passed """
+        EditQueue(self.group_prefix, self.round.id).push(edit)
+        async_to_sync(self.channel_layer.send)(self.channel_name, {
+            'type': 'apply_queued_edits',
+            'round_id': self.round.id,
+        })
 
-    def delete_adjudicators(self, debate_or_panel, adj_ids):
-        return debate_or_panel.related_adjudicator_set.exclude(
-            adjudicator_id__in=adj_ids).delete()
+    async def dispatch(self, message):
+        # Waiting for other edits is done in the event loop, not in a
+        # synchronous handler, which would block every synchronous consumer
+        if message['type'] == 'apply_queued_edits':
+            await EditQueue(self.group_prefix, message['round_id']).apply_later(self.apply_edits)
+        else:
+            await super().dispatch(message)
 
-    def create_adjudicators(self, debate_or_panel, adj_id, adj_type):
-        return debate_or_panel.related_adjudicator_set.update_or_create(
-            adjudicator_id=adj_id, defaults={'type': adj_type})
+    def receive_importance(self, content):
+        """ Queue the new importances to be applied with other edits """
+        self.queue_edit({'importance': content['importance']})
 
     def receive_adjudicators(self, content):
-        """ Update adjudicators on the django data then reserialize/return it """
-        changes = {int(c['id']): c for c in content['adjudicators']}
-        # TODO: prefetch the adjudicator allocation objects
-        debates_or_panels = self.get_debates_or_panels(changes)
-        for d_or_p in debates_or_panels:
-            sent_allocation = changes[d_or_p.id]['adjudicators']
-            sent_allocation_ids = []
-            for (position, position_ids) in sent_allocation.items():
-                sent_allocation_ids.extend(adj_id for adj_id in position_ids)
-
-            # Delete adjudicators in the posted information
-            self.delete_adjudicators(d_or_p, sent_allocation_ids)
-            # Re-create positions of adjudicators in debate
-            for (position, position_ids) in sent_allocation.items():
-                for adjudicator_id in position_ids:
-                    self.create_adjudicators(d_or_p, adjudicator_id, position)
-
-        # Re-fetch the modified data
-        # TODO: is it necessary to re-fetch? Or should the objects be returned?
-        debates_or_panels = self.get_debates_or_panels(changes)
-        serialized = self.adjudicators_serializer(debates_or_panels, many=True)
-        content_to_return = content.copy()
-        del content_to_return['adjudicators']
-        self.return_attributes(content_to_return, serialized)
+        """ Queue the new adjudicators to be applied with other edits """
+        self.queue_edit({'adjudicators': content['adjudicators']})
+
+    def apply_edits(self, edits):
+        """ Apply queued importance and adjudicator edits, in the order they
+        were queued, and broadcast the resulting debates or panels """
+        importances = {}
+        allocations = []
+        for edit in edits:
+            for change in edit.get('importance', []):
+                importances[int(change['id'])] = change['importance']
+            for change in edit.get('adjudicators', []):
+                allocations.append((int(change['id']), change['adjudicators'], change.get('previous')))
+
+        with transaction.atomic():
+            debates_or_panels = list(self.model.objects.filter(id__in=importances).select_for_update())
+            for d_or_p in debates_or_panels:
+                d_or_p.importance = importances[d_or_p.id]
+            self.model.objects.bulk_update(debates_or_panels, ['importance'])
+
+            if allocations:
+                changed = apply_allocation_edits(self.model, self.adjudicator_model, self.container_field, allocations)
+            else:
+                changed = set()
+
+        # Send every edited debate or panel, not just those that changed, so
+        # that pages whose edits were merged with others' show the result
+        serialized = {}
+        adjudicators_ids = changed | {container_id for container_id, allocation, previous in allocations}
+        for serializer, ids in [(self.importance_serializer, importances),
+                                (self.adjudicators_serializer, adjudicators_ids)]:
+            if not ids:
+                continue
+            debates_or_panels = prefetch_for_serializer(serializer, self.model.objects.filter(id__in=ids))
+            for item in serializer(debates_or_panels, many=True).data:
+                serialized.setdefault(item['id'], {}).update(item)
+
+        logger.debug("Applied %d edits to %d %s", len(edits), len(serialized), self.group_prefix)
+        self.broadcast_content({'debatesOrPanels': list(serialized.values())})
 
     def return_attributes(self, original_content, serialized_content):
         """ Return the original JSON but with the generic debatesOrPanels key """
         original_content['debatesOrPanels'] = serialized_content.data
+        self.broadcast_content(original_content)
 
+    def broadcast_content(self, original_content):
+        """ Send content with a debatesOrPanels key to the group of every round
+        that those debates or panels are in """
         # Determine which round sequences are affected by this change. If round_seq
         # is present on items, broadcast to each relevant round-specific group so
         # that all concurrent rounds' pages receive the update.
@@ -136,6 +166,8 @@ class BaseAdjudicatorContainerConsumer(SuperuserRequiredWebsocketMixin, RoundWeb
 class DebateEditConsumer(BaseAdjudicatorContainerConsumer):
     group_prefix = 'debates'
     model = Debate
+    adjudicator_model = DebateAdjudicator
+    container_field = 'debate'
     importance_serializer = SimpleDebateImportanceSerializer
     sides_status_serializer = SimpleDebateSideStatusSerializer
     adjudicators_serializer = SimpleDebateAllocationSerializer
@@ -186,7 +218,7 @@ class DebateEditConsumer(BaseAdjudicatorContainerConsumer):
             sent_teams = changes[debate.id]['teams']
             self.modify_debate_teams(debate, sent_teams)
 
-        debates = self.get_debates_or_panels(changes)
+        debates = self.get_debates_or_panels(changes, self.teams_serializer)
         serialized = self.teams_serializer(debates, many=True,
             context={'sides': self.tournament.sides})
         content_to_return = content.copy()
@@ -198,9 +230,13 @@ class DebateEditConsumer(BaseAdjudicatorContainerConsumer):
         debates = self.get_debates_or_panels(changes)
         for debate in debates:
             setattr(debate, field_name, changes[debate.id][content_name])
-            debate.save()
+        Debate.objects.bulk_update(debates, [field_name])
+        if field_name == 'sides_confirmed':
+            # bulk_update() doesn't send signals, and the results matrix records sides
+            tournament_id = self.tournament.id
+            transaction.on_commit(lambda: invalidate_results_matrix([tournament_id]))
 
-        debates = self.get_debates_or_panels(changes)
+        debates = self.get_debates_or_panels(changes, serializer)
         serialized = serializer(debates, many=True)
         content_to_return = content.copy()
         del content_to_return[key]
@@ -216,23 +252,43 @@ class EditDebateOrPanelWorkerMixin(SyncConsumer):
                 round=round, tournament=round.tournament, content_object=round)
 
     def reserialize_panels(self, serialiser, round, panels=None):
-        if not panels:
-            panels = round.preformedpanel_set.all() # TODO: prefetch
-
+        """ Serialises `panels`, or all panels in the round if `panels` is
+        None. An empty list is serialised as it is, so that only the panels
+        that changed can be broadcast. """
+        if panels is None:
+            panels = round.preformedpanel_set.all()
+        panels = prefetch_for_serializer(serialiser, panels)
         serialized_panels = serialiser(panels, many=True)
         return serialized_panels
 
     def reserialize_debates(self, serialiser, round, debates=None):
-        if not debates:
-            debates = round.debate_set.all() # TODO: prefetch
+        """ Like reserialize_panels(), but for debates. """
+        if debates is None:
+            debates = round.debate_set.all()
+        debates = prefetch_for_serializer(serialiser, debates)
         serialized_debates = serialiser(debates, many=True)
         return serialized_debates
 
+    def cancel_jobs(self, event):
+        """ Cancel this round's jobs that are waiting in the job pool """
+        pool = get_job_pool()
+        ncancelled = 0
+        if pool is not None:
+            round_id = event['extra']['round_id']
+            ncancelled = pool.cancel(event['extra']['tournament_id'], lambda job: job.key[1] == round_id)
+        self.return_message(event['extra']['group_name'], ngettext(
+            "Cancelled %(count)d waiting job.",
+            "Cancelled %(count)d waiting jobs.", ncancelled) % {'count': ncancelled}, 'info')
+
     def return_error(self, group_name, error_text):
         """ Because the worker can't do proper returns we can't really catch
         exceptions across each function; provide a manual handler instead. """
         logger.warning(error_text)
-        content = {'message': {'text': error_text, 'type': 'danger'}}
+        self.return_message(group_name, error_text, 'danger')
+
+    def return_message(self, group_name, message_text, message_type):
+        """ Sends a message without any debates or panels. """
+        content = {'message': {'text': message_text, 'type': message_type}}
         async_to_sync(get_channel_layer().group_send)(
             group_name, {
                 'type': 'broadcast_debates_or_panels',
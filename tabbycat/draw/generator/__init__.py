@@ -10,6 +10,7 @@ from .random import (RandomBPDrawGenerator, RandomPolyDrawGenerator, GraphRandom
 from .bphungarian import BPHungarianDrawGenerator
 from .bpelimination import (PartialBPEliminationDrawGenerator, AfterPartialBPEliminationDrawGenerator,
     FirstBPEliminationDrawGenerator, SubsequentBPEliminationDrawGenerator)
+from .history import TeamHistoryMatrix
 
 
 DRAW_FLAG_DESCRIPTIONS = (
@@ -79,11 +80,13 @@ def get_poly_generator(draw_type):
         raise ValueError("Unrecognised draw type for poly draw: {}".format(draw_type))
 
 
-def DrawGenerator(teams_in_debate, draw_type, teams, results=None, rrseq=None, **kwargs):  # noqa: N802 (factory function)
+def DrawGenerator(teams_in_debate, draw_type, teams, results=None, rrseq=None, history=None, **kwargs):  # noqa: N802 (factory function)
     """Factory for draw objects.
     Takes a list of options and returns an appropriate subclass of BaseDrawGenerator.
     'draw_type' is mandatory and can be any of 'random', 'power_paired',
         'first_elimination' and 'elimination'.
+    'history', if given, is a TeamHistoryMatrix covering `teams`, used in place
+        of the teams' `seen()` method.
     """
 
     if draw_type == "manual":
@@ -99,4 +102,4 @@ def DrawGenerator(teams_in_debate, draw_type, teams, results=None, rrseq=None, *
         klass = get_poly_generator(draw_type)
 
     kwargs['teams_in_debate'] = teams_in_debate
-    return klass(teams, results, rrseq, **kwargs)
+    return klass(teams, results, rrseq, history=history, **kwargs)
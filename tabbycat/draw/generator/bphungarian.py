@@ -5,11 +5,13 @@ from collections import Counter
 from math import log2
 from statistics import pvariance
 
-import munkres
+import numpy as np
 from django.utils.translation import gettext as _
 
 from .common import BaseBPDrawGenerator, DrawUserError
+from .matching import get_matching_backend
 from .pairing import PolyPairing
+from .profiling import profile_phase
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +66,10 @@ class BPHungarianDrawGenerator(BaseBPDrawGenerator):
             "hungarian_preshuffled" - Hungarian algorithm, with the rows and
                                       columns of the cost matrix permuted
                                       randomly beforehand.
+
+        "matching_backend" - Name of the backend used to solve the assignment
+                             problem, see matching.py. All backends find an
+                             optimal assignment.
     """
 
     requires_even_teams = True
@@ -75,18 +81,21 @@ class BPHungarianDrawGenerator(BaseBPDrawGenerator):
         "renyi_order"      : 1.0,
         "exponent"         : 4.0,
         "assignment_method": "hungarian_preshuffled",
+        "matching_backend" : "scipy",
     }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.check_teams_for_attribute("points")
         self.check_teams_for_attribute("side_history")
-        self.munkres = munkres.Munkres()
+        self.matching_backend = get_matching_backend(self.options["matching_backend"])
 
     def generate(self):
         self._rooms = self.define_rooms([team.points for team in self.teams])
-        self._costs = self.generate_cost_matrix(self._rooms)
-        self._indices = self.solve_assignment(self._costs)
+        with profile_phase("costs"):
+            self._costs = self.generate_cost_matrix(self._rooms)
+        with profile_phase("matching"):
+            self._indices = self.solve_assignment(self._costs)
         self._draw = self.make_pairings(self._rooms, self._indices)
 
         self.annotate_team_flags(self._draw)  # operates in-place
@@ -217,33 +226,105 @@ class BPHungarianDrawGenerator(BaseBPDrawGenerator):
             return (2 - log2(sum([p ** α for p in probs])) / (1 - α)) * n
         return _position_cost_renyi_entropy
 
+    # Array versions of the position cost functions. These take a (nteams, 4)
+    # array of side histories, and return a (nteams, 4) array of the cost of
+    # putting each team in each position.
+
+    POSITION_COST_MATRIX_FUNCTIONS = {
+        "simple" : "_position_cost_simple_matrix",
+        "variance": "_position_cost_variance_matrix",
+    }
+
+    @staticmethod
+    def get_entropy_position_cost_matrix_function(α):  # noqa: N803
+        if α == 1.0:
+            logger.info("Using Shannon entropy (α = 1)")
+            return BPHungarianDrawGenerator._position_cost_shannon_entropy_matrix
+        elif α == 0.0:
+            logger.info("Using min-entropy (α = 0)")
+            return BPHungarianDrawGenerator._position_cost_min_entropy_matrix
+        elif α > 0.0:
+            logger.info("Using Rényi entropy with α = %f", α)
+            return BPHungarianDrawGenerator._get_position_cost_renyi_entropy_matrix_function(α)
+        else:
+            raise DrawUserError(_("The Rényi order can't be negative, and it's currently set "
+                "to %(alpha)f.") % {'alpha': α})
+
+    def get_position_cost_matrix_function(self):
+        """Array version of get_position_cost_function(). Custom functions
+        take the position and side history of one team, so they're applied to
+        each team and position in turn."""
+        position_cost = self.options["position_cost"]
+        if position_cost == "entropy":
+            return self.get_entropy_position_cost_matrix_function(self.options["renyi_order"])
+        elif callable(position_cost):
+            def _position_cost_custom_matrix(histories):
+                return np.array([[position_cost(pos, history) for pos in range(4)]
+                                 for history in histories.tolist()], dtype=float).reshape(len(histories), 4)
+            return _position_cost_custom_matrix
+        else:
+            return self.get_option_function("position_cost", self.POSITION_COST_MATRIX_FUNCTIONS)
+
+    @staticmethod
+    def _update_history_matrix(histories):
+        """Returns a (nteams, 4, 4) array, where element [i, pos] is the side
+        history of team i after being put in position pos."""
+        return histories[:, None, :] + np.eye(4, dtype=histories.dtype)[None, :, :]
+
+    @staticmethod
+    def _position_cost_simple_matrix(histories):
+        return histories.astype(float)
+
+    @staticmethod
+    def _position_cost_variance_matrix(histories):
+        return BPHungarianDrawGenerator._update_history_matrix(histories).var(axis=2)
+
+    @staticmethod
+    def _position_cost_shannon_entropy_matrix(histories):
+        histories = BPHungarianDrawGenerator._update_history_matrix(histories)
+        n = histories.sum(axis=2)
+        probs = histories / n[:, :, None]
+        selfinfo = -probs * np.log2(np.where(probs > 0, probs, 1))
+        return (2 - selfinfo.sum(axis=2)) * n
+
+    @staticmethod
+    def _position_cost_min_entropy_matrix(histories):
+        histories = BPHungarianDrawGenerator._update_history_matrix(histories)
+        return (2 - np.log2((histories > 0).sum(axis=2))) * histories.sum(axis=2)
+
+    @staticmethod
+    def _get_position_cost_renyi_entropy_matrix_function(α):  # noqa: N803
+        def _position_cost_renyi_entropy_matrix(histories):
+            histories = BPHungarianDrawGenerator._update_history_matrix(histories)
+            n = histories.sum(axis=2)
+            probs = histories / n[:, :, None]
+            return (2 - np.log2((probs ** α).sum(axis=2)) / (1 - α)) * n
+        return _position_cost_renyi_entropy_matrix
+
     def generate_cost_matrix(self, rooms):
-        """Returns a cost matrix for the tournament.
-        Rows (inner lists) are teams, in the same order as in `self.teams`.
-        Columns (elements) are positions in rooms, ordered first by room in the
-        order returned by `rooms`, then in speaking order (OG, OO, CG, CO).
+        """Returns a cost matrix for the tournament, as an array.
+        Rows are teams, in the same order as in `self.teams`.
+        Columns are positions in rooms, ordered first by room in the order
+        returned by `rooms`, then in speaking order (OG, OO, CG, CO).
         Rules:
-         - if the team (given its points) is not allowed in the room, use
-           DISALLOWED.
+         - if the team (given its points) is not allowed in the room, use NaN.
          - otherwise, for each position, use the position cost for that position
            (for a team with that position history).
+        Position costs depend only on the team, so they're computed once per
+        team, for all teams at once from an array of side histories, and then
+        tiled across all rooms.
         """
         nteams = len(self.teams)
-        cost = self.get_position_cost_function()
+        cost = self.get_position_cost_matrix_function()
         exponent = self.options["exponent"]
 
-        costs = []
-        for team in self.teams:
-            row = []
-            for level, allowed in rooms:
-                if team.points not in allowed:
-                    row.extend([munkres.DISALLOWED] * 4)
-                else:
-                    row.extend([cost(pos, team.side_history) ** exponent for pos in range(4)])
-            assert len(row) == nteams
-            costs.append(row)
-
-        assert len(costs) == nteams
+        histories = np.array([team.side_history for team in self.teams], dtype=int).reshape(nteams, 4)
+        position_costs = cost(histories) ** exponent
+        points = [team.points for team in self.teams]
+        allowed = np.array([np.isin(points, list(allowed)) for level, allowed in rooms], dtype=bool).reshape(len(rooms), nteams).T
+
+        costs = np.where(np.repeat(allowed, 4, axis=1), np.tile(position_costs, len(rooms)), np.nan)
+        assert costs.shape == (nteams, nteams)
         return costs
 
     # Assignment algorithms
@@ -261,20 +342,20 @@ class BPHungarianDrawGenerator(BaseBPDrawGenerator):
         start = time.perf_counter()
         logger.info("Running assignment algorithm for %d teams...", len(costs))
         indices = function(costs)
-        total_cost = sum(costs[i][j] for i, j in indices)
+        total_cost = sum(costs[i, j] for i, j in indices)
         elapsed = time.perf_counter() - start
         logger.info("Assignment took %.2f seconds, total cost: %f", elapsed, total_cost)
         return indices
 
     def _assign_hungarian(self, costs):
-        return self.munkres.compute(costs)
+        return self.matching_backend.assign(costs)
 
     def _assign_hungarian_preshuffled(self, costs):
         n = len(costs)
         K = random.sample(range(n), n)             # noqa: N806
         J = random.sample(range(n), n)             # noqa: N806
-        C = [[costs[i][j] for j in J] for i in K]  # noqa: N806
-        indices = self.munkres.compute(C)
+        C = costs[np.ix_(K, J)]                    # noqa: N806
+        indices = self.matching_backend.assign(C)
         return [(K[i], J[j]) for i, j in indices]
 
     # Make pairings
@@ -40,11 +40,12 @@ class BaseDrawGenerator:
     requires_prev_results = False
     requires_rrseq = False
 
-    def __init__(self, teams, results=None, rrseq=None, **kwargs):
+    def __init__(self, teams, results=None, rrseq=None, history=None, **kwargs):
         self.teams = teams
         self.team_flags = dict()
         self.results = results
         self.rrseq = rrseq
+        self.history = history
 
         kwargs.pop('teams_in_debate', None)
 
@@ -79,6 +80,47 @@ class BaseDrawGenerator:
         """Abstract method."""
         raise NotImplementedError
 
+    def seen(self, team1, team2):
+        """Returns the number of times the two teams have seen each other. Uses
+        the history matrix if one was provided, otherwise falls back to the
+        `seen()` method of the teams."""
+        if self.history is not None:
+            return self.history.seen(team1, team2)
+        return team1.seen(team2)
+
+    def draw_penalty(self, pairings):
+        """Returns the total penalty of a draw, for comparing different draws
+        generated from the same teams. This is the sum, over all debates, of
+        penalties for teams that have seen each other, teams from the same
+        institution, teams that are pulled up, and side imbalance that the
+        draw would leave teams with. Each is weighted by the corresponding
+        penalty option, where the generator has one."""
+        history_penalty = self.options.get("history_penalty", 1e3)
+        institution_penalty = self.options.get("institution_penalty", 1)
+        side_penalty = self.options.get("side_penalty", 1)
+        pullup_penalty = self.options.get("pullup_penalty", 1)
+
+        total = 0
+        for pairing in pairings:
+            teams = pairing.teams
+            for i, team1 in enumerate(teams):
+                for team2 in teams[i+1:]:
+                    total += history_penalty * self.seen(team1, team2)
+                    total += institution_penalty * team1.same_institution(team2)
+
+            points = [getattr(team, 'points', None) for team in teams]
+            if None not in points:
+                total += pullup_penalty * sum(p < max(points) for p in points)
+
+            for side, team in enumerate(teams):
+                side_history = getattr(team, 'side_history', None)
+                if side_history:
+                    after = list(side_history)
+                    after[side] += 1
+                    total += side_penalty * (max(after) - min(after))
+
+        return total
+
     def get_option_function(self, option_name, option_dict):
         option = self.options[option_name]
         if callable(option):
@@ -158,6 +200,8 @@ class BasePairDrawGenerator(BaseDrawGenerator):
         "avoid_institution" - if True, draw tries to avoid pairing teams that
             are from the same institution.
         "side_penalty" - A penalty to apply when optimizing with side balance
+        "matching_backend" - Name of the matching backend used by graph-based
+            generators, see matching.py.
         """
 
     BASE_DEFAULT_OPTIONS = {
@@ -171,6 +215,7 @@ class BasePairDrawGenerator(BaseDrawGenerator):
         "pairing_penalty"       : 0,
         "avoid_conflicts"       : "off",
         "max_times_on_one_side" : 0,
+        "matching_backend"      : "scipy",
     }
 
     TEAMS_IN_DEBATE = 2
@@ -186,7 +231,7 @@ class BasePairDrawGenerator(BaseDrawGenerator):
         super().__init__(teams, results, rrseq, **kwargs)
 
         # Check for required team attributes. Subclasses might do more.
-        if self.options["avoid_history"]:
+        if self.options["avoid_history"] and self.history is None:
             self.check_teams_for_attribute("seen", checkfunc=callable)
         if self.options["avoid_institution"]:
             self.check_teams_for_attribute("institution")
@@ -2,8 +2,10 @@ from collections import OrderedDict
 from typing import Optional, TYPE_CHECKING
 
 import munkres
-import networkx as nx
+import numpy as np
 
+from .matching import get_matching_backend
+from .profiling import profile_phase
 from ..types import DebateSide
 
 if TYPE_CHECKING:
@@ -18,7 +20,22 @@ def sign(n: int) -> int:
         return 0
 
 
+def institution_codes(*team_lists) -> list[np.ndarray]:
+    """Returns an array of integer codes for the institutions of the teams in
+    each of the given lists, such that two teams have the same code if and
+    only if they're from the same institution, even if they're in different
+    lists. Teams with no institution get -1, which matches nothing."""
+    codes = {}
+    return [np.array([-1 if team.institution_id is None else codes.setdefault(team.institution_id, len(codes))
+                      for team in teams], dtype=int) for teams in team_lists]
+
+
 class GraphGeneratorMixin:
+
+    @property
+    def matching_backend(self):
+        return get_matching_backend(self.options["matching_backend"])
+
     def avoid_conflicts(self, pairings):
         """Graph optimisation avoids conflicts, so method is extraneous."""
         pass
@@ -29,7 +46,7 @@ class GraphGeneratorMixin:
 
         penalty = 0
         if self.options["avoid_history"]:
-            penalty += t1.seen(t2) * self.options["history_penalty"]
+            penalty += self.seen(t1, t2) * self.options["history_penalty"]
         if self.options["avoid_institution"] and t1.same_institution(t2):
             penalty += self.options["institution_penalty"]
 
@@ -57,26 +74,71 @@ class GraphGeneratorMixin:
 
         return penalty
 
+    def history_matrix(self, teams1, teams2) -> np.ndarray:
+        """Returns an array of the number of times each team in `teams1` (rows)
+        has seen each team in `teams2` (columns)."""
+        if self.history is not None:
+            return self.history.submatrix(teams1, teams2)
+        return np.array([[self.seen(t1, t2) for t2 in teams2] for t1 in teams1],
+                        dtype=int).reshape(len(teams1), len(teams2))
+
+    def assignment_cost_matrix(self, teams1, teams2, size, bracket=None) -> np.ndarray:
+        """Array version of assignment_cost(). Returns a matrix of the cost of
+        pairing each team in `teams1` (rows) with each team in `teams2`
+        (columns), computed using array operations on per-team attributes.
+        Pairings for which assignment_cost() would return None are NaN."""
+        penalty = np.zeros((len(teams1), len(teams2)))
+        disallowed = np.equal.outer([id(t) for t in teams1], [id(t) for t in teams2]).reshape(penalty.shape)
+
+        if self.options["avoid_history"]:
+            penalty += self.history_matrix(teams1, teams2) * self.options["history_penalty"]
+        if self.options["avoid_institution"]:
+            codes1, codes2 = institution_codes(teams1, teams2)
+            same_institution = np.equal.outer(codes1, codes2) & (codes1 >= 0)[:, None]
+            penalty += same_institution * self.options["institution_penalty"]
+
+        # Add penalty of a side imbalance; see assignment_cost() for rationale
+        if self.options["side_allocations"] == "balance" and self.options["side_penalty"] > 0:
+            t1_affs, t1_negs = np.array([t.side_history for t in teams1], dtype=int).reshape(-1, 2).T
+            t2_affs, t2_negs = np.array([t.side_history for t in teams2], dtype=int).reshape(-1, 2).T
+
+            if self.options["max_times_on_one_side"] > 0:
+                # Mirrors assignment_cost(), which checks t1_negs rather than t2_negs
+                max_times = self.options["max_times_on_one_side"]
+                disallowed |= np.logical_or.outer(np.maximum(t1_affs, t1_negs) > max_times, t2_affs > max_times)
+
+            t1_diffs, t2_diffs = t1_affs - t1_negs, t2_affs - t2_negs
+            imbalance = np.maximum(0, np.multiply.outer(np.sign(t1_diffs), np.sign(t2_diffs)))
+            magnitude = np.add.outer(np.abs(t1_diffs), np.abs(t2_diffs)) // 2
+            penalty += imbalance * magnitude * self.options["side_penalty"]
+
+        penalty[disallowed] = np.nan
+        return penalty
+
+    def pairing_cost_matrix(self, teams, size, bracket=None):
+        """Returns the square matrix of costs of pairing teams in `teams` with
+        each other, as passed to the matching backend. Subclasses can override
+        this to return a sparse matrix of just the pairings that can happen
+        (see `matching.edge_list()`)."""
+        return self.assignment_cost_matrix(teams, teams, size, bracket)
+
     def get_n_teams(self, teams: list['Team']) -> int:
         return len(teams)
 
     def generate_pairings(self, brackets):
-        """Creates an undirected weighted graph for each bracket and gets the minimum weight matching"""
+        """Computes the matrix of pairing costs for each bracket and gets the minimum weight matching"""
         from .pairing import Pairing
         pairings = OrderedDict()
         i = 0
         for j, (points, teams) in enumerate(brackets.items()):
             pairings[points] = []
-            graph = nx.Graph()
             n_teams = self.get_n_teams(teams)
-            for k, t1 in enumerate(teams):
-                for t2 in teams[k+1:]:
-                    penalty = self.assignment_cost(t1, t2, n_teams, j)
-                    if penalty is not None:
-                        graph.add_edge(t1, t2, weight=penalty)
-
-            # nx.nx_pydot.write_dot(graph, sys.stdout)
-            for pairing in sorted(nx.min_weight_matching(graph), key=lambda p: self.room_rank_ordering(p)):
+            with profile_phase("costs"):
+                costs = self.pairing_cost_matrix(teams, n_teams, j)
+            with profile_phase("matching"):
+                matching = [(teams[k1], teams[k2]) for k1, k2 in self.matching_backend.match(costs)]
+
+            for pairing in sorted(matching, key=lambda p: self.room_rank_ordering(p)):
                 i += 1
                 pairings[points].append(Pairing(teams=pairing, bracket=self.get_bracket(pairing, points), room_rank=i))
 
@@ -90,7 +152,7 @@ class GraphGeneratorMixin:
 
 
 class GraphAllocatedSidesMixin(GraphGeneratorMixin):
-    """Use Hungarian algorithm rather than Bloom.
+    """Use an assignment algorithm (e.g. Hungarian) rather than Blossom.
 
     This is possible as assigning the sides creates a bipartite graph rather than
     a more complete graph."""
@@ -108,9 +170,12 @@ class GraphAllocatedSidesMixin(GraphGeneratorMixin):
         for points, pool in brackets.items():
             pairings[points] = []
             n_teams = len(pool[DebateSide.AFF]) + len(pool[DebateSide.NEG])
-            matrix = [[self.assignment_cost(aff, neg, n_teams) for neg in pool[DebateSide.NEG]] for aff in pool[DebateSide.AFF]]
+            with profile_phase("costs"):
+                matrix = self.assignment_cost_matrix(pool[DebateSide.AFF], pool[DebateSide.NEG], n_teams)
+            with profile_phase("matching"):
+                assignment = self.matching_backend.assign(matrix)
 
-            for i_aff, i_neg in munkres.Munkres().compute(matrix):
+            for i_aff, i_neg in assignment:
                 i += 1
                 pairings[points].append(Pairing(teams=[pool[DebateSide.AFF][i_aff], pool[DebateSide.NEG][i_neg]], bracket=points, room_rank=i))
 
@@ -0,0 +1,48 @@
+"""Team history matrix.
+
+The history matrix holds how many times each pair of teams has met in prior
+rounds, so that draw generators can look up the history between any two teams
+without making a database query for each pair.
+
+Like the pairing classes, this is a Python-only data structure. Loading it from
+the database is the responsibility of the draw manager.
+"""
+
+import numpy as np
+
+
+class TeamHistoryMatrix:
+    """Square matrix of pairwise team encounters, indexed by team.
+
+    Each team is assigned a row/column index on construction; `self.counts[i, j]`
+    is the number of debates in which the teams with indices `i` and `j` have
+    both appeared. The matrix is symmetric, and its diagonal is always zero.
+
+    All queries must relate to teams that were provided to the constructor.
+    """
+
+    def __init__(self, teams):
+        self.index = {team.id: i for i, team in enumerate(teams)}
+        n = len(self.index)
+        self.counts = np.zeros((n, n), dtype=int)
+
+    def __len__(self):
+        return len(self.index)
+
+    def add_debate(self, team_ids):
+        """Records a past debate between the teams with the given primary keys.
+        Teams not covered by the matrix are ignored."""
+        indices = [self.index[team_id] for team_id in team_ids if team_id in self.index]
+        self.counts[np.ix_(indices, indices)] += 1
+        self.counts[indices, indices] -= 1
+
+    def seen(self, team1, team2):
+        """Returns the number of times the two teams have seen each other."""
+        return int(self.counts[self.index[team1.id], self.index[team2.id]])
+
+    def submatrix(self, teams1, teams2):
+        """Returns an array of the number of times each team in `teams1` (rows)
+        has seen each team in `teams2` (columns)."""
+        rows = [self.index[team.id] for team in teams1]
+        cols = [self.index[team.id] for team in teams2]
+        return self.counts[np.ix_(rows, cols)]
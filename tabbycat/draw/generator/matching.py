@@ -0,0 +1,204 @@
+"""Matching backends for draw generators.
+
+Draw generators that use an optimisation step express it as one of two problems
+on a cost matrix, in which disallowed pairings are NaN:
+
+- an *assignment* problem (bipartite), where rows are matched to columns, e.g.
+  affirmative to negative teams when sides are pre-allocated, or teams to
+  positions in BP;
+- a *matching* problem (general), where teams are matched to each other, using
+  only the upper triangle of a square matrix. The costs of a matching problem
+  can also be given as a sparse matrix in COO format, whose stored entries
+  (including explicit zeros) are the allowed pairings, so that large problems
+  with few candidate pairings don't need a dense matrix.
+
+Backends are registered in `MATCHING_BACKENDS`, and selected by name using
+`get_matching_backend()`. Backends other than the pure-Python one fall back to
+it automatically if they can't solve a particular problem, so all backends
+produce optimal solutions; they may differ only in how they break ties.
+"""
+
+import logging
+
+import munkres
+import networkx as nx
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_array, issparse
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+from .utils import munkres_matrix
+
+logger = logging.getLogger(__name__)
+
+
+def edge_list(costs):
+    """Returns arrays `(rows, cols, weights)` of the allowed pairings `(i, j)`,
+    where `i < j`, of the matching problem `costs`, which is either a square
+    array with NaN for disallowed pairings or a sparse matrix."""
+    if issparse(costs):
+        costs = costs.tocoo()
+        upper = costs.row < costs.col
+        rows, cols, weights = costs.row[upper], costs.col[upper], costs.data[upper].astype(float)
+        order = np.lexsort((cols, rows))  # same order as for a dense matrix, so ties break the same way
+        return rows[order], cols[order], weights[order]
+
+    costs = np.asarray(costs, dtype=float)
+    rows, cols = np.triu_indices(len(costs), 1)
+    weights = costs[rows, cols]
+    allowed = ~np.isnan(weights)
+    return rows[allowed], cols[allowed], weights[allowed]
+
+
+class MatchingError(Exception):
+    """Raised by a matching backend when it can't solve a problem, so that the
+    next backend can be tried."""
+    pass
+
+
+class BaseMatchingBackend:
+    """Base class for matching backends."""
+
+    name = None
+
+    def assign(self, costs):
+        """Returns a list of `(row, col)` indices minimising the total cost of
+        assigning rows to columns in `costs`."""
+        raise NotImplementedError
+
+    def match(self, costs):
+        """Returns a list of `(i, j)` indices, where `i < j`, of a minimum-cost
+        matching among those of maximum cardinality, using the upper triangle
+        of the square matrix `costs` (see `edge_list()`)."""
+        raise NotImplementedError
+
+
+class PythonMatchingBackend(BaseMatchingBackend):
+    """Uses the munkres package for assignments and the NetworkX blossom
+    algorithm for matchings. Both are pure Python, so this is slow for large
+    tournaments, but it always works."""
+
+    name = "python"
+
+    def assign(self, costs):
+        return munkres.Munkres().compute(munkres_matrix(costs))
+
+    def match(self, costs):
+        rows, cols, weights = edge_list(costs)
+        graph = nx.Graph()
+        graph.add_weighted_edges_from(zip(rows.tolist(), cols.tolist(), weights.tolist()))
+        return [tuple(sorted(pair)) for pair in nx.min_weight_matching(graph)]
+
+
+class SciPyMatchingBackend(BaseMatchingBackend):
+    """Uses SciPy's compiled `linear_sum_assignment()` for assignments, and
+    its sparse `min_weight_full_bipartite_matching()` for matchings, so that
+    the work and memory for a matching grow with the number of allowed
+    pairings rather than the square of the number of teams.
+
+    Matchings are found by solving the symmetric assignment problem, in which
+    every team is assigned an opponent. Any matching, counted in both
+    directions, is a feasible assignment, so the optimal assignment costs at
+    most twice the optimal matching. The optimal assignment is a set of cycles;
+    each even cycle splits into two matchings of its teams, the cheaper of
+    which costs at most half the cycle. So if there are no odd cycles, this
+    yields an optimal matching. If there are, a MatchingError is raised, and
+    the blossom algorithm is used instead."""
+
+    name = "scipy"
+
+    def assign(self, costs):
+        costs = np.asarray(costs, dtype=float)
+        try:
+            rows, cols = linear_sum_assignment(np.where(np.isnan(costs), np.inf, costs))
+        except ValueError as e:  # infeasible
+            raise MatchingError(str(e))
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    def match(self, costs):
+        if not issparse(costs):
+            costs = np.asarray(costs, dtype=float)
+        n = costs.shape[0]
+        if n == 0:
+            return []
+        if n % 2 != 0:
+            raise MatchingError("Can't find a perfect matching on an odd number of teams")
+
+        rows, cols, weights = edge_list(costs)
+        if len(weights) == 0:
+            raise MatchingError("There are no allowed pairings")
+
+        # The sparse solver treats zero weights as missing edges. Every perfect
+        # assignment has n edges, so shifting all weights by the same amount
+        # doesn't change which is optimal.
+        shifted = weights - weights.min() + 1
+        graph = coo_array((np.concatenate([shifted, shifted]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+                          shape=(n, n)).tocsr()
+        try:
+            opponent = min_weight_full_bipartite_matching(graph)[1].tolist()
+        except ValueError as e:  # infeasible
+            raise MatchingError(str(e))
+
+        weight = dict(zip(zip(rows.tolist(), cols.tolist()), weights.tolist()))
+
+        def pair_cost(i, j):
+            return weight[(i, j) if i < j else (j, i)]
+
+        pairs = []
+        visited = [False] * n
+        for start in range(n):
+            if visited[start]:
+                continue
+            cycle = []
+            i = start
+            while not visited[i]:
+                visited[i] = True
+                cycle.append(i)
+                i = opponent[i]
+            if len(cycle) % 2 != 0:
+                raise MatchingError("Optimal assignment has an odd cycle of length %d" % len(cycle))
+            options = [list(zip(cycle[0::2], cycle[1::2])), list(zip(cycle[1::2], cycle[2::2] + cycle[:1]))]
+            pairs.extend(min(options, key=lambda option: sum(pair_cost(i, j) for i, j in option)))
+
+        return [tuple(sorted(pair)) for pair in pairs]
+
+
+class FallbackMatchingBackend(BaseMatchingBackend):
+    """Tries each of the given backends in turn, moving on to the next if one
+    raises a MatchingError."""
+
+    def __init__(self, backends):
+        self.backends = backends
+        self.name = backends[0].name
+
+    def _try_each(self, method, costs):
+        for backend in self.backends[:-1]:
+            try:
+                return getattr(backend, method)(costs)
+            except MatchingError as e:
+                logger.info("Matching backend %s couldn't solve %s problem, falling back: %s", backend.name, method, e)
+        return getattr(self.backends[-1], method)(costs)
+
+    def assign(self, costs):
+        return self._try_each("assign", costs)
+
+    def match(self, costs):
+        return self._try_each("match", costs)
+
+
+MATCHING_BACKENDS = {
+    "scipy": SciPyMatchingBackend,
+    "python": PythonMatchingBackend,
+}
+
+
+def get_matching_backend(name):
+    """Returns the matching backend registered under `name`, falling back to the
+    pure-Python backend where necessary."""
+    try:
+        klass = MATCHING_BACKENDS[name]
+    except KeyError:
+        raise ValueError("Unrecognised matching backend: {}".format(name))
+    if klass is PythonMatchingBackend:
+        return PythonMatchingBackend()
+    return FallbackMatchingBackend([klass(), PythonMatchingBackend()])
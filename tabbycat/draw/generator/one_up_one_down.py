@@ -8,7 +8,11 @@ class OneUpOneDownSwapper(object):
         "institution_penalty": 1,
     }
 
-    def __init__(self, **kwargs):
+    def __init__(self, seen=None, **kwargs):
+        """'seen', if given, is a function taking two teams and returning the
+        number of times they have seen each other. If not given, the teams'
+        own `seen()` method is used."""
+        self.seen = seen or (lambda team1, team2: team1.seen(team2))
         for key, value in self.DEFAULT_OPTIONS.items():
             if key in kwargs and kwargs[key] is not None:
                 setattr(self, key, kwargs[key])
@@ -83,7 +87,7 @@ class OneUpOneDownSwapper(object):
         (a2, n2) = debate2
         inst = (a1.institution == n1.institution and a1.institution is not None,
                 a2.institution == n2.institution and a2.institution is not None)
-        hist = (a1.seen(n1), a2.seen(n2))
+        hist = (self.seen(a1, n1), self.seen(a2, n2))
 
         if not ((inst[0] or inst[1]) and self.avoid_institution) and \
                 (sum(hist) == 0 and self.avoid_history):
@@ -91,7 +95,7 @@ class OneUpOneDownSwapper(object):
 
         inst_swap = (a1.institution == n2.institution,
                      a2.institution == n1.institution)
-        hist_swap = (a1.seen(n2), a2.seen(n1))
+        hist_swap = (self.seen(a1, n2), self.seen(a2, n1))
 
         # Definitely don't swap if you'd have more history conflicts by swapping
         if self.avoid_history and sum(hist_swap) > sum(hist):
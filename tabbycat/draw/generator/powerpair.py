@@ -4,7 +4,9 @@ from itertools import groupby
 from operator import attrgetter
 from typing import Optional, TYPE_CHECKING
 
+import numpy as np
 from django.utils.translation import gettext as _
+from scipy.sparse import coo_array
 
 from .common import BasePairDrawGenerator, DrawFatalError, DrawUserError
 from .graph import GraphAllocatedSidesMixin, GraphGeneratorMixin
@@ -231,7 +233,8 @@ class BasePowerPairedDrawGenerator(BasePairDrawGenerator):
 
     def _intermediate_brackets_with_bubble_up_down(self, brackets):
         """Operates in-place.
-        Requires Team.institution and Team.seen() to be defined."""
+        Requires Team.institution, and Team.seen() to be defined if no history
+        matrix was provided."""
         self._intermediate_brackets(brackets)  # operates in-place
         # Check each of the intermediate brackets for conflicts.
         # If there is one, try swapping the top team with the bottom team
@@ -243,7 +246,7 @@ class BasePowerPairedDrawGenerator(BasePairDrawGenerator):
             try:
                 if team1.institution == team2.institution:
                     return 1  # Institution
-                if team1.seen(team2):
+                if self.seen(team1, team2):
                     return 2  # History
             except AttributeError:
                 raise DrawFatalError("For conflict avoidance, teams must have attributes 'institution' and 'seen'.")
@@ -319,6 +322,32 @@ class GraphCostMixin:
                 subranks.append(t.subrank)
         return subpool_penalty_func(subranks, size, bracket) * self.options["pairing_penalty"]
 
+    def assignment_cost_matrix(self, teams1, teams2, size, bracket=None) -> np.ndarray:
+        """Array version of assignment_cost()."""
+        penalty = super().assignment_cost_matrix(teams1, teams2, size)
+
+        # Add penalty for seeing the pullup again
+        if self.options["pullup_debates_penalty"]:
+            points1, points2 = np.array([t.points for t in teams1]), np.array([t.points for t in teams2])
+            pullup_debates = np.maximum.outer([t.pullup_debates for t in teams1], [t.pullup_debates for t in teams2])
+            penalty += np.not_equal.outer(points1, points2) * pullup_debates * self.options["pullup_debates_penalty"]
+
+        # Add penalty for deviations in the pairing method
+        if self.options["pairing_method"] != "random":
+            penalty += self.calculate_pairing_penalty_matrix(teams1, teams2, size, bracket)
+        return penalty
+
+    def calculate_pairing_penalty_matrix(self, teams1, teams2, size, bracket=None) -> np.ndarray:
+        """Array version of calculate_pairing_penalty(). The pairing functions
+        operate elementwise, so are given arrays of subranks that broadcast to
+        the shape of the cost matrix."""
+        subpool_penalty_func = self.get_option_function("pairing_method", self.PAIRING_FUNCTIONS)
+
+        # Set the subrank to be last for pulled-up teams
+        subranks1 = np.array([size if t.subrank is None else t.subrank for t in teams1])
+        subranks2 = np.array([size if t.subrank is None else t.subrank for t in teams2])
+        return subpool_penalty_func([subranks1[:, None], subranks2[None, :]], size, bracket) * self.options["pairing_penalty"]
+
     @staticmethod
     def _pairings_slide(teams, size: int, bracket: Optional[int] = None) -> int:
         return abs(abs(teams[0] - teams[1]) - size // 2)
@@ -466,7 +495,7 @@ class AustralsPairingMixin:
             pairs_orig = list(pairs)  # Keep a copy for comparison
             option_names = ["avoid_history", "avoid_institution", "history_penalty", "institution_penalty"]
             options = dict((key, self.options[key]) for key in option_names)
-            swapper = OneUpOneDownSwapper(**options)
+            swapper = OneUpOneDownSwapper(seen=self.seen, **options)
             pairs_new = swapper.run(pairs)
             swaps = swapper.swaps
 
@@ -474,11 +503,11 @@ class AustralsPairingMixin:
                 assert tuple(pairing.teams) == orig
                 assert (i in swaps or i-1 in swaps) == (orig != new)
                 if orig != new:
-                    if pairing.conflict_hist:
+                    if self.seen(*pairing.teams):
                         pairing.add_flag("1u1d_hist")
                     if pairing.conflict_inst:
                         pairing.add_flag("1u1d_inst")
-                    if not (pairing.conflict_hist or pairing.conflict_inst):
+                    if not (self.seen(*pairing.teams) or pairing.conflict_inst):
                         pairing.add_flag("1u1d_other")
                     pairing.teams = list(new)
 
@@ -544,6 +573,68 @@ class SingleGraphPowerPairedDrawGenerator(GraphCostMixin, GraphGeneratorMixin, B
 
         return subpool_penalty_func([t1.subrank, t2.subrank], size, bracket) * self.options["pairing_penalty"]
 
+    def assignment_cost_matrix(self, teams1, teams2, size, bracket=None) -> np.ndarray:
+        """Array version of assignment_cost(). The `size` argument is ignored,
+        as it depends on the bracket of the higher team of each pair."""
+        points1 = np.array([t.points for t in teams1], dtype=int)
+        points2 = np.array([t.points for t in teams2], dtype=int)
+        min_points = np.minimum.outer(points1, points2)
+        max_points = np.maximum.outer(points1, points2)
+        n_teams_per_points = np.array([self.n_teams_per_points[i] for i in range(len(self.n_teams_per_points))], dtype=int)
+        penalty = super().assignment_cost_matrix(teams1, teams2, n_teams_per_points[max_points])
+
+        # Add penalty for pulling up. Don't allow pulling up more than one
+        # bracket, unless all brackets in between are empty.
+        nonempty_below = np.concatenate([[0], np.cumsum(n_teams_per_points != 0)])
+        nonempty_between = nonempty_below[max_points] - nonempty_below[np.minimum(min_points + 1, max_points)]
+        pullup = max_points - min_points
+        penalty[(pullup > 1) & (nonempty_between > 0)] = np.nan
+
+        magnitudes1 = np.array([t.pullup_magnitude for t in teams1], dtype=float)
+        magnitudes2 = np.array([t.pullup_magnitude for t in teams2], dtype=float)
+        pullup_magnitude = np.where(np.less.outer(points1, points2), magnitudes1[:, None], magnitudes2[None, :])
+        penalty += (pullup >= 1) * pullup_magnitude
+        return penalty
+
+    def pairing_cost_matrix(self, teams, size, bracket=None) -> coo_array:
+        """Returns the costs as a sparse matrix of candidate pairings only.
+        Pulling up across a nonempty bracket isn't allowed, so costs are only
+        computed, block by block, within each bracket and between adjacent
+        nonempty brackets. The stored entries are the same as the allowed
+        entries of the upper triangle of assignment_cost_matrix(), but memory
+        and solver work grow with the number of candidate pairings, rather
+        than the square of the number of teams."""
+        points = np.array([t.points for t in teams])
+        levels = sorted(set(points.tolist()), reverse=True)
+        groups = [np.flatnonzero(points == level) for level in levels]
+
+        rows, cols, weights = [np.empty(0, dtype=int)], [np.empty(0, dtype=int)], [np.empty(0)]
+        for k, group in enumerate(groups):
+            for other in groups[max(k-1, 0):k+2]:
+                block = self.assignment_cost_matrix([teams[i] for i in group], [teams[j] for j in other], size, bracket)
+                block_rows, block_cols = np.meshgrid(group, other, indexing='ij')
+                keep = (block_rows < block_cols) & ~np.isnan(block)
+                rows.append(block_rows[keep])
+                cols.append(block_cols[keep])
+                weights.append(block[keep])
+
+        return coo_array((np.concatenate(weights), (np.concatenate(rows), np.concatenate(cols))),
+                         shape=(len(teams), len(teams)))
+
+    def calculate_pairing_penalty_matrix(self, teams1, teams2, size, bracket=None) -> np.ndarray:
+        """Array version of calculate_pairing_penalty(). Here, `size` is an array
+        of bracket sizes."""
+        subpool_penalty_func = self.get_option_function("pairing_method", self.PAIRING_FUNCTIONS)
+
+        points1, points2 = np.array([t.points for t in teams1]), np.array([t.points for t in teams2])
+        subranks1, subranks2 = np.array([t.subrank for t in teams1]), np.array([t.subrank for t in teams2])
+
+        # Set the subrank to be last for pulled-up teams
+        subrank_in_bracket = np.where(np.greater.outer(points1, points2), subranks1[:, None], subranks2[None, :])
+        pullup_penalty = subpool_penalty_func([subrank_in_bracket, size+1], size+1, bracket)
+        same_bracket_penalty = subpool_penalty_func([subranks1[:, None], subranks2[None, :]], size, bracket)
+        return np.where(np.not_equal.outer(points1, points2), pullup_penalty, same_bracket_penalty) * self.options["pairing_penalty"]
+
     def annotate_team_pullup_precedence(self, teams):
         sort_function = self.get_option_function("odd_bracket", self.ODD_BRACKET_FUNCTIONS)
 
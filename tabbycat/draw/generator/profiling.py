@@ -0,0 +1,72 @@
+"""Timing of the phases of draw generation.
+
+A `DrawProfile` records how long each phase of creating a draw took, and how
+many database queries were run during it. The draw manager activates a profile
+while it creates a draw, and generators mark their own phases (building cost
+matrices, solving matchings) using `profile_phase()`, which does nothing if no
+profile is active. This way, generators don't need to know about profiles, and
+worker processes (which never have an active profile) aren't affected.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+_active_profile = ContextVar("active_draw_profile", default=None)
+
+
+class DrawProfile:
+    """Timing breakdown of a draw generation. Phases with the same name are
+    accumulated, and phases can be nested, in which case the outer phase
+    includes the time and queries of the inner one."""
+
+    def __init__(self):
+        self.phases = {}
+        self.info = {}
+        self._open = []
+        self._start = perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        record = self.phases.setdefault(name, {"time": 0.0, "queries": 0})
+        self._open.append(record)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            record["time"] += perf_counter() - start
+            self._open.pop()
+
+    @contextmanager
+    def activate(self):
+        token = _active_profile.set(self)
+        try:
+            yield self
+        finally:
+            _active_profile.reset(token)
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """For use with Django's `connection.execute_wrapper()`, to count the
+        queries run in each open phase."""
+        for record in self._open:
+            record["queries"] += 1
+        return execute(sql, params, many, context)
+
+    def as_dict(self):
+        return {
+            "total_time": perf_counter() - self._start,
+            "phases": [{"name": name, **record} for name, record in self.phases.items()],
+            **self.info,
+        }
+
+
+@contextmanager
+def profile_phase(name):
+    """Records the enclosed code as phase `name` of the active profile, if
+    there is one."""
+    profile = _active_profile.get()
+    if profile is None:
+        yield
+        return
+    with profile.phase(name):
+        yield
@@ -95,7 +95,7 @@ class SwapRandomDrawMixin:
         """Returns a weighted conflict intensity for all the pairings given."""
         score = 0
         if self.options["avoid_history"]:
-            score += sum([x.conflict_hist for x in pairings]) * self.options["history_penalty"]
+            score += sum([self.seen(*x.teams) for x in pairings]) * self.options["history_penalty"]
         if self.options["avoid_institution"]:
             score += sum([x.conflict_inst for x in pairings]) * self.options["institution_penalty"]
         return score
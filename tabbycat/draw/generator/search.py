@@ -0,0 +1,96 @@
+"""Best-of-N draw search.
+
+Some draw generators make random choices, e.g. shuffling teams before solving
+an assignment problem, and different random choices can give draws of
+different quality. `search_draw()` generates the draw with a number of random
+seeds, in parallel worker processes, scores each candidate using the
+generator's `draw_penalty()`, and returns the draw with the lowest penalty.
+
+Workers only report the penalty for each seed. The winning draw is then
+regenerated in the calling process with the winning seed, so that the pairings
+returned refer to the caller's own team objects.
+"""
+
+import logging
+import multiprocessing
+import os
+import random
+import time
+
+import django
+
+from .profiling import profile_phase
+
+logger = logging.getLogger(__name__)
+
+
+def _generate_with_seed(seed, *args, **kwargs):
+    from . import DrawGenerator
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        generator = DrawGenerator(*args, **kwargs)
+        pairings = generator.generate()
+    finally:
+        random.setstate(state)
+    return generator, pairings
+
+
+def _score_seed(seed, *args, **kwargs):
+    generator, pairings = _generate_with_seed(seed, *args, **kwargs)
+    return generator.draw_penalty(pairings)
+
+
+def search_draw(teams_in_debate, draw_type, teams, results=None, rrseq=None, history=None,
+        seeds=1, time_limit=None, max_workers=None, **kwargs):
+    """Generates the draw once for each of `seeds` random seeds, and returns the
+    pairings of the draw with the lowest penalty. Other arguments are as for
+    `DrawGenerator()`.
+
+    If `time_limit` (in seconds) is given, candidates that haven't finished by
+    then are discarded, and the workers generating them are terminated. If
+    `seeds` is 1, or no candidates finish in time, the draw is just generated
+    once, in this process.
+
+    Workers are started with the "spawn" method, so that they don't inherit
+    the caller's database connections. Generators don't use the database, but
+    teams' `seen()` methods might, so `history` should be provided if the
+    generator will check team history.
+    """
+    args = (teams_in_debate, draw_type, teams, results, rrseq)
+    kwargs['history'] = history
+
+    if seeds <= 1:
+        from . import DrawGenerator
+        return DrawGenerator(*args, **kwargs).generate()
+
+    base_seed = random.randrange(2**32)
+    candidates = [base_seed + i for i in range(seeds)]
+    max_workers = max_workers or min(seeds, os.cpu_count() or 1)
+
+    with profile_phase("search"):
+        pool = multiprocessing.get_context("spawn").Pool(max_workers, initializer=django.setup)
+        try:
+            results = {seed: pool.apply_async(_score_seed, (seed,) + args, kwargs) for seed in candidates}
+            deadline = None if time_limit is None else time.monotonic() + time_limit
+            penalties = {}
+            for seed, result in results.items():
+                result.wait(None if deadline is None else max(deadline - time.monotonic(), 0))
+                if result.ready():
+                    penalties[seed] = result.get()  # re-raises any exception from the worker
+        finally:
+            # Workers still generating candidates would otherwise run on after
+            # the search, so kill them rather than just cancel waiting tasks
+            pool.terminate()
+            pool.join()
+
+    logger.info("Draw search: %d of %d candidates finished, penalties from %s to %s", len(penalties), seeds,
+            min(penalties.values(), default=None), max(penalties.values(), default=None))
+
+    if penalties:
+        best_seed = min(penalties, key=penalties.get)
+    else:
+        logger.warning("No draw search candidates finished within %s seconds, generating a single draw", time_limit)
+        best_seed = base_seed
+
+    return _generate_with_seed(best_seed, *args, **kwargs)[1]
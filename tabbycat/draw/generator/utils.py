@@ -1,5 +1,10 @@
 """Miscellaneous utilities for the draw."""
 
+from math import isnan
+
+import munkres
+import numpy as np
+
 
 def ispow2(n):
     """Returns True if n is a power of 2. Works for positive integers only."""
@@ -26,3 +31,9 @@ def partial_break_round_split(break_size):
     assert debates > 0, "%d <= 0 debates in first break round (%d teams bypassing)" % (debates, bypassing)
     assert bypassing >= 0, "%d < 0 teams bypassing (%d debates)" % (bypassing, debates)
     return debates, bypassing
+
+
+def munkres_matrix(costs):
+    """Converts a cost matrix array, in which disallowed assignments are NaN,
+    to the list-of-lists format used by the munkres package."""
+    return [[munkres.DISALLOWED if isnan(cost) else cost for cost in row] for row in np.asarray(costs, dtype=float).tolist()]
@@ -0,0 +1,73 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from draw.benchmark import compare_results, DEFAULT_SIZES, DRAW_BENCHMARKS, get_environment, run_benchmarks
+
+
+class Command(BaseCommand):
+
+    help = "Times draw generators on synthetic tournaments of various sizes, " \
+           "and optionally compares the results with a previous run. Doesn't use the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("-g", "--generator", type=str, action="append", dest="generators",
+            choices=[benchmark.name for benchmark in DRAW_BENCHMARKS], metavar="GENERATOR",
+            help="Benchmark only this generator configuration (can be specified multiple times). "
+                 "Choices: " + ", ".join(benchmark.name for benchmark in DRAW_BENCHMARKS))
+        parser.add_argument("-n", "--teams", type=int, nargs="+", default=DEFAULT_SIZES,
+            help="Numbers of teams to benchmark (default: %(default)s)")
+        parser.add_argument("-r", "--rounds", type=int, default=5,
+            help="Number of preliminary rounds to simulate before the benchmarked draw (default: %(default)s)")
+        parser.add_argument("--repeat", type=int, default=3,
+            help="Number of times to generate each draw; the fastest is reported (default: %(default)s)")
+        parser.add_argument("--seed", type=int, default=0,
+            help="Random seed for the synthetic tournaments (default: %(default)s)")
+        parser.add_argument("-o", "--output", type=str,
+            help="Write results to this JSON file")
+        parser.add_argument("--compare", type=str, metavar="FILE",
+            help="Compare results with this JSON file from a previous run, and fail if any are slower")
+        parser.add_argument("--tolerance", type=float, default=0.2,
+            help="With --compare, fraction by which a time can exceed the baseline "
+                 "without failing (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        benchmarks = DRAW_BENCHMARKS
+        if options["generators"]:
+            benchmarks = [b for b in benchmarks if b.name in options["generators"]]
+
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = json.load(f)["results"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError("Couldn't read baseline file {}: {}".format(options["compare"], e))
+
+        self.stdout.write("{:35} {:>6} {:>8} {:>10} {:>12}".format("Generator", "Teams", "Debates", "Time (s)", "Peak memory"))
+
+        def print_result(result):
+            self.stdout.write("{generator:35} {teams:6d} {debates:8d} {time:10.4f} {kib:9.0f} KiB".format(
+                kib=result["peak_memory"] / 1024, **result))
+
+        results = run_benchmarks(benchmarks, options["teams"], rounds=options["rounds"],
+                repeat=options["repeat"], seed=options["seed"], callback=print_result)
+
+        if options["output"]:
+            output = {
+                "environment": get_environment(),
+                "parameters": {"rounds": options["rounds"], "repeat": options["repeat"], "seed": options["seed"]},
+                "results": results,
+            }
+            with open(options["output"], "w") as f:
+                json.dump(output, f, indent=2)
+            self.stdout.write("Wrote results to {}".format(options["output"]))
+
+        if baseline is not None:
+            regressions = compare_results(baseline, results, options["tolerance"])
+            for result, base, ratio in regressions:
+                self.stdout.write(self.style.ERROR("{generator} with {teams} teams took {time:.4f} s, "
+                    "{ratio:.2f} times the baseline {base:.4f} s".format(ratio=ratio, base=base["time"], **result)))
+            if regressions:
+                raise CommandError("{:d} benchmarks were slower than the baseline.".format(len(regressions)))
+            self.stdout.write(self.style.SUCCESS("No benchmarks were slower than the baseline."))
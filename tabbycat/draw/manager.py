@@ -1,17 +1,25 @@
 import logging
 import random
-from operator import add
+from itertools import groupby
+from operator import add, attrgetter, itemgetter
 from typing import List, Tuple, TYPE_CHECKING
 
+from django.db import connection, transaction
+from django.db.models import Max
 from django.utils.translation import gettext as _
 
+from adjallocation.index import queue_debates
+from adjallocation.preformed.anticipated import invalidate_anticipated_draws
 from draw.generator.powerpair import BasePowerPairedDrawGenerator
 from participants.utils import get_side_history
 from results.models import BallotSubmission, TeamScore
+from standings.materialized import queue_results
 from standings.teams import TeamStandingsGenerator
 from tournaments.models import Round
 
-from .generator import BPEliminationResultPairing, DrawGenerator, DrawUserError, ResultPairing
+from .generator import BPEliminationResultPairing, DrawUserError, ResultPairing, TeamHistoryMatrix
+from .generator.profiling import DrawProfile, profile_phase
+from .generator.search import search_draw
 from .generator.utils import ispow2
 from .models import Debate, DebateTeam
 from .types import DebateSide
@@ -44,6 +52,9 @@ OPTIONS_TO_CONFIG_MAPPING = {
     "exponent"              : "draw_rules__bp_position_cost_exponent",
     "max_times_on_one_side" : "draw_rules__max_times_per_side",
     "pullup_penalty"        : "draw_rules__draw_pullup_penalty",
+    "matching_backend"      : "draw_rules__draw_matching_backend",
+    "search_seeds"          : "draw_rules__draw_search_seeds",
+    "search_time_limit"     : "draw_rules__draw_search_time_limit",
 }
 
 
@@ -70,6 +81,7 @@ class BaseDrawManager:
     """Creates, modifies and retrieves relevant Debate objects relating to a draw."""
 
     generator_type = None
+    supports_redraw = True
 
     def __init__(self, round, active_only=True):
         self.round = round
@@ -87,6 +99,7 @@ class BaseDrawManager:
                 "side_penalty",
                 "pairing_penalty",
                 "avoid_conflicts",
+                "matching_backend",
             ]
         return []
 
@@ -130,6 +143,19 @@ class BaseDrawManager:
             for team in teams:
                 team.side_history = [0] * len(sides)
 
+    def _make_history(self, teams):
+        """Loads all prior encounters between the given teams into a history
+        matrix, in a single query."""
+        history = TeamHistoryMatrix(teams)
+        debateteams = DebateTeam.objects.filter(
+            debate__round__tournament=self.round.tournament,
+            debate__round__seq__lt=self.round.seq,
+            team_id__in=list(history.index.keys()),
+        ).order_by('debate_id').values_list('debate_id', 'team_id')
+        for debate_id, dts in groupby(debateteams, key=itemgetter(0)):
+            history.add_debate([team_id for _, team_id in dts])
+        return history
+
     def _populate_team_side_allocations(self, teams):
         tsas = dict()
         for tsa in self.round.teamsideallocation_set.all():
@@ -138,21 +164,35 @@ class BaseDrawManager:
             if team in tsas:
                 team.allocated_side = tsas[team]
 
-    def _make_debates(self, pairings: List['BasePairing']) -> list[Debate]:
+    def _make_debates(self, pairings: List['BasePairing'], existing: dict['BasePairing', Debate] | None = None) -> list[Debate]:
+        """Creates debates and debate-teams for the given pairings. If
+        `existing` is given, it should map pairings to existing debates, which
+        are reused (with their teams replaced) rather than creating new
+        debates for those pairings."""
         random.shuffle(pairings)  # to avoid IDs indicating room ranks
+        existing = existing or {}
 
         debates = {}
         debateteams = []
 
         for pairing in pairings:
-            debate = Debate(round=self.round, bracket=pairing.bracket, room_rank=pairing.room_rank, flags=pairing.flags)
-            if (self.round.tournament.pref('draw_side_allocations') == "manual-ballot" or
-                    self.round.is_break_round):
-                debate.sides_confirmed = False
+            debate = existing.get(pairing) or Debate(round=self.round)
+            debate.bracket = pairing.bracket
+            debate.room_rank = pairing.room_rank
+            debate.flags = pairing.flags
+            debate.sides_confirmed = not (self.round.tournament.pref('draw_side_allocations') == "manual-ballot" or
+                    self.round.is_break_round)
             debates[pairing] = debate
 
-        Debate.objects.bulk_create(debates.values())
-        logger.debug("Created %d debates", len(debates))
+        reused = [debate for debate in debates.values() if debate.pk is not None]
+        if reused:
+            Debate.objects.bulk_update(reused, ['bracket', 'room_rank', 'flags', 'sides_confirmed'])
+            DebateTeam.objects.filter(debate__in=reused).delete()
+            logger.debug("Updated %d debates", len(reused))
+
+        created = [debate for debate in debates.values() if debate.pk is None]
+        Debate.objects.bulk_create(created)
+        logger.debug("Created %d debates", len(created))
 
         for pairing, debate in debates.items():
             for team, side in zip(pairing.teams, self.round.tournament.sides):
@@ -160,37 +200,44 @@ class BaseDrawManager:
                 debateteams.append(dt)
 
         DebateTeam.objects.bulk_create(debateteams)
+        queue_debates([debate.id for debate in debates.values()], [self.round.id])  # bulk_create() doesn't send signals
+        transaction.on_commit(lambda: invalidate_anticipated_draws([self.round.tournament_id]))
         logger.debug("Created %d debate teams", len(debateteams))
         return list(debates.values())
 
     def _make_bye_debates(self, byes: List['Team'], room_rank: int) -> list[Debate]:
-        """We'd want the room rank as to always show byes at the bottom"""
-        debates = []
-        for i, bye in enumerate(byes, start=room_rank + 1):
-            debate = Debate(round=self.round, bracket=-1, room_rank=i)
-            debate.save()
-            debates.append(debate)
-
-            dt = DebateTeam(debate=debate, team=bye, side=DebateSide.BYE)
-            dt.save()
-
-            if self.round.tournament.pref('bye_team_results') == 'points':
-                bs = BallotSubmission(submitter_type=BallotSubmission.Submitter.AUTOMATION, confirmed=True, debate=debate)
-                bs.save()
-                TeamScore.objects.create(ballot_submission=bs, debate_team=dt, points=1, win=True)
-        return debates
+        """We'd want the room rank as to always show byes at the bottom.
 
-    def delete(self):
-        self.round.debate_set.all().delete()
+        Bye debates, and their ballots if byes get points, are created in bulk,
+        so the number of queries doesn't depend on the number of byes."""
+        if not byes:
+            return []
 
-    def create(self, options: dict | None = None) -> list[Debate]:
-        """Generates a draw and populates the database with it."""
+        debates = [Debate(round=self.round, bracket=-1, room_rank=i) for i in range(room_rank + 1, room_rank + len(byes) + 1)]
+        Debate.objects.bulk_create(debates)
 
-        if self.round.draw_status != Round.Status.NONE:
-            raise RuntimeError("Tried to create a draw on round that already has a draw")
+        debateteams = [DebateTeam(debate=debate, team=bye, side=DebateSide.BYE) for debate, bye in zip(debates, byes)]
+        DebateTeam.objects.bulk_create(debateteams)
+        queue_debates([debate.id for debate in debates], [self.round.id])
+        transaction.on_commit(lambda: invalidate_anticipated_draws([self.round.tournament_id]))
+        logger.debug("Created %d bye debates", len(debates))
+
+        if self.round.tournament.pref('bye_team_results') == 'points':
+            # bulk_create() bypasses Submission.save(), which would set the
+            # version; these are the first ballots for new debates.
+            ballotsubs = [BallotSubmission(submitter_type=BallotSubmission.Submitter.AUTOMATION, confirmed=True,
+                    debate=debate, version=1) for debate in debates]
+            BallotSubmission.objects.bulk_create(ballotsubs)
+            TeamScore.objects.bulk_create([TeamScore(ballot_submission=bs, debate_team=dt, points=1, win=True)
+                    for bs, dt in zip(ballotsubs, debateteams)])
+            queue_results(debate_ids=[debate.id for debate in debates])
 
-        self.delete()
+        return debates
 
+    def delete(self):
+        self.round.debate_set.all().delete()
+
+    def _get_options(self, options: dict | None = None) -> dict:
         if options is None:
             options = dict()
         for key in self.get_relevant_options():
@@ -198,29 +245,133 @@ class BaseDrawManager:
                 options[key] = self.round.tournament.preferences[OPTIONS_TO_CONFIG_MAPPING[key]]
         if options.get("side_allocations") == "manual-ballot":
             options["side_allocations"] = "balance"
+        return options
 
-        teams, byes = self.get_teams()
-        results = self.get_results()
-        rrseq = self.get_rrseq()
+    def _generate(self, teams, options: dict, results=None, rrseq=None) -> List['BasePairing']:
+        options = dict(options)
+        search_seeds = options.pop("search_seeds", 1)
+        search_time_limit = options.pop("search_time_limit", 0) or None
 
-        self._populate_side_history(teams)
-        if options.get("side_allocations") == "preallocated":
-            self._populate_team_side_allocations(teams)
+        with profile_phase("history"):
+            self._populate_side_history(teams)
+            if options.get("side_allocations") == "preallocated":
+                self._populate_team_side_allocations(teams)
+
+            # The draw search scores draws on history, and can't use the database
+            # from its worker processes, so always needs the history matrix.
+            if options.get("avoid_history") or search_seeds > 1:
+                history = self._make_history(teams)
+            else:
+                history = None
 
         generator_type = self.get_generator_type()
         logger.debug("Using generator type: %s", generator_type)
-        drawer = DrawGenerator(self.teams_in_debate, generator_type, teams,
-                results=results, rrseq=rrseq, **options)
-        pairings = drawer.generate()
-        debates = self._make_debates(pairings)
+        with profile_phase("generation"):
+            return search_draw(self.teams_in_debate, generator_type, teams, results=results, rrseq=rrseq,
+                    history=history, seeds=search_seeds, time_limit=search_time_limit, **options)
+
+    @transaction.atomic
+    def create(self, options: dict | None = None) -> list[Debate]:
+        """Generates a draw and populates the database with it. Either the
+        whole draw is saved, or (if there's an error) none of it is.
+
+        A breakdown of the time taken and queries run in each phase of this is
+        saved to the round's `draw_profile` field."""
+
+        if self.round.draw_status != Round.Status.NONE:
+            raise RuntimeError("Tried to create a draw on round that already has a draw")
 
-        debates.extend(self._make_bye_debates(byes, max([p.room_rank for p in pairings], default=0)))
+        profile = DrawProfile()
+        with profile.activate(), connection.execute_wrapper(profile.execute_wrapper):
+            with profile.phase("database"):
+                self.delete()
+            options = self._get_options(options)
+
+            with profile.phase("standings"):
+                teams, byes = self.get_teams()
+                results, rrseq = self.get_results(), self.get_rrseq()
+            pairings = self._generate(teams, options, results=results, rrseq=rrseq)
+
+            with profile.phase("database"):
+                debates = self._make_debates(pairings)
+                debates.extend(self._make_bye_debates(byes, max([p.room_rank for p in pairings], default=0)))
+
+        profile.info.update(generator=self.get_generator_type(), teams=len(teams) + len(byes), debates=len(debates))
+        self.round.draw_profile = profile.as_dict()
+        logger.info("Draw created in %.2f seconds", self.round.draw_profile["total_time"])
 
         self.round.draw_status = Round.Status.DRAFT
         self.round.save()
 
         return debates
 
+    @transaction.atomic
+    def redraw(self, options: dict | None = None) -> list[Debate]:
+        """Updates a draft draw after the teams available for it have changed,
+        without regenerating the whole draw.
+
+        Only debates with a team that is no longer available are re-paired,
+        together with any newly available teams. Every other debate is left
+        untouched. Re-paired debates keep their room ranks, and where possible
+        their database rows, so that adjudicators and venues allocated to them
+        stay where they are. Returns the list of debates that were changed or
+        created."""
+
+        if not self.supports_redraw:
+            raise DrawUserError(_("Draws for this type of round can't be updated; "
+                "delete and recreate the draw instead."))
+        if self.round.draw_status != Round.Status.DRAFT:
+            raise RuntimeError("Tried to update a draw on round that doesn't have a draft draw")
+
+        options = self._get_options(options)
+        teams, byes = self.get_teams()
+        available = {team.id: team for team in teams + byes}
+
+        debateteams = list(DebateTeam.objects.filter(debate__round=self.round).select_related('debate'))
+        drawn = {dt.team_id for dt in debateteams}
+        removed = drawn - available.keys()
+        affected = {dt.debate for dt in debateteams if dt.team_id in removed}
+        pool_ids = {dt.team_id for dt in debateteams if dt.debate in affected} - removed
+        pool_ids |= available.keys() - drawn
+
+        if not affected and not pool_ids:
+            return []
+
+        logger.info("Redrawing %d debates, with %d teams removed and %d teams added",
+                len(affected), len(removed), len(available.keys() - drawn))
+
+        pool = [team for team in teams + byes if team.id in pool_ids]
+        n_byes = self.n_byes(len(pool))
+        if n_byes and self.round.tournament.pref('bye_team_selection') == 'random':
+            pool_byes = [pool.pop(random.randrange(len(pool))) for i in range(n_byes)]
+        elif n_byes:
+            pool, pool_byes = pool[:-n_byes], pool[-n_byes:]
+        else:
+            pool_byes = []
+
+        pairings = self._generate(pool, options) if pool else []
+
+        # Reuse the affected debates for the new pairings, in room rank order,
+        # and rank any extra pairings after all other debates.
+        pairings.sort(key=attrgetter('room_rank'))
+        reusable = sorted([debate for debate in affected if debate.bracket >= 0], key=attrgetter('room_rank'))
+        existing = dict(zip(pairings, reusable))
+        for pairing, debate in existing.items():
+            pairing.room_rank = debate.room_rank
+        max_room_rank = self.round.debate_set.filter(bracket__gte=0).aggregate(m=Max('room_rank'))['m'] or 0
+        for i, pairing in enumerate(pairings[len(reusable):], start=1):
+            if pairing.room_rank:  # unranked (e.g. random) draws leave this as 0
+                pairing.room_rank = max_room_rank + i
+
+        debates = self._make_debates(pairings, existing)
+        unused = [debate.id for debate in affected if debate not in debates]
+        Debate.objects.filter(id__in=unused).delete()
+        logger.debug("Deleted %d debates", len(unused))
+
+        max_room_rank = self.round.debate_set.aggregate(m=Max('room_rank'))['m'] or 0
+        debates.extend(self._make_bye_debates(pool_byes, max_room_rank))
+        return debates
+
 
 class RandomDrawManager(BaseDrawManager):
     generator_type = "random"
@@ -229,11 +380,13 @@ class RandomDrawManager(BaseDrawManager):
         options = super().get_relevant_options()
         if self.teams_in_debate == 2:
             options.extend(["avoid_conflicts", "side_allocations"])
+        options.extend(["search_seeds", "search_time_limit"])
         return options
 
 
 class ManualDrawManager(BaseDrawManager):
     generator_type = "manual"
+    supports_redraw = False
 
     def get_relevant_options(self):
         return []
@@ -251,7 +404,8 @@ class PowerPairedDrawManager(BaseDrawManager):
                 "max_times_on_one_side", "pullup_penalty",
             ])
         elif self.teams_in_debate == 4:
-            options.extend(["pullup", "position_cost", "assignment_method", "renyi_order", "exponent"])
+            options.extend(["pullup", "position_cost", "assignment_method", "renyi_order", "exponent", "matching_backend"])
+        options.extend(["search_seeds", "search_time_limit"])
         return options
 
     def get_teams(self) -> Tuple[List['Team'], List['Team']]:
@@ -311,7 +465,7 @@ class SeededDrawManager(BaseDrawManager):
         if self.teams_in_debate == 2:
             options.extend(["avoid_conflicts", "pairing_method", "side_allocations"])
         elif self.teams_in_debate == 4:
-            options.extend(["assignment_method"])
+            options.extend(["assignment_method", "matching_backend"])
         return options
 
     def get_teams(self) -> Tuple[List['Team'], List['Team']]:
@@ -338,6 +492,7 @@ class SeededDrawManager(BaseDrawManager):
 
 class RoundRobinDrawManager(BaseDrawManager):
     generator_type = "round_robin"
+    supports_redraw = False
 
     def get_rrseq(self):
         prior_rrs = list(self.round.tournament.round_set.filter(draw_type=Round.DrawType.ROUNDROBIN).order_by('seq'))
@@ -351,6 +506,7 @@ class RoundRobinDrawManager(BaseDrawManager):
 
 class BaseEliminationDrawManager(BaseDrawManager):
     result_pairing_class = None
+    supports_redraw = False
 
     def get_teams(self) -> Tuple[List['Team'], List['Team']]:
         breaking_teams = self.round.break_category.breakingteam_set_competing.order_by(
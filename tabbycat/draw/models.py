@@ -138,11 +138,13 @@ class Debate(models.Model):
     #       queryset=DebateTeam.objects.select_related('team'))
     # to their query set.
 
-    def _populate_teams(self):
-        """Populates the team attributes from self.debateteam_set."""
-        dts = self.debateteam_set.all()
-        if not dts._prefetch_done:  # uses internal undocumented flag of Django's QuerySet class
-            dts = dts.select_related('team')
+    def _populate_teams(self, dts=None):
+        """Populates the team attributes from `dts` if given, otherwise from
+        self.debateteam_set."""
+        if dts is None:
+            dts = self.debateteam_set.all()
+            if not dts._prefetch_done:  # uses internal undocumented flag of Django's QuerySet class
+                dts = dts.select_related('team')
 
         self._teams = []
         self._dts = []
@@ -5,9 +5,14 @@ from utils.serializers import DebateSerializerMixin, VueDraggableItemMixin
 class EditDebateTeamsDebateSerializer(DebateSerializerMixin):
     """ Returns debates for the Edit Debate Teams view"""
 
+    field_prefetches = {
+        **DebateSerializerMixin.field_prefetches,
+        'teams': ('debateteam_set',),
+    }
+
     def team_representation(self, debate_team):
         # Only need the PK of the teams as they are fetched separately
-        return debate_team.team.pk
+        return debate_team.team_id
 
 
 class SimpleDebateSideStatusSerializer(DebateSerializerMixin):
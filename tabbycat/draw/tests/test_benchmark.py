@@ -0,0 +1,48 @@
+import unittest
+
+from ..benchmark import compare_results, DRAW_BENCHMARKS, run_benchmarks, SyntheticTournament
+
+
+class TestSyntheticTournament(unittest.TestCase):
+
+    def test_two_team(self):
+        tournament = SyntheticTournament(30, 2, rounds=4, seed=1)
+        self.assertEqual(len(tournament.teams), 30)
+        for team in tournament.teams:
+            self.assertEqual(sum(team.side_history), 4)
+            self.assertEqual(len(team.hist), 4)
+            self.assertLessEqual(team.points, 4)
+            for other in tournament.teams:
+                self.assertEqual(tournament.history.seen(team, other), team.seen(other))
+        points = [team.points for team in tournament.teams]
+        self.assertEqual(points, sorted(points, reverse=True))
+
+    def test_bp(self):
+        tournament = SyntheticTournament(24, 4, rounds=3, seed=1)
+        for team in tournament.teams:
+            self.assertEqual(len(team.side_history), 4)
+            self.assertEqual(sum(team.side_history), 3)
+            self.assertEqual(len(team.hist), 9)
+        self.assertEqual(sum(team.points for team in tournament.teams), 3 * 6 * 6)
+
+    def test_same_seed_same_tournament(self):
+        t1 = SyntheticTournament(20, seed=5)
+        t2 = SyntheticTournament(20, seed=5)
+        self.assertEqual([(t.id, t.points, t.hist) for t in t1.teams], [(t.id, t.points, t.hist) for t in t2.teams])
+
+
+class TestRunBenchmarks(unittest.TestCase):
+
+    def test_all_generators(self):
+        results = run_benchmarks(DRAW_BENCHMARKS, sizes=[18], rounds=2, repeat=1)
+        self.assertEqual(len(results), len(DRAW_BENCHMARKS))
+        for result in results:
+            self.assertGreater(result["debates"], 0)
+            self.assertGreater(result["peak_memory"], 0)
+
+    def test_compare_results(self):
+        baseline = [{"generator": "random", "teams": 50, "time": 1.0}, {"generator": "random", "teams": 100, "time": 2.0}]
+        results = [{"generator": "random", "teams": 50, "time": 1.1}, {"generator": "random", "teams": 100, "time": 3.0},
+                   {"generator": "random", "teams": 200, "time": 9.0}]
+        regressions = compare_results(baseline, results, tolerance=0.2)
+        self.assertEqual([(r["teams"], ratio) for r, _, ratio in regressions], [(100, 1.5)])
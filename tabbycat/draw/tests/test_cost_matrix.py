@@ -0,0 +1,142 @@
+import random
+import unittest
+from math import isnan
+
+import numpy as np
+
+from .utils import TestTeam
+from .. import DrawGenerator
+from ..generator.bphungarian import BPHungarianDrawGenerator
+from ..generator.history import TeamHistoryMatrix
+from ..types import DebateSide
+
+
+def random_teams(n, max_points=4, sides=2, seed=0):
+    rng = random.Random(seed)
+    teams = []
+    for i in range(1, n+1):
+        hist = rng.sample(range(1, n+1), 3)
+        side_history = [rng.randint(0, 3) for _ in range(sides)]
+        teams.append(TestTeam(i, rng.choice('ABCDE' + 'X' * 3) if i % 7 else None, rng.randint(0, max_points), hist,
+                side_history=side_history, pullup_debates=rng.randint(0, 2), subrank=None,
+                allocated_side=[DebateSide.AFF, DebateSide.NEG][i % 2]))
+    teams.sort(key=lambda t: -t.points)
+    for points in set(t.points for t in teams):
+        for subrank, team in enumerate([t for t in teams if t.points == points], start=1):
+            team.subrank = subrank
+    return teams
+
+
+class TestGraphCostMatrix(unittest.TestCase):
+    """Checks that the array cost matrices are the same as the costs computed
+    pair-by-pair by assignment_cost()."""
+
+    options = [
+        dict(),
+        dict(side_penalty=10),
+        dict(side_penalty=10, max_times_on_one_side=2),
+        dict(pullup_debates_penalty=5, pairing_method="fold", pairing_penalty=2),
+        dict(pairing_method="adjacent", pairing_penalty=1, avoid_institution=False),
+        dict(pairing_method="fold_top_adjacent_rest", pairing_penalty=1, avoid_history=False),
+        dict(pairing_method="random", history_penalty=100, institution_penalty=50),
+    ]
+
+    def assertCostsEqual(self, generator, teams1, teams2, size, bracket=None):  # noqa: N802
+        matrix = generator.assignment_cost_matrix(teams1, teams2, size, bracket)
+        self.assertEqual(matrix.shape, (len(teams1), len(teams2)))
+        for i, t1 in enumerate(teams1):
+            for j, t2 in enumerate(teams2):
+                expected = generator.assignment_cost(t1, t2, size, bracket)
+                if expected is None:
+                    self.assertTrue(isnan(matrix[i, j]), msg=(t1, t2))
+                else:
+                    self.assertEqual(matrix[i, j], expected, msg=(t1, t2))
+
+    def test_graph_power_paired(self):
+        teams = random_teams(30)
+        for options in self.options:
+            with self.subTest(options=options):
+                generator = DrawGenerator(2, "power_paired", teams, avoid_conflicts="graph", **options)
+                for bracket in [0, 1]:
+                    self.assertCostsEqual(generator, teams, teams, 12, bracket)
+
+    def test_different_team_lists(self):
+        # Rows and columns are different teams (like affirmative and negative
+        # pools) that share institutions
+        teams = random_teams(30)
+        teams1, teams2 = teams[::2], teams[1::2]
+        self.assertTrue({t.institution for t in teams1 if t.institution} & {t.institution for t in teams2 if t.institution})
+        for options in self.options:
+            with self.subTest(options=options):
+                generator = DrawGenerator(2, "power_paired", teams, avoid_conflicts="graph", **options)
+                self.assertCostsEqual(generator, teams1, teams2, 12, 0)
+                self.assertCostsEqual(generator, teams2[3:], teams1, 12, 0)
+
+    def test_graph_random(self):
+        teams = random_teams(30)
+        for options in self.options:
+            options = {k: v for k, v in options.items() if k not in ["pairing_method", "pairing_penalty", "pullup_debates_penalty"]}
+            with self.subTest(options=options):
+                generator = DrawGenerator(2, "random", teams, avoid_conflicts="graph", **options)
+                self.assertCostsEqual(generator, teams, teams, len(teams))
+
+    def test_single_graph_power_paired(self):
+        teams = random_teams(30, max_points=6)
+        for options in self.options:
+            with self.subTest(options=options):
+                generator = DrawGenerator(2, "power_paired", teams, avoid_conflicts="graph_one",
+                        odd_bracket="pullup_top", pullup_penalty=3, **options)
+                max_points = max(t.points for t in teams)
+                generator.n_teams_per_points = {i: len([t for t in teams if t.points == i]) for i in range(max_points+1)}
+                generator.annotate_team_pullup_precedence(teams)
+                self.assertCostsEqual(generator, teams, teams, len(teams), 0)
+
+    def test_single_graph_pruned_matrix(self):
+        # Sparse points, so that some brackets are empty
+        for teams in [random_teams(30, max_points=6), random_teams(20, max_points=12, seed=1)]:
+            generator = DrawGenerator(2, "power_paired", teams, avoid_conflicts="graph_one", odd_bracket="pullup_top")
+            max_points = max(t.points for t in teams)
+            generator.n_teams_per_points = {i: len([t for t in teams if t.points == i]) for i in range(max_points+1)}
+            generator.annotate_team_pullup_precedence(teams)
+            expected = generator.assignment_cost_matrix(teams, teams, len(teams), 0)
+            pruned = generator.pairing_cost_matrix(teams, len(teams), 0)
+            dense = np.full(expected.shape, np.nan)
+            dense[pruned.row, pruned.col] = pruned.data
+            upper = np.triu_indices(len(teams), 1)
+            np.testing.assert_array_equal(dense[upper], expected[upper])
+            self.assertLessEqual(pruned.nnz, np.count_nonzero(~np.isnan(expected[upper])))
+
+    def test_with_history_matrix(self):
+        teams = random_teams(20)
+        history = TeamHistoryMatrix(teams)
+        for team in teams:
+            for other in team.hist:
+                if other > team.id:
+                    history.add_debate([team.id, other])
+        generator = DrawGenerator(2, "power_paired", teams, avoid_conflicts="graph", history=history)
+        self.assertCostsEqual(generator, teams, teams, 12, 0)
+
+
+class TestBPCostMatrix(unittest.TestCase):
+
+    def test_cost_matrix(self):
+        teams = random_teams(24, max_points=6, sides=4)
+
+        def custom(pos, history):
+            return history[pos] * 2 + sum(history)
+
+        for position_cost, renyi_order in [("simple", 1.0), ("variance", 1.0), ("entropy", 1.0), ("entropy", 0.0),
+                                           ("entropy", 0.5), ("entropy", 2.0), (custom, 1.0)]:
+            with self.subTest(position_cost=position_cost, renyi_order=renyi_order):
+                generator = BPHungarianDrawGenerator(teams, position_cost=position_cost, renyi_order=renyi_order)
+                rooms = generator.define_rooms([team.points for team in teams])
+                costs = generator.generate_cost_matrix(rooms)
+                cost = generator.get_position_cost_function()
+                for i, team in enumerate(teams):
+                    for r, (level, allowed) in enumerate(rooms):
+                        for pos in range(4):
+                            if team.points in allowed:
+                                expected = cost(pos, team.side_history) ** generator.options["exponent"]
+                                self.assertAlmostEqual(costs[i, 4*r + pos], expected)
+                            else:
+                                self.assertTrue(isnan(costs[i, 4*r + pos]))
@@ -449,6 +449,9 @@ class TestPowerPairedDrawGenerator(unittest.TestCase):
             institution_penalty=100,
             side_penalty=0,
             pairing_penalty=1,
+            # (5, 21), (10, 20) ties with (5, 20), (10, 21); the expected draw
+            # is the one the pure-Python solver picks
+            matching_backend="python",
         ),
         [(12,  2, [], [], ['pullup'], True),
          (3,  14, [], [], [], True),
@@ -477,6 +480,9 @@ class TestPowerPairedDrawGenerator(unittest.TestCase):
             side_penalty=0,
             pairing_penalty=1,
             pullup_penalty=10,
+            # (5, 21), (10, 20) ties with (5, 20), (10, 21); the expected draw
+            # is the one the pure-Python solver picks
+            matching_backend="python",
         ),
         [(12,  2, [], [], ['pullup'], True),
          (3,  14, [], [], [], True),
@@ -0,0 +1,54 @@
+import unittest
+
+from .utils import TestTeam
+from .. import DrawGenerator
+from ..generator.history import TeamHistoryMatrix
+
+
+class TestTeamHistoryMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.teams = [TestTeam(i, 'ABCD'[i % 4], side_history=[0, 0]) for i in range(1, 9)]
+        self.history = TeamHistoryMatrix(self.teams)
+
+    def test_empty(self):
+        self.assertEqual(len(self.history), 8)
+        for t1 in self.teams:
+            for t2 in self.teams:
+                self.assertEqual(self.history.seen(t1, t2), 0)
+
+    def test_add_debate(self):
+        t = self.teams
+        self.history.add_debate([t[0].id, t[1].id])
+        self.history.add_debate([t[0].id, t[1].id])
+        self.history.add_debate([t[2].id, t[3].id])
+        self.assertEqual(self.history.seen(t[0], t[1]), 2)
+        self.assertEqual(self.history.seen(t[1], t[0]), 2)
+        self.assertEqual(self.history.seen(t[2], t[3]), 1)
+        self.assertEqual(self.history.seen(t[0], t[2]), 0)
+        self.assertEqual(self.history.seen(t[0], t[0]), 0)
+
+    def test_add_bp_debate(self):
+        t = self.teams
+        self.history.add_debate([t[0].id, t[1].id, t[2].id, t[3].id])
+        for i in range(4):
+            for j in range(4):
+                self.assertEqual(self.history.seen(t[i], t[j]), int(i != j))
+        self.assertEqual(self.history.seen(t[0], t[4]), 0)
+
+    def test_uncovered_teams_ignored(self):
+        t = self.teams
+        self.history.add_debate([t[0].id, 100])
+        self.assertEqual(self.history.seen(t[0], t[1]), 0)
+
+    def test_generator_uses_history(self):
+        # The teams' own histories are empty, so any history conflicts must
+        # come from the matrix.
+        t = self.teams
+        for i in range(0, 8, 2):
+            self.history.add_debate([t[i].id, t[i+1].id])
+        for i in range(20):
+            generator = DrawGenerator(2, "random", list(self.teams), history=self.history,
+                    avoid_conflicts="graph", avoid_institution=False)
+            for pairing in generator.generate():
+                self.assertEqual(self.history.seen(*pairing.teams), 0)
@@ -0,0 +1,89 @@
+import unittest
+
+import numpy as np
+from scipy.sparse import coo_array
+
+from ..generator.matching import get_matching_backend, MatchingError, PythonMatchingBackend, SciPyMatchingBackend
+
+
+def random_costs(n, m, seed, nan_fraction=0.2):
+    rng = np.random.default_rng(seed)
+    costs = rng.integers(0, 20, size=(n, m)).astype(float)
+    costs[rng.random((n, m)) < nan_fraction] = np.nan
+    return costs
+
+
+def total(costs, pairs):
+    return sum(costs[i, j] for i, j in pairs)
+
+
+class TestMatchingBackends(unittest.TestCase):
+
+    def assertValidMatching(self, costs, pairs):  # noqa: N802
+        members = [i for pair in pairs for i in pair]
+        self.assertEqual(len(members), len(set(members)))
+        for i, j in pairs:
+            self.assertLess(i, j)
+            self.assertFalse(np.isnan(costs[i, j]))
+
+    def test_assign_same_cost(self):
+        python = PythonMatchingBackend()
+        for seed in range(20):
+            costs = random_costs(12, 12, seed)
+            with self.subTest(seed=seed):
+                for name in ["scipy", "python"]:
+                    assignment = get_matching_backend(name).assign(costs)
+                    self.assertEqual(sorted(i for i, _ in assignment), list(range(12)))
+                    self.assertEqual(total(costs, assignment), total(costs, python.assign(costs)))
+
+    def test_match_same_cost(self):
+        python = PythonMatchingBackend()
+        for seed in range(30):
+            costs = random_costs(16, 16, seed, nan_fraction=0.1)
+            with self.subTest(seed=seed):
+                expected = python.match(costs)
+                self.assertValidMatching(costs, expected)
+                matching = get_matching_backend("scipy").match(costs)
+                self.assertValidMatching(costs, matching)
+                self.assertEqual(len(matching), len(expected))
+                self.assertEqual(total(costs, matching), total(costs, expected))
+
+    def test_match_sparse(self):
+        for seed in range(10):
+            costs = random_costs(16, 16, seed, nan_fraction=0.3)
+            costs[0, 1] = 0  # explicit zeros are allowed pairings
+            rows, cols = np.triu_indices(16, 1)
+            allowed = ~np.isnan(costs[rows, cols])
+            sparse = coo_array((costs[rows, cols][allowed], (rows[allowed], cols[allowed])), shape=(16, 16))
+            with self.subTest(seed=seed):
+                expected = total(costs, PythonMatchingBackend().match(costs))
+                for name in ["scipy", "python"]:
+                    matching = get_matching_backend(name).match(sparse)
+                    self.assertValidMatching(costs, matching)
+                    self.assertEqual(total(costs, matching), expected)
+
+    def test_odd_cycle_raises(self):
+        # The only perfect assignment on a triangle plus its opposite is a pair
+        # of odd cycles, which the SciPy backend can't turn into a matching.
+        costs = np.full((6, 6), np.nan)
+        for i, j in [(0, 1), (1, 2), (0, 2), (3, 4), (4, 5), (3, 5)]:
+            costs[i, j] = 0
+        costs[2, 3] = 10
+        with self.assertRaises(MatchingError):
+            SciPyMatchingBackend().match(costs)
+        matching = get_matching_backend("scipy").match(costs)
+        self.assertValidMatching(costs, matching)
+        self.assertEqual(len(matching), 3)
+        self.assertEqual(total(costs, matching), 10)
+
+    def test_odd_number_falls_back(self):
+        costs = random_costs(7, 7, 0, nan_fraction=0)
+        with self.assertRaises(MatchingError):
+            SciPyMatchingBackend().match(costs)
+        matching = get_matching_backend("scipy").match(costs)
+        self.assertValidMatching(costs, matching)
+        self.assertEqual(len(matching), 3)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_matching_backend("nonexistent")
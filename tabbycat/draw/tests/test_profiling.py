@@ -0,0 +1,51 @@
+import unittest
+
+from availability.utils import activate_all
+from draw.generator.profiling import DrawProfile, profile_phase
+from draw.manager import DrawManager
+from tournaments.models import Round
+from utils.tests import BaseMinimalTournamentTestCase
+
+
+class TestDrawProfile(unittest.TestCase):
+
+    def fake_execute(self, sql, params, many, context):
+        return sql
+
+    def test_phases(self):
+        profile = DrawProfile()
+        with profile.activate():
+            with profile_phase("generation"):
+                with profile_phase("costs"):
+                    profile.execute_wrapper(self.fake_execute, "SELECT 1", (), False, {})
+                with profile_phase("costs"):
+                    pass
+            profile.execute_wrapper(self.fake_execute, "SELECT 2", (), False, {})
+
+        result = profile.as_dict()
+        self.assertEqual([phase["name"] for phase in result["phases"]], ["generation", "costs"])
+        self.assertEqual([phase["queries"] for phase in result["phases"]], [1, 1])
+        generation, costs = result["phases"]
+        self.assertGreaterEqual(generation["time"], costs["time"])
+        self.assertGreaterEqual(result["total_time"], generation["time"])
+
+    def test_no_active_profile(self):
+        profile = DrawProfile()
+        with profile_phase("costs"):
+            pass
+        self.assertEqual(profile.as_dict()["phases"], [])
+
+
+class TestDrawProfileSaved(BaseMinimalTournamentTestCase):
+
+    def test_create(self):
+        round = Round.objects.create(tournament=self.tournament, seq=2, draw_type=Round.DrawType.RANDOM)
+        activate_all(round)
+        debates = DrawManager(round).create()
+
+        round.refresh_from_db()
+        self.assertEqual(round.draw_profile["debates"], len(debates))
+        phases = {phase["name"]: phase for phase in round.draw_profile["phases"]}
+        self.assertGreater(phases["database"]["queries"], 0)
+        self.assertIn("standings", phases)
+        self.assertIn("generation", phases)
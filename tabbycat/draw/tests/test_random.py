@@ -1,7 +1,9 @@
-from availability.utils import activate_all
+from availability.utils import activate_all, set_availability
 from draw.manager import DrawManager
 from draw.models import DebateTeam
+from draw.types import DebateSide
 from participants.models import Team
+from results.models import BallotSubmission, TeamScore
 from tournaments.models import Round
 from utils.tests import BaseMinimalTournamentTestCase
 
@@ -22,3 +24,22 @@ class RandomDrawTests(BaseMinimalTournamentTestCase):
 
         for team in Team.objects.all():
             self.assertEqual(1, DebateTeam.objects.filter(team=team).count())
+
+    def test_byes(self):
+        self.tournament.preferences['draw_rules__bye_team_selection'] = 'lowest'
+        self.tournament.preferences['draw_rules__bye_team_results'] = 'points'
+        self.tournament.preferences['debate_rules__teams_in_debate'] = 4
+        set_availability(Team.objects.exclude(id__in=Team.objects.values_list('id', flat=True)[:2]), self.round)
+
+        DrawManager(self.round).create()
+
+        byes = DebateTeam.objects.filter(debate__round=self.round, side=DebateSide.BYE)
+        self.assertEqual(4, self.round.debate_set.count())
+        self.assertEqual(2, byes.count())
+        for dt in byes:
+            self.assertEqual(-1, dt.debate.bracket)
+            ballotsub = BallotSubmission.objects.get(debate=dt.debate)
+            self.assertTrue(ballotsub.confirmed)
+            self.assertEqual(1, ballotsub.version)
+            self.assertTrue(TeamScore.objects.get(ballot_submission=ballotsub, debate_team=dt).win)
+        self.assertEqual({1, 2}, {dt.debate.room_rank for dt in byes})  # random draws have room rank 0
@@ -0,0 +1,69 @@
+from availability.utils import activate_all, set_availability
+from draw.generator import DrawUserError
+from draw.manager import DrawManager
+from draw.models import Debate, DebateTeam
+from tournaments.models import Round
+from utils.tests import BaseMinimalTournamentTestCase
+
+
+class RedrawTests(BaseMinimalTournamentTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.round = Round(tournament=self.tournament, seq=2, draw_type=Round.DrawType.RANDOM)
+        self.round.save()
+        activate_all(self.round)
+
+    def get_draw(self):
+        draw = {}
+        for dt in DebateTeam.objects.filter(debate__round=self.round):
+            draw.setdefault(dt.debate_id, set()).add(dt.team_id)
+        return draw
+
+    def test_withdrawals(self):
+        DrawManager(self.round).create()
+        before = self.get_draw()
+        debate1, debate2 = list(before.keys())[:2]
+        withdrawn = [min(before[debate1]), min(before[debate2])]
+
+        set_availability(self.tournament.team_set.exclude(id__in=withdrawn), self.round)
+        changed = DrawManager(self.round).redraw()
+
+        after = self.get_draw()
+        self.assertEqual(len(changed), 1)
+        self.assertEqual(len(after), 5)
+        self.assertIn(changed[0].id, [debate1, debate2])
+        self.assertEqual(after[changed[0].id], (before[debate1] | before[debate2]) - set(withdrawn))
+        for debate_id, teams in before.items():
+            if debate_id not in [debate1, debate2]:
+                self.assertEqual(after[debate_id], teams)
+
+    def test_additions(self):
+        late = list(self.tournament.team_set.values_list('id', flat=True)[:2])
+        set_availability(self.tournament.team_set.exclude(id__in=late), self.round)
+        DrawManager(self.round).create()
+        before = self.get_draw()
+
+        activate_all(self.round)
+        changed = DrawManager(self.round).redraw()
+
+        after = self.get_draw()
+        self.assertEqual(len(changed), 1)
+        self.assertEqual(after[changed[0].id], set(late))
+        self.assertEqual(len(after), 6)
+        for debate_id, teams in before.items():
+            self.assertEqual(after[debate_id], teams)
+
+    def test_odd_withdrawal_without_byes(self):
+        self.tournament.preferences['draw_rules__bye_team_selection'] = 'off'
+        DrawManager(self.round).create()
+        withdrawn = min(next(iter(self.get_draw().values())))
+        set_availability(self.tournament.team_set.exclude(id=withdrawn), self.round)
+        with self.assertRaises(DrawUserError):
+            DrawManager(self.round).redraw()
+
+    def test_unchanged(self):
+        DrawManager(self.round).create()
+        ids = set(Debate.objects.filter(round=self.round).values_list('id', flat=True))
+        self.assertEqual(DrawManager(self.round).redraw(), [])
+        self.assertEqual(set(Debate.objects.filter(round=self.round).values_list('id', flat=True)), ids)
@@ -0,0 +1,59 @@
+import multiprocessing
+import unittest
+from unittest.mock import patch
+
+from .utils import TestTeam
+from .. import DrawGenerator
+from ..generator.pairing import Pairing
+from ..generator.search import _generate_with_seed, search_draw
+
+
+def make_teams():
+    return [TestTeam(i, 'ABCD'[i % 4], points=i % 3, hist=[(i + 1) % 12 + 1], side_history=[i % 2, 0])
+            for i in range(1, 13)]
+
+
+class TestDrawPenalty(unittest.TestCase):
+
+    def test_penalty(self):
+        teams = make_teams()
+        generator = DrawGenerator(2, "random", teams, history_penalty=100, institution_penalty=10, side_penalty=1)
+        t = {team.id: team for team in teams}
+        # history, pullup, side imbalance of team 1
+        self.assertEqual(generator.draw_penalty([Pairing([t[1], t[3]], 0, 1)]), 100 + 1 + 2)
+        # institution, pullup, side imbalance of team 5
+        self.assertEqual(generator.draw_penalty([Pairing([t[5], t[1]], 0, 1)]), 10 + 1 + 2)
+        # side imbalance of team 4 only
+        self.assertEqual(generator.draw_penalty([Pairing([t[4], t[7]], 0, 1)]), 1)
+
+
+class TestSearchDraw(unittest.TestCase):
+
+    options = dict(avoid_conflicts="off", side_allocations="balance")
+
+    def test_same_seed_same_draw(self):
+        teams = make_teams()
+        _, draw1 = _generate_with_seed(7, 2, "random", teams, **self.options)
+        _, draw2 = _generate_with_seed(7, 2, "random", teams, **self.options)
+        self.assertEqual([[team.id for team in p.teams] for p in draw1], [[team.id for team in p.teams] for p in draw2])
+
+    def test_search(self):
+        teams = make_teams()
+        draw = search_draw(2, "random", teams, seeds=4, max_workers=2, **self.options)
+        self.assertEqual(sorted(team.id for pairing in draw for team in pairing.teams), list(range(1, 13)))
+        self.assertTrue(all(team in teams for pairing in draw for team in pairing.teams))
+
+    def test_best_of_seeds(self):
+        teams = make_teams()
+        with patch('draw.generator.search.random.randrange', return_value=100):
+            draw = search_draw(2, "random", teams, seeds=6, max_workers=2, **self.options)
+        generator = DrawGenerator(2, "random", teams, **self.options)
+        penalties = [generator.draw_penalty(_generate_with_seed(seed, 2, "random", teams, **self.options)[1])
+                     for seed in range(100, 106)]
+        self.assertEqual(generator.draw_penalty(draw), min(penalties))
+
+    def test_time_limit_terminates_workers(self):
+        teams = make_teams()
+        draw = search_draw(2, "random", teams, seeds=4, max_workers=2, time_limit=0, **self.options)
+        self.assertEqual(sorted(team.id for pairing in draw for team in pairing.teams), list(range(1, 13)))
+        self.assertEqual(multiprocessing.active_children(), [])
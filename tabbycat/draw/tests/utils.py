@@ -18,6 +18,10 @@ class TestTeam(object):
     def __repr__(self):
         return "<Team {0} of {1} ({2:#x})>".format(self.id, self.institution, hash(self))
 
+    @property
+    def institution_id(self):
+        return self.institution
+
     def seen(self, other):
         return self.hist.count(other.id)
 
@@ -24,6 +24,9 @@ urlpatterns = [
         path('regenerate/',
             views.ConfirmDrawRegenerationView.as_view(),
             name='draw-regenerate'),
+        path('update/',
+            views.UpdateDrawView.as_view(),
+            name='draw-update'),
 
         # Email
         path('email-adjudicators',
@@ -437,6 +437,35 @@ class AdminDrawView(RoundMixin, AdministratorMixin, AdminDrawUtilitiesMixin, Vue
 
     view_permission = Permission.VIEW_ADMIN_DRAW
 
+    # Phases recorded by DrawManager.create(), in display order. Phases that
+    # are part of draw generation are indented under it.
+    DRAW_PROFILE_PHASES = [
+        ("standings", gettext_lazy("Standings and team selection"), False),
+        ("history", gettext_lazy("Loading team history"), False),
+        ("generation", gettext_lazy("Draw generation"), False),
+        ("search", gettext_lazy("Parallel draw search"), True),
+        ("costs", gettext_lazy("Building costs"), True),
+        ("matching", gettext_lazy("Solving matchings"), True),
+        ("database", gettext_lazy("Saving to database"), False),
+    ]
+
+    def get_draw_profile(self):
+        """Returns the rows of the draw generation profile table, or None if
+        the draw hasn't been profiled."""
+        profile = self.round.draw_profile
+        if not profile:
+            return None
+        phases = {phase["name"]: phase for phase in profile["phases"]}
+        rows = [{"label": label, "nested": nested, **phases[name]}
+                for name, label, nested in self.DRAW_PROFILE_PHASES if name in phases]
+        return {"rows": rows, "total_time": profile["total_time"],
+                "teams": profile.get("teams"), "debates": profile.get("debates")}
+
+    def get_context_data(self, **kwargs):
+        if self.round.draw_status == Round.Status.DRAFT or self.detailed:
+            kwargs['draw_profile'] = self.get_draw_profile()
+        return super().get_context_data(**kwargs)
+
     def get_page_title(self):
         round = self.round
         self.page_emoji = '👀'
@@ -714,6 +743,45 @@ class CreateDrawView(DrawStatusEdit):
         return super().post(request, *args, **kwargs)
 
 
+class UpdateDrawView(DrawStatusEdit):
+    edit_permission = Permission.GENERATE_DEBATE
+    action_log_type = ActionLogEntry.ActionType.DRAW_UPDATE
+
+    def post(self, request, *args, **kwargs):
+        if self.round.draw_status != Round.Status.DRAFT:
+            messages.error(request, _("Only draft draws can be updated."))
+            return super().post(request, *args, **kwargs)
+
+        try:
+            debates = DrawManager(self.round).redraw()
+        except (DrawUserError, DrawFatalError, StandingsError) as e:
+            messages.error(request, mark_safe(_(
+                "<p>The draw could not be updated, for the following reason: "
+                "<em>%(message)s</em></p>\n"
+                "<p>You can still delete and recreate the draw.</p>",
+            ) % {'message': escape(str(e))}))
+            logger.warning("Error updating draw: " + str(e), exc_info=True)
+            return super().post(request, *args, **kwargs)
+
+        if not debates:
+            messages.info(request, _("The draw already matches the available teams, so nothing was changed."))
+            return super().post(request, *args, **kwargs)
+
+        unallocated = sum(1 for debate in debates if debate.venue_id is None)
+        messages.success(request, ngettext(
+            "Updated %(count)d debate to match the available teams. All other debates are unchanged.",
+            "Updated %(count)d debates to match the available teams. All other debates are unchanged.",
+            len(debates)) % {'count': len(debates)})
+        if unallocated:
+            messages.warning(request, ngettext(
+                "%(count)d debate doesn't have a room. You can allocate rooms on the Edit Rooms page.",
+                "%(count)d debates don't have rooms. You can allocate rooms on the Edit Rooms page.",
+                unallocated) % {'count': unallocated})
+
+        self.log_action()
+        return super().post(request, *args, **kwargs)
+
+
 class ConfirmDrawCreationView(DrawStatusEdit):
     edit_permission = Permission.GENERATE_DEBATE
     action_log_type = ActionLogEntry.ActionType.DRAW_CONFIRM
@@ -5,6 +5,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Prefetch, Q
 from django.utils.text import slugify
 
+from adjallocation.index import clear_conflicts_index
 from adjallocation.models import AdjudicatorAdjudicatorConflict, DebateAdjudicator
 from adjfeedback.models import AdjudicatorFeedback, AdjudicatorFeedbackQuestion
 from breakqual.models import BreakCategory
@@ -540,6 +541,7 @@ class Importer:
         AdjudicatorAdjudicatorConflict.objects.bulk_create([
             AdjudicatorAdjudicatorConflict(adjudicator1=adj1, adjudicator2=self.adjudicators[adj2]) for adj1, adj2 in adj_adj_conflicts
         ])
+        clear_conflicts_index()  # bulk_create() doesn't send signals
 
     def _get_voting_adjs(self, debate):
         voting_adjs = set()
@@ -146,6 +146,18 @@ class AdjHistoryPenalty(IntegerPreference):
     default = 10000
 
 
+@tournament_preferences_registry.register
+class AdjRefinementTime(IntegerPreference):
+    help_text = _("Time (in milliseconds) the adjudicator auto-allocator spends improving panels after "
+                  "the initial allocation, by swapping adjudicators between panels to avoid conflicts and "
+                  "history between adjudicators on the same panel. Set to 0 to disable.")
+    verbose_name = _("Adjudicator allocation refinement time")
+    section = draw_rules
+    name = 'adj_refinement_time'
+    default = 0
+    field_kwargs = {'validators': [MinValueValidator(0)]}
+
+
 @tournament_preferences_registry.register
 class PreformedPanelMismatchPenalty(IntegerPreference):
     help_text = _("Penality applied by preformed panel auto-allocator for priority mismatch")
@@ -387,6 +399,43 @@ class BPAssignmentMethod(ChoicePreference):
     default = 'hungarian_preshuffled'
 
 
+@tournament_preferences_registry.register
+class DrawMatchingBackend(ChoicePreference):
+    help_text = _("Which solver to use for minimum cost matching and BP position assignment. "
+                  "Both find optimal draws; the compiled solver is much faster for large "
+                  "tournaments, and falls back to the pure Python solver when it can't solve a problem.")
+    verbose_name = _("Draw matching solver")
+    section = draw_rules
+    name = 'draw_matching_backend'
+    choices = (
+        ('scipy', _("Compiled (SciPy)")),
+        ('python', _("Pure Python (NetworkX and Munkres)")),
+    )
+    default = 'scipy'
+
+
+@tournament_preferences_registry.register
+class DrawSearchSeeds(IntegerPreference):
+    help_text = _("If more than 1, generates this many draws in parallel, each with different random choices, "
+                  "and keeps the one with the fewest history, institution, pullup and side balance penalties. "
+                  "Only useful for draw methods that make random choices.")
+    verbose_name = _("Number of draws to search")
+    section = draw_rules
+    name = 'draw_search_seeds'
+    default = 1
+    field_kwargs = {'validators': [MinValueValidator(1)]}
+
+
+@tournament_preferences_registry.register
+class DrawSearchTimeLimit(FloatPreference):
+    help_text = _("When searching multiple draws, draws that take longer than this many seconds are discarded (0 means no limit)")
+    verbose_name = _("Draw search time limit")
+    section = draw_rules
+    name = 'draw_search_time_limit'
+    default = 10.0
+    field_kwargs = {'validators': [MinValueValidator(0.0)]}
+
+
 @tournament_preferences_registry.register
 class SkipAdjCheckins(BooleanPreference):
     help_text = _("Automatically make all adjudicators available for all rounds")
@@ -6,6 +6,7 @@ from typing import TYPE_CHECKING
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django import forms
+from django.db import transaction
 from django.utils import timezone
 from django.utils.translation import gettext as _
 from django.utils.translation import ngettext
@@ -193,33 +194,39 @@ class BaseResultForm(forms.Form):
 
     def save(self):
 
-        # 1. Unconfirm the other, if necessary
-        if self.cleaned_data['confirmed']:
-            if self.debate.confirmed_ballot != self.ballotsub and self.debate.confirmed_ballot is not None:
-                self.debate.confirmed_ballot.confirmed = False
-                self.debate.confirmed_ballot.save()
+        # Save everything in one transaction, so that the metrics that depend
+        # on the ballot are updated once, when it commits
+        with transaction.atomic():
 
-        # 2. Save ballot submission so that we can create related objects
-        if self.ballotsub.id is None:
-            self.ballotsub.save()
+            # 1. Unconfirm the other, if necessary
+            if self.cleaned_data['confirmed']:
+                if self.debate.confirmed_ballot != self.ballotsub and self.debate.confirmed_ballot is not None:
+                    self.debate.confirmed_ballot.confirmed = False
+                    self.debate.confirmed_ballot.save()
+
+            # 2. Save ballot submission so that we can create related objects
+            if self.ballotsub.id is None:
+                self.ballotsub.save()
 
-        # 3. Save the specifics of the ballot
-        self.save_ballot()
+            # 3. Save the specifics of the ballot
+            self.save_ballot()
 
-        # 4. Save ballot and result status
-        self.ballotsub.discarded = self.cleaned_data['discarded']
-        self.ballotsub.confirmed = self.cleaned_data['confirmed']
-        self.ballotsub.save()
+            # 4. Save ballot and result status
+            self.ballotsub.discarded = self.cleaned_data['discarded']
+            self.ballotsub.confirmed = self.cleaned_data['confirmed']
+            self.ballotsub.save()
 
-        self.debate.result_status = self.cleaned_data['debate_result_status']
-        self.debate.save()
+            self.debate.result_status = self.cleaned_data['debate_result_status']
+            self.debate.save()
 
-        # Need to provide a timestamp immediately for BallotStatusConsumer
-        # as it will broadcast before the view finishes assigning one
+        # Need to provide a timestamp for BallotStatusConsumer, in case the
+        # caller doesn't assign one before the broadcast
         if self.ballotsub.confirmed:
             self.ballotsub.confirm_timestamp = timezone.now()
 
-        broadcast_results(self.ballotsub, self.debate)
+        # The ballot might be saved as part of a larger transaction (e.g. when
+        # the view then confirms it), so wait until it's committed
+        transaction.on_commit(lambda: broadcast_results(self.ballotsub, self.debate))
 
         return self.ballotsub
 
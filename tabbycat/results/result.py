@@ -44,6 +44,7 @@ from itertools import product
 from statistics import mean
 from typing import TYPE_CHECKING, Union
 
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 
 from adjallocation.allocation import AdjudicatorAllocation
@@ -294,11 +295,21 @@ class BaseDebateResult:
 
     def save(self):
         """Saves to the database.
-        Raises ResultError if the ballot set is incomplete or invalid."""
+        Raises ResultError if the ballot set is incomplete or invalid.
+
+        Scores are saved in one transaction, so that the metrics that depend on
+        them (see `standings/materialized.py`) are updated once for the whole
+        ballot, rather than once for each score."""
 
         if not self.is_valid():
             raise ResultError("Tried to save an invalid result.")
 
+        with transaction.atomic():
+            self.save_scores()
+
+    def save_scores(self):
+        """Saves the scores of this result. Subclasses that add buffers should
+        extend this method to save them."""
         for side in self.sides:
             dt = self.debateteams[side]
 
@@ -491,8 +502,8 @@ class DebateResultByAdjudicator(BaseDebateResult):
     def merge_speaker_result(self, result, adj) -> list[ResultError]:
         return []
 
-    def save(self):
-        super().save()
+    def save_scores(self):
+        super().save_scores()
 
         for adj, sheet in self.scoresheets.items():
             da = self.debateadjs[adj]
@@ -762,8 +773,8 @@ class DebateResultWithScoresMixin:
             self.speakers[ss.debate_team.side][ss.position] = ss.speaker
             self.ghosts[ss.debate_team.side][ss.position] = ss.ghost
 
-    def save(self):
-        super().save()
+    def save_scores(self):
+        super().save_scores()
 
         for side in self.sides:
             dt = self.debateteams[side]
@@ -1120,8 +1131,8 @@ class DebateResultByAdjudicatorWithScores(DebateResultWithScoresMixin, DebateRes
                 self.set_score(adj, side, pos, result.get_score(side, pos))
         return errors
 
-    def save(self):
-        super().save()
+    def save_scores(self):
+        super().save_scores()
 
         for adj, sheet in self.scoresheets.items():
             da = self.debateadjs[adj]
@@ -5,7 +5,7 @@ from channels.layers import get_channel_layer
 from django.conf import settings
 from django.contrib import messages
 from django.core.exceptions import ValidationError
-from django.db import ProgrammingError
+from django.db import ProgrammingError, transaction
 from django.db.models import Count, Max, Q, Window
 from django.db.models.functions import Coalesce, Rank
 from django.http import HttpResponseRedirect
@@ -341,12 +341,16 @@ class BaseBallotSetView(LogActionMixin, TournamentMixin, FormView):
             return self.debate.matchup
 
     def form_valid(self, form):
-        self.ballotsub = form.save()
-        if self.ballotsub.confirmed:
-            self.ballotsub.confirmer = self.request.user
-            self.ballotsub.confirm_timestamp = timezone.now()
-            self.ballotsub.save()
+        # Confirm in the same transaction as the form saves the ballot, so that
+        # the metrics that depend on it are updated once
+        with transaction.atomic():
+            self.ballotsub = form.save()
+            if self.ballotsub.confirmed:
+                self.ballotsub.confirmer = self.request.user
+                self.ballotsub.confirm_timestamp = timezone.now()
+                self.ballotsub.save()
 
+        if self.ballotsub.confirmed:
             if self.should_send_email_receipts():
                 async_to_sync(get_channel_layer().send)("notifications", {
                     "type": "email",
@@ -674,26 +678,28 @@ class BasePublicNewBallotSetView(PersonalizablePublicTournamentPageMixin, RoundM
 
             if len(errors) == 0:
                 has_errors = False
-                merged_bs.save()
-                merged_result.save()
-
-                bs_motions = BallotSubmission.objects.filter(
-                    id__in=[b.id for b in bses], motion__isnull=False,
-                ).prefetch_related('debateteammotionpreference_set__debate_team')
-                try:
-                    merge_motions(merged_bs, bs_motions)
+                with transaction.atomic():
                     merged_bs.save()
-                except ValidationError:
-                    has_errors = True
-
-                try:
-                    vetos = merge_motion_vetos(merged_bs, bs_motions)
-                    DebateTeamMotionPreference.objects.bulk_create(list(vetos.values()))
-                except ValidationError:
-                    has_errors = True
+                    merged_result.save()
+
+                    bs_motions = BallotSubmission.objects.filter(
+                        id__in=[b.id for b in bses], motion__isnull=False,
+                    ).prefetch_related('debateteammotionpreference_set__debate_team')
+                    try:
+                        merge_motions(merged_bs, bs_motions)
+                        merged_bs.save()
+                    except ValidationError:
+                        has_errors = True
+
+                    try:
+                        vetos = merge_motion_vetos(merged_bs, bs_motions)
+                        DebateTeamMotionPreference.objects.bulk_create(list(vetos.values()))
+                    except ValidationError:
+                        has_errors = True
+
+                    self.debate.result_status = Debate.STATUS_POSTPONED if has_errors else Debate.STATUS_CONFIRMED
+                    self.debate.save()
 
-                self.debate.result_status = Debate.STATUS_POSTPONED if has_errors else Debate.STATUS_CONFIRMED
-                self.debate.save()
                 broadcast_results(merged_bs, self.debate)
 
 
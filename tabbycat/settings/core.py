@@ -333,6 +333,11 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Number of processes that workers use for allocations (see utils/jobs.py).
+# If 0, they run in the worker itself. This needs a channel layer that works
+# across processes, so it can't be used with the in-memory channel layer.
+WORKER_JOB_PROCESSES = int(os.environ.get('WORKER_JOB_PROCESSES', 0))
+
 # ==============================================================================
 # Dynamic preferences
 # ==============================================================================
@@ -3,9 +3,10 @@
 import logging
 import random
 
-from django.db.models import Q
+from django.db.models import FilteredRelation, Q
 from django.utils.translation import gettext as _
 
+from .materialized import get_metrics_round
 from .metrics import metricgetter, QuerySetMetricAnnotator, RepeatedMetricAnnotator
 
 logger = logging.getLogger(__name__)
@@ -286,6 +287,9 @@ class BaseStandingsGenerator:
 
     metric_annotator_classes = {}
     ranking_annotator_classes = {}
+    metrics_relation = None  # reverse relation to the round metrics model, if there is one
+
+    METRICS_ALIAS = 'round_metrics'
 
     def __init__(self, metrics, rankings, extra_metrics=(), **options):
 
@@ -325,6 +329,10 @@ class BaseStandingsGenerator:
             those objects of interest for these standings.
         `round`, if specified, is the round for which to generate the standings.
             (That is, rounds after `round` are excluded from the standings.)
+
+        If the tournament's round metrics are current (see `materialized.py`),
+        combinable metrics are read from them rather than aggregated from
+        every score so far.
         """
 
         rank_filter = self.get_rank_filter() if self.options["rank_filter"][0] is not None else None
@@ -346,8 +354,15 @@ class BaseStandingsGenerator:
 
         self._annotate_metrics(queryset_for_metrics, self.distinct_queryset_metric_annotators, standings, round)
 
-        for annotator in self.queryset_metric_annotators:
-            queryset_for_metrics = annotator.get_annotated_queryset(queryset_for_metrics, round)
+        metrics_round_id = self._get_metrics_round(tournament or (round and round.tournament), round)
+        if metrics_round_id is not None:
+            queryset_for_metrics = queryset_for_metrics.annotate(**{self.METRICS_ALIAS: FilteredRelation(
+                self.metrics_relation, condition=Q(**{self.metrics_relation + '__round_id': metrics_round_id}))})
+            for annotator in self.queryset_metric_annotators:
+                queryset_for_metrics = annotator.get_materialized_queryset(queryset_for_metrics, self.METRICS_ALIAS)
+        else:
+            for annotator in self.queryset_metric_annotators:
+                queryset_for_metrics = annotator.get_annotated_queryset(queryset_for_metrics, round)
 
         if len(self.precedence) > 0 and set(self.precedence) <= {a.key for a in self.queryset_metric_annotators}:
             # If there is a precedence and all used metrics are combinable aggregation-based,
@@ -371,6 +386,16 @@ class BaseStandingsGenerator:
 
         return standings
 
+    def _get_metrics_round(self, tournament, round):
+        """Returns the ID of the round whose round metrics (see
+        `materialized.py`) should be used for the combinable metrics, or None
+        if they should be aggregated from scores instead."""
+        if tournament is None or self.metrics_relation is None or not self.queryset_metric_annotators:
+            return None
+        if any(a.get_materialized_annotation(self.METRICS_ALIAS) is None for a in self.queryset_metric_annotators):
+            return None
+        return get_metrics_round(tournament, round)
+
     def generate_from_queryset(self, queryset, standings, round):
         """Generates standings if rankings can be calculated through the
         aggregations present from the queryset (no repeated metrics)"""
@@ -0,0 +1,300 @@
+"""Materialized cumulative metrics for team and speaker standings.
+
+Standings generators normally compute every metric from all the TeamScore or
+SpeakerScore rows of the tournament so far. To avoid this, each team and
+speaker has a row in `TeamRoundMetrics` or `SpeakerRoundMetrics` for each
+preliminary round, holding sums, counts and so on of their results from
+confirmed ballots up to and including that round. Standings generators read
+these instead when the tournament's metrics are current (see
+`get_metrics_round()`), so that the cost of standings doesn't depend on the
+number of rounds.
+
+The metrics are kept up to date by the signal handlers in `signals.py`. These
+queue the ballots and debates whose results changed, and when the current
+transaction commits, the metrics of just the teams and speakers in those
+debates are recalculated. Changes that could affect any team (like deleting a
+debate or changing a round's weight) queue the whole tournament to be
+rebuilt instead. A tournament's metrics are current if it has a
+`MetricsState`, which is created when they're rebuilt and deleted when they
+can't be kept up to date.
+
+The same changes also clear the cached results matrices of the tournaments
+(see `round_results.py`).
+
+Code that changes results in a way that doesn't send signals (e.g.
+`bulk_create()`) should call `queue_results()` itself.
+"""
+
+import logging
+import threading
+import weakref
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Max, Min, Q, Sum
+from django.db.models.functions import Cast, NullIf
+
+from draw.models import Debate, DebateTeam
+from participants.models import Speaker
+from results.models import BallotSubmission, SpeakerScore, TeamScore
+from tournaments.models import Round, Tournament
+
+from .models import MetricsState, SpeakerRoundMetrics, TeamRoundMetrics
+from .round_results import invalidate_results_matrix
+
+logger = logging.getLogger(__name__)
+
+
+def _add(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a + b
+
+
+def _max(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+
+def _min(a, b):
+    return b if a is None else a if b is None else min(a, b)
+
+
+# How each field of the metrics models combines results from successive rounds
+TEAM_FIELDS = {
+    'points': _add, 'wins': _add,
+    'speaks_sum': _add, 'speaks_sumsq': _add, 'speaks_count': _add,
+    'margin_sum': _add, 'margin_count': _add, 'votes': _add,
+    'firsts': _add, 'seconds': _add, 'thirds': _add, 'irons': _add,
+}
+
+SPEAKER_FIELDS = {
+    'total': _add, 'sumsq': _add, 'count': _add, 'highest': _max, 'lowest': _min, 'rank_sum': _add,
+    'replies_sum': _add, 'replies_sumsq': _add, 'replies_count': _add,
+}
+
+
+class _QueuedResults:
+    """Changes queued by one call to `queue_results()`, and the function passed
+    to `transaction.on_commit()` to apply them. If the transaction is rolled
+    back, Django discards it, and with it the changes."""
+
+    def __init__(self, debate_ids, ballot_ids, round_ids, tournament_ids):
+        self.ids = {'debate_ids': set(debate_ids), 'ballot_ids': set(ballot_ids),
+                    'round_ids': set(round_ids), 'tournament_ids': set(tournament_ids)}
+
+    def __call__(self):
+        _pending.queued.discard(self)
+        for name, ids in self.ids.items():
+            _pending.committed[name] |= ids
+        if not _pending.queued:  # last of this transaction's changes, so apply them all at once
+            committed = _pending.committed
+            _pending.committed = {name: set() for name in committed}
+            _apply_results(**committed)
+
+
+class _PendingChanges(threading.local):
+    """Changes that haven't yet been applied to the metrics. `queued` only
+    holds weak references, so changes that were rolled back drop out of it."""
+
+    def __init__(self):
+        self.queued = weakref.WeakSet()
+        self.committed = {'debate_ids': set(), 'ballot_ids': set(), 'round_ids': set(), 'tournament_ids': set()}
+
+    def __bool__(self):
+        return bool(self.queued)
+
+
+_pending = _PendingChanges()
+
+
+# ==============================================================================
+# Building metrics
+# ==============================================================================
+
+def _team_results(tournament, team_ids=None):
+    """Returns a list of dicts with the totals of each team in each round,
+    keyed by 'entity', 'round' and the names in `TEAM_FIELDS`."""
+    scores = TeamScore.objects.filter(
+        ballot_submission__confirmed=True,
+        debate_team__debate__round__tournament=tournament,
+        debate_team__debate__round__stage=Round.Stage.PRELIMINARY,
+    )
+    if team_ids is not None:
+        scores = scores.filter(debate_team__team_id__in=team_ids)
+
+    # 'points' goes last, since after it, `F('points')` would refer to the annotation
+    return list(scores.values(entity=F('debate_team__team_id'), round=F('debate_team__debate__round_id')).annotate(
+        wins=Count('win', filter=Q(win=True)),
+        speaks_sum=Sum('score'),
+        speaks_sumsq=Sum(F('score') * F('score')),
+        speaks_count=Count('score'),
+        margin_sum=Sum('margin'),
+        margin_count=Count('margin'),
+        votes=Sum(Cast('votes_given', FloatField()) / NullIf('votes_possible', 0, output_field=FloatField())),
+        firsts=Count('points', filter=Q(points=3)),
+        seconds=Count('points', filter=Q(points=2)),
+        thirds=Count('points', filter=Q(points=1)),
+        irons=Count('has_ghost', filter=Q(has_ghost=True)),
+        points=Sum(F('points') * F('debate_team__debate__round__weight'), output_field=FloatField()),
+    ).order_by())
+
+
+def _speaker_results(tournament, speaker_ids=None):
+    """Returns a list of dicts with the totals of each speaker in each round,
+    keyed by 'entity', 'round' and the names in `SPEAKER_FIELDS`."""
+    scores = SpeakerScore.objects.filter(
+        ballot_submission__confirmed=True,
+        debate_team__debate__round__tournament=tournament,
+        debate_team__debate__round__stage=Round.Stage.PRELIMINARY,
+        ghost=False,
+    )
+    if speaker_ids is not None:
+        scores = scores.filter(speaker_id__in=speaker_ids)
+
+    substantive = Q(position__lte=tournament.last_substantive_position)
+    reply = Q(position=tournament.reply_position)  # matches nothing if there are no replies
+
+    return list(scores.values(entity=F('speaker_id'), round=F('debate_team__debate__round_id')).annotate(
+        total=Sum('score', filter=substantive),
+        sumsq=Sum(F('score') * F('score'), filter=substantive),
+        count=Count('score', filter=substantive),
+        highest=Max('score', filter=substantive),
+        lowest=Min('score', filter=substantive),
+        rank_sum=Sum('rank', filter=substantive),
+        replies_sum=Sum('score', filter=reply),
+        replies_sumsq=Sum(F('score') * F('score'), filter=reply),
+        replies_count=Count('score', filter=reply),
+    ).order_by())
+
+
+def accumulate(results, entity_ids, round_ids, fields, initial):
+    """Returns a dict mapping `(entity_id, round_id)` for every entity in
+    `entity_ids` and round in `round_ids` (which must be in order) to a dict
+    of the cumulative totals of `results` up to and including that round.
+    `results` is a list of dicts as returned by `_team_results()` or
+    `_speaker_results()`, `fields` maps each field to a function that
+    combines two values of it, and `initial` holds the totals before the
+    first round."""
+    by_entity = {}
+    for row in results:
+        by_entity.setdefault(row['entity'], {})[row['round']] = row
+
+    cumulative = {}
+    for entity_id in entity_ids:
+        rounds = by_entity.get(entity_id, {})
+        totals = initial
+        for round_id in round_ids:
+            row = rounds.get(round_id)
+            if row is not None:
+                totals = {name: combine(totals[name], row[name]) for name, combine in fields.items()}
+            cumulative[(entity_id, round_id)] = totals
+    return cumulative
+
+
+def _save_metrics(tournament, team_ids=None, speaker_ids=None):
+    """Recalculates and saves the metrics of the given teams and speakers, or
+    all in the tournament if None."""
+    round_ids = list(tournament.round_set.filter(stage=Round.Stage.PRELIMINARY).order_by('seq').values_list('id', flat=True))
+    if team_ids is None:
+        team_ids = list(tournament.team_set.values_list('id', flat=True))
+        team_results = _team_results(tournament)
+    else:
+        team_results = _team_results(tournament, team_ids)
+    if speaker_ids is None:
+        speaker_ids = list(Speaker.objects.filter(team__tournament=tournament).values_list('id', flat=True))
+        speaker_results = _speaker_results(tournament)
+    else:
+        speaker_results = _speaker_results(tournament, speaker_ids)
+
+    for model, entity_field, entity_ids, results, fields in [
+        (TeamRoundMetrics, 'team', team_ids, team_results, TEAM_FIELDS),
+        (SpeakerRoundMetrics, 'speaker', speaker_ids, speaker_results, SPEAKER_FIELDS),
+    ]:
+        initial = {name: None if model._meta.get_field(name).null else 0 for name in fields}
+        cumulative = accumulate(results, entity_ids, round_ids, fields, initial)
+        model.objects.bulk_create([
+            model(**{entity_field + '_id': entity_id, 'round_id': round_id}, **totals)
+            for (entity_id, round_id), totals in cumulative.items()
+        ], update_conflicts=True, unique_fields=[entity_field, 'round'], update_fields=list(fields))
+
+    return round_ids
+
+
+def rebuild_metrics(tournament):
+    """Rebuilds all metrics of the tournament from its results, and marks
+    them as current."""
+    with transaction.atomic():
+        round_ids = _save_metrics(tournament)
+        TeamRoundMetrics.objects.filter(round__tournament=tournament).exclude(round_id__in=round_ids).delete()
+        SpeakerRoundMetrics.objects.filter(round__tournament=tournament).exclude(round_id__in=round_ids).delete()
+        MetricsState.objects.update_or_create(tournament=tournament, defaults={
+            'last_substantive_position': tournament.last_substantive_position,
+            'reply_position': tournament.reply_position,
+        })
+    logger.debug("Rebuilt standings metrics for %s", tournament.slug)
+
+
+def _is_current(tournament, state):
+    return (state is not None and
+            state.last_substantive_position == tournament.last_substantive_position and
+            state.reply_position == tournament.reply_position)
+
+
+def get_metrics_round(tournament, round=None):
+    """Returns the ID of the round whose metrics hold the results up to and
+    including `round` (or all preliminary rounds if `round` is None), or None
+    if the tournament's metrics aren't current or there is no such round."""
+    if _pending:
+        return None
+    state = MetricsState.objects.filter(tournament=tournament).first()
+    if not _is_current(tournament, state):
+        return None
+
+    rounds = tournament.round_set.filter(stage=Round.Stage.PRELIMINARY)
+    if round is not None:
+        rounds = rounds.filter(seq__lte=round.seq)
+    return rounds.order_by('-seq').values_list('id', flat=True).first()
+
+
+# ==============================================================================
+# Keeping metrics up to date
+# ==============================================================================
+
+def queue_results(debate_ids=(), ballot_ids=(), round_ids=(), tournament_ids=()):
+    """Queues changes to results for when the current transaction commits.
+    The metrics of teams and speakers in the debates with primary keys
+    `debate_ids`, or of ballots with primary keys `ballot_ids`, are
+    recalculated. Tournaments with primary keys `tournament_ids`, or of rounds
+    with primary keys `round_ids`, are rebuilt."""
+    queued = _QueuedResults(debate_ids, ballot_ids, round_ids, tournament_ids)
+    _pending.queued.add(queued)
+    transaction.on_commit(queued)
+
+
+def _apply_results(debate_ids, ballot_ids, round_ids, tournament_ids):
+    if not (debate_ids or ballot_ids or round_ids or tournament_ids):
+        return
+
+    debate_ids |= set(BallotSubmission.objects.filter(id__in=ballot_ids).values_list('debate_id', flat=True))
+    tournament_ids |= set(Round.objects.filter(id__in=round_ids).values_list('tournament_id', flat=True))
+
+    debates_by_tournament = {}
+    for debate_id, tournament_id in Debate.objects.filter(id__in=debate_ids).values_list('id', 'round__tournament_id'):
+        debates_by_tournament.setdefault(tournament_id, []).append(debate_id)
+
+    tournaments = list(Tournament.objects.filter(id__in=tournament_ids | debates_by_tournament.keys()))
+    invalidate_results_matrix([tournament.id for tournament in tournaments])
+    states = {state.tournament_id: state for state in MetricsState.objects.filter(tournament__in=tournaments)}
+
+    for tournament in tournaments:
+        if tournament.id in tournament_ids or not _is_current(tournament, states.get(tournament.id)):
+            rebuild_metrics(tournament)
+            continue
+
+        debate_ids = debates_by_tournament[tournament.id]
+        team_ids = set(DebateTeam.objects.filter(debate_id__in=debate_ids).values_list('team_id', flat=True))
+        speaker_ids = set(Speaker.objects.filter(team_id__in=team_ids).values_list('id', flat=True))
+        speaker_ids |= set(SpeakerScore.objects.filter(debate_team__debate_id__in=debate_ids).values_list('speaker_id', flat=True))
+        _save_metrics(tournament, team_ids, speaker_ids)
+        logger.debug("Updated standings metrics of %d teams and %d speakers", len(team_ids), len(speaker_ids))
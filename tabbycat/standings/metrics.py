@@ -8,7 +8,8 @@ context-specific files, e.g., teams.py or speakers.py.
 
 import logging
 
-from django.db.models import Case, F, When
+from django.db.models import Case, F, FloatField, When
+from django.db.models.functions import Greatest, NullIf, Power, Sqrt
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +41,21 @@ def metricgetter(items, negate=None):
     return metricitemgetter
 
 
+def materialized_average(total, count):
+    """Returns an expression for the mean of values whose sum and number are
+    in the fields `total` and `count`, or null if there are none."""
+    return F(total) / NullIf(F(count), 0, output_field=FloatField())
+
+
+def materialized_stddev(total, sumsq, count):
+    """Returns an expression for the population standard deviation of values
+    whose sum, sum of squares and number are in the given fields, like
+    `StdDev()`. Rounding errors are kept from making the variance negative."""
+    mean = materialized_average(total, count)
+    variance = F(sumsq) / NullIf(F(count), 0, output_field=FloatField()) - Power(mean, 2)
+    return Sqrt(Greatest(variance, 0.0, output_field=FloatField()))
+
+
 class BaseMetricAnnotator:
     """Base class for all metric annotators.
 
@@ -111,6 +127,18 @@ class QuerySetMetricAnnotator(BaseMetricAnnotator):
         self.queryset_annotated = True
         return queryset.annotate(**{self.key: annotation})
 
+    def get_materialized_annotation(self, relation):
+        """Returns an expression for the metric from the fields of the round
+        metrics model (see `materialized.py`), reached through `relation`, or
+        None if the metric can't be calculated from round metrics."""
+        return None
+
+    def get_materialized_queryset(self, queryset, relation):
+        """Returns a QuerySet annotated with the metric given, from round
+        metrics."""
+        self.queryset_annotated = True
+        return queryset.annotate(**{self.key: self.get_materialized_annotation(relation)})
+
     def get_ranking_annotation(self, min_field, min_rounds):
         if min_rounds is None:
             return F(self.key)
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.11 on 2026-10-18 05:28
+
+import django.db.models.deletion
+import utils.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('participants', '0030_adjudicator_registration_status_and_more'),
+        ('tournaments', '0015_round_draw_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricsState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_substantive_position', models.PositiveIntegerField(verbose_name='last substantive position')),
+                ('reply_position', models.PositiveIntegerField(blank=True, null=True, verbose_name='reply position')),
+                ('tournament', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='tournaments.tournament', verbose_name='tournament')),
+            ],
+            options={
+                'verbose_name': 'metrics state',
+                'verbose_name_plural': 'metrics states',
+            },
+        ),
+        migrations.CreateModel(
+            name='SpeakerRoundMetrics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.FloatField(blank=True, null=True, verbose_name='total')),
+                ('sumsq', models.FloatField(blank=True, null=True, verbose_name='sum of squared scores')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='number of speeches')),
+                ('highest', models.FloatField(blank=True, null=True, verbose_name='highest score')),
+                ('lowest', models.FloatField(blank=True, null=True, verbose_name='lowest score')),
+                ('rank_sum', models.PositiveIntegerField(blank=True, null=True, verbose_name='sum of speech ranks')),
+                ('replies_sum', models.FloatField(blank=True, null=True, verbose_name='total reply score')),
+                ('replies_sumsq', models.FloatField(blank=True, null=True, verbose_name='sum of squared reply scores')),
+                ('replies_count', models.PositiveIntegerField(default=0, verbose_name='number of replies')),
+                ('round', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tournaments.round', verbose_name='round')),
+                ('speaker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='participants.speaker', verbose_name='speaker')),
+            ],
+            options={
+                'verbose_name': 'speaker round metrics',
+                'verbose_name_plural': 'speaker round metrics',
+                'constraints': [utils.models.UniqueConstraint(fields=('speaker', 'round'), name='standin_speakerroundmetrics_speaker__round_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TeamRoundMetrics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.FloatField(blank=True, help_text='Weighted by round weight', null=True, verbose_name='points')),
+                ('wins', models.PositiveIntegerField(default=0, verbose_name='wins')),
+                ('speaks_sum', models.FloatField(blank=True, null=True, verbose_name='total speaker score')),
+                ('speaks_sumsq', models.FloatField(blank=True, null=True, verbose_name='sum of squared speaker scores')),
+                ('speaks_count', models.PositiveIntegerField(default=0, verbose_name='number of speaker scores')),
+                ('margin_sum', models.FloatField(blank=True, null=True, verbose_name='sum of margins')),
+                ('margin_count', models.PositiveIntegerField(default=0, verbose_name='number of margins')),
+                ('votes', models.FloatField(default=0, help_text='Sum of the proportions of votes carried', verbose_name='votes')),
+                ('firsts', models.PositiveIntegerField(default=0, verbose_name='number of firsts')),
+                ('seconds', models.PositiveIntegerField(default=0, verbose_name='number of seconds')),
+                ('thirds', models.PositiveIntegerField(default=0, verbose_name='number of thirds')),
+                ('irons', models.PositiveIntegerField(default=0, verbose_name='number of times ironed')),
+                ('round', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tournaments.round', verbose_name='round')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='participants.team', verbose_name='team')),
+            ],
+            options={
+                'verbose_name': 'team round metrics',
+                'verbose_name_plural': 'team round metrics',
+                'constraints': [utils.models.UniqueConstraint(fields=('team', 'round'), name='standin_teamroundmetrics_team__round_uniq')],
+            },
+        ),
+    ]
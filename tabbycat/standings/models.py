@@ -0,0 +1,106 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from utils.models import UniqueConstraint
+
+
+class TeamRoundMetrics(models.Model):
+    """Cumulative results of a team in the preliminary rounds up to and
+    including `round`, from confirmed ballots. Kept up to date by the signal
+    handlers in `signals.py`; see `materialized.py`."""
+
+    team = models.ForeignKey('participants.Team', models.CASCADE,
+        verbose_name=_("team"))
+    round = models.ForeignKey('tournaments.Round', models.CASCADE,
+        verbose_name=_("round"))
+
+    points = models.FloatField(null=True, blank=True,
+        verbose_name=_("points"),
+        help_text=_("Weighted by round weight"))
+    wins = models.PositiveIntegerField(default=0,
+        verbose_name=_("wins"))
+    speaks_sum = models.FloatField(null=True, blank=True,
+        verbose_name=_("total speaker score"))
+    speaks_sumsq = models.FloatField(null=True, blank=True,
+        verbose_name=_("sum of squared speaker scores"))
+    speaks_count = models.PositiveIntegerField(default=0,
+        verbose_name=_("number of speaker scores"))
+    margin_sum = models.FloatField(null=True, blank=True,
+        verbose_name=_("sum of margins"))
+    margin_count = models.PositiveIntegerField(default=0,
+        verbose_name=_("number of margins"))
+    votes = models.FloatField(default=0,
+        verbose_name=_("votes"),
+        help_text=_("Sum of the proportions of votes carried"))
+    firsts = models.PositiveIntegerField(default=0,
+        verbose_name=_("number of firsts"))
+    seconds = models.PositiveIntegerField(default=0,
+        verbose_name=_("number of seconds"))
+    thirds = models.PositiveIntegerField(default=0,
+        verbose_name=_("number of thirds"))
+    irons = models.PositiveIntegerField(default=0,
+        verbose_name=_("number of times ironed"))
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=['team', 'round'])]
+        verbose_name = _("team round metrics")
+        verbose_name_plural = _("team round metrics")
+
+    def __str__(self):
+        return "[{0.round_id}] {0.team_id}".format(self)
+
+
+class SpeakerRoundMetrics(models.Model):
+    """Cumulative speaker scores of a speaker in the preliminary rounds up to
+    and including `round`, from confirmed ballots, excluding ghost scores."""
+
+    speaker = models.ForeignKey('participants.Speaker', models.CASCADE,
+        verbose_name=_("speaker"))
+    round = models.ForeignKey('tournaments.Round', models.CASCADE,
+        verbose_name=_("round"))
+
+    total = models.FloatField(null=True, blank=True,
+        verbose_name=_("total"))
+    sumsq = models.FloatField(null=True, blank=True,
+        verbose_name=_("sum of squared scores"))
+    count = models.PositiveIntegerField(default=0,
+        verbose_name=_("number of speeches"))
+    highest = models.FloatField(null=True, blank=True,
+        verbose_name=_("highest score"))
+    lowest = models.FloatField(null=True, blank=True,
+        verbose_name=_("lowest score"))
+    rank_sum = models.PositiveIntegerField(null=True, blank=True,
+        verbose_name=_("sum of speech ranks"))
+    replies_sum = models.FloatField(null=True, blank=True,
+        verbose_name=_("total reply score"))
+    replies_sumsq = models.FloatField(null=True, blank=True,
+        verbose_name=_("sum of squared reply scores"))
+    replies_count = models.PositiveIntegerField(default=0,
+        verbose_name=_("number of replies"))
+
+    class Meta:
+        constraints = [UniqueConstraint(fields=['speaker', 'round'])]
+        verbose_name = _("speaker round metrics")
+        verbose_name_plural = _("speaker round metrics")
+
+    def __str__(self):
+        return "[{0.round_id}] {0.speaker_id}".format(self)
+
+
+class MetricsState(models.Model):
+    """Records that the round metrics of a tournament are complete and up to
+    date, and the speaker positions they were built with."""
+
+    tournament = models.OneToOneField('tournaments.Tournament', models.CASCADE,
+        verbose_name=_("tournament"))
+    last_substantive_position = models.PositiveIntegerField(
+        verbose_name=_("last substantive position"))
+    reply_position = models.PositiveIntegerField(null=True, blank=True,
+        verbose_name=_("reply position"))
+
+    class Meta:
+        verbose_name = _("metrics state")
+        verbose_name_plural = _("metrics states")
+
+    def __str__(self):
+        return str(self.tournament_id)
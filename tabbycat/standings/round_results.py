@@ -1,15 +1,79 @@
 import logging
+from collections import namedtuple
 
-from django.db.models import Prefetch
+from django.core.cache import cache
 
-from draw.models import DebateTeam
-from draw.prefetch import populate_opponents
+from draw.models import Debate, DebateTeam
+from participants.models import Team
 from results.models import SpeakerScore, TeamScore
 
 logger = logging.getLogger(__name__)
 
+RESULTS_MATRIX_KEY = "team_results_matrix_%d"  # tournament ID
+RESULTS_MATRIX_TIMEOUT = 60 * 60 * 24
 
-def add_team_round_results(standings, rounds, opponents=False, lookup=None, id_attr='instance_id'):
+# One team's result in one round. `debate_teams` is a tuple of
+# `(debate_team_id, side, team_id)` for every team in the debate.
+TeamRoundResult = namedtuple('TeamRoundResult', ['points', 'win', 'score', 'ballot_submission_id',
+    'debate_team_id', 'debate_id', 'sides_confirmed', 'debate_teams'])
+
+
+def _build_results_matrix(tournament):
+    scores = TeamScore.objects.filter(
+        ballot_submission__confirmed=True,
+        debate_team__debate__round__tournament=tournament,
+    )
+    debate_teams = {}
+    for debate_id, dt_id, side, team_id in DebateTeam.objects.filter(
+            debate_id__in=scores.values('debate_team__debate_id')).values_list('debate_id', 'id', 'side', 'team_id'):
+        debate_teams.setdefault(debate_id, []).append((dt_id, side, team_id))
+
+    matrix = {}
+    for team_id, round_id, debate_id, sides_confirmed, *result in scores.values_list(
+            'debate_team__team_id', 'debate_team__debate__round_id', 'debate_team__debate_id',
+            'debate_team__debate__sides_confirmed', 'points', 'win', 'score', 'ballot_submission_id',
+            'debate_team_id'):
+        points, win, score, ballot_submission_id, debate_team_id = result
+        matrix.setdefault(team_id, {})[round_id] = TeamRoundResult(points, win, score, ballot_submission_id,
+            debate_team_id, debate_id, sides_confirmed, tuple(sorted(debate_teams[debate_id], key=lambda dt: dt[1])))
+    return matrix
+
+
+def get_results_matrix(tournament):
+    """Returns a dict mapping team IDs to dicts mapping round IDs to a
+    `TeamRoundResult` for the team's confirmed result in that round. Rounds
+    without a confirmed result are absent. The matrix is built once, then
+    stored in the cache until a result or debate in the tournament changes
+    (see `standings/signals.py`)."""
+    key = RESULTS_MATRIX_KEY % tournament.id
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = _build_results_matrix(tournament)
+        cache.set(key, matrix, RESULTS_MATRIX_TIMEOUT)
+    return matrix
+
+
+def invalidate_results_matrix(tournament_ids):
+    cache.delete_many([RESULTS_MATRIX_KEY % tournament_id for tournament_id in tournament_ids])
+
+
+def _team_score_from_result(result, round, teams):
+    """Returns an unsaved TeamScore from `result`, with its debate team,
+    debate, round, opponent and teams in the debate populated, so that it can
+    be displayed without further queries. `teams` maps team IDs to teams."""
+    debate = Debate(id=result.debate_id, round=round, sides_confirmed=result.sides_confirmed)
+    debate_teams = [DebateTeam(id=dt_id, debate=debate, side=side, team=teams[team_id])
+                    for dt_id, side, team_id in result.debate_teams]
+    debate._populate_teams(debate_teams)
+
+    debate_team = next(dt for dt in debate_teams if dt.id == result.debate_team_id)
+    opponents = [dt for dt in debate_teams if dt is not debate_team]
+    debate_team._opponent = opponents[0] if opponents else None
+    return TeamScore(debate_team=debate_team, ballot_submission_id=result.ballot_submission_id,
+                     points=result.points, win=result.win, score=result.score)
+
+
+def add_team_round_results(standings, rounds, id_attr='instance_id', team_attr='team'):
     """Sets, on each item `info` in `standings`, an attribute
     `info.round_results` to be a list of `TeamScore` objects, one for each round
     in `rounds` (in the same order), relating to the team associated with that
@@ -18,47 +82,43 @@ def add_team_round_results(standings, rounds, opponents=False, lookup=None, id_a
     If, for some team and round, there is no relevant `TeamScore`, then the
     corresponding element of `info.round_results` will be `None`.
 
-    If `lookup` is given, it should be a function that takes two arguments
-    `(standings, x)` and returns the element in `standings` relating to the
-    `Team` object `x`.  By default, it just uses `standings.get_standings(x)`.
+    The results are read from the tournament's results matrix (see
+    `get_results_matrix()`), and the `TeamScore` objects are unsaved copies.
+    Teams in the debates are taken from `standings` where possible, using
+    the attribute `team_attr` of each item (or the item itself if `team_attr`
+    is None); other teams are fetched in one query.
     """
 
-    if lookup is None:
-        def lookup(standings, x):
-            return standings.get_standing(x)
-
-    team_ids = [getattr(info, id_attr) for info in standings]
-    teamscores = TeamScore.objects.select_related(
-        'debate_team__team', 'debate_team__debate__round').filter(
-        ballot_submission__confirmed=True,
-        debate_team__debate__round__in=rounds,
-        debate_team__team_id__in=team_ids,
-    )
+    rounds = list(rounds)
+    items = list(standings)
+    for item in items:
+        item.round_results = [None] * len(rounds)
+    if not rounds:
+        return
 
-    if opponents:
-        populate_opponents([ts.debate_team for ts in teamscores])
-    else:
-        teamscores = teamscores.prefetch_related(
-            Prefetch('debate_team__debate__debateteam_set', queryset=DebateTeam.objects.select_related('team')))
+    matrix = get_results_matrix(rounds[0].tournament)
+    results = [(item, i, result) for item in items
+               for i, result in enumerate(matrix.get(getattr(item, id_attr), {}).get(r.id) for r in rounds)
+               if result is not None]
 
-    for info in standings:
-        info.round_results = [None] * len(rounds)
+    teams = {team.id: team for team in (item if team_attr is None else getattr(item, team_attr) for item in items)}
+    missing = {team_id for _, _, result in results for _, _, team_id in result.debate_teams} - teams.keys()
+    if missing:
+        # _base_manager includes teams that are no longer confirmed as registered
+        teams.update(Team._base_manager.select_related('institution').prefetch_related('speaker_set').in_bulk(missing))
 
-    round_lookup = {r: i for i, r in enumerate(rounds)}
-    for ts in teamscores:
-        info = lookup(standings, ts.debate_team.team)
-        info.round_results[round_lookup[ts.debate_team.debate.round]] = ts
+    for item, i, result in results:
+        item.round_results[i] = _team_score_from_result(result, rounds[i], teams)
 
 
-def add_team_round_results_public(teams, rounds, opponents=False):
+def add_team_round_results_public(teams, rounds):
     """Sets, on each item `t` in `teams`, the following attributes:
       - `t.round_results`, a list of `TeamScore` objects, one for each round in
         `rounds` (in the same order), relating to the team `t`.
       - `t.points`, the number of points that team has from the rounds in
         `rounds`.
     """
-    add_team_round_results(teams, rounds, opponents=opponents,
-        lookup=(lambda teams, x: [t for t in teams if t == x][0]), id_attr='id')
+    add_team_round_results(teams, rounds, id_attr='id', team_attr=None)
     for team in teams:
         team.points = sum([(ts.points or 0) * ts.debate_team.debate.round.weight for ts in team.round_results if ts is not None])
 
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from draw.models import Debate, DebateTeam
+from results.models import BallotSubmission, SpeakerScore, TeamScore
+from tournaments.models import Round
+
+from .materialized import queue_results
+from .round_results import invalidate_results_matrix
+
+
+@receiver(post_delete, sender=BallotSubmission)
+@receiver(post_save, sender=BallotSubmission)
+def update_metrics_for_ballot(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    queue_results(debate_ids=[instance.debate_id])
+
+
+@receiver(post_delete, sender=TeamScore)
+@receiver(post_save, sender=TeamScore)
+@receiver(post_delete, sender=SpeakerScore)
+@receiver(post_save, sender=SpeakerScore)
+def update_metrics_for_score(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    queue_results(ballot_ids=[instance.ballot_submission_id])
+
+
+@receiver(post_delete, sender=Debate)
+def rebuild_metrics_for_debate(sender, instance, **kwargs):
+    queue_results(round_ids=[instance.round_id])
+
+
+@receiver(pre_save, sender=DebateTeam)
+def rebuild_metrics_for_debate_team(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Teams that are moved out of a debate aren't in it when the metrics are
+    updated, so if a team changes, the whole tournament is rebuilt."""
+    if raw or instance.pk is None or (update_fields is not None and 'team' not in update_fields):
+        return
+    previous = sender.objects.filter(pk=instance.pk).exclude(team_id=instance.team_id)
+    queue_results(round_ids=previous.values_list('debate__round_id', flat=True))
+
+
+@receiver(pre_save, sender=Round)
+def rebuild_metrics_for_round(sender, instance, raw=False, **kwargs):
+    """Rebuilds metrics if a round is added, or changes in a way that affects
+    which results are included or how they're weighted."""
+    if raw:
+        return
+    if instance.pk is None or not sender.objects.filter(pk=instance.pk, seq=instance.seq,
+            stage=instance.stage, weight=instance.weight).exists():
+        queue_results(tournament_ids=[instance.tournament_id])
+
+
+@receiver(post_delete, sender=Round)
+def rebuild_metrics_for_deleted_round(sender, instance, **kwargs):
+    queue_results(tournament_ids=[instance.tournament_id])
+
+
+@receiver(post_save, sender=Debate)
+@receiver(post_save, sender=DebateTeam)
+def invalidate_results_matrix_for_debate(sender, instance, raw=False, **kwargs):
+    """The results matrix also records sides, which can change without any
+    change to results."""
+    if raw:
+        return
+    rounds = Round.objects.filter(debate__id=instance.id if sender is Debate else instance.debate_id)
+    transaction.on_commit(lambda: invalidate_results_matrix(rounds.values_list('tournament_id', flat=True)))
@@ -2,14 +2,14 @@
 
 import logging
 
-from django.db.models import Avg, Case, Count, F, FloatField, Max, Min, Q, StdDev, Sum, When
-from django.db.models.functions import Cast, NullIf
+from django.db.models import Avg, Case, Count, F, FloatField, IntegerField, Max, Min, Q, StdDev, Sum, When
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.utils.translation import gettext_lazy as _
 
 from tournaments.models import Round
 
 from .base import BaseStandingsGenerator
-from .metrics import QuerySetMetricAnnotator
+from .metrics import materialized_average, materialized_stddev, QuerySetMetricAnnotator
 from .ranking import BasicRankAnnotator
 
 logger = logging.getLogger(__name__)
@@ -71,6 +71,9 @@ class TotalSpeakerScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     abbr = _("Total")
     function = Sum
 
+    def get_materialized_annotation(self, relation):
+        return F(relation + '__total')
+
 
 class AverageSpeakerScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     """Metric annotator for average speaker score."""
@@ -79,6 +82,9 @@ class AverageSpeakerScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     abbr = _("Avg")
     function = Avg
 
+    def get_materialized_annotation(self, relation):
+        return materialized_average(relation + '__total', relation + '__count')
+
 
 class SpeakerTeamPointsMetricAnnotator(TeamMetricQuerySetMetricAnnotator):
     """Metric annotator for team points."""
@@ -164,6 +170,9 @@ class StandardDeviationSpeakerScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnn
     function = StdDev
     ascending = True
 
+    def get_materialized_annotation(self, relation):
+        return materialized_stddev(relation + '__total', relation + '__sumsq', relation + '__count')
+
 
 class NumberOfSpeechesMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     """Metric annotator for number of speeches given."""
@@ -172,6 +181,9 @@ class NumberOfSpeechesMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     abbr = _("Num")
     function = Count
 
+    def get_materialized_annotation(self, relation):
+        return Coalesce(F(relation + '__count'), 0, output_field=IntegerField())
+
 
 class TotalReplyScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     """Metric annotator for total reply score."""
@@ -182,6 +194,9 @@ class TotalReplyScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     replies = True
     listed = False
 
+    def get_materialized_annotation(self, relation):
+        return F(relation + '__replies_sum')
+
 
 class AverageReplyScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     """Metric annotator for average reply score."""
@@ -192,6 +207,9 @@ class AverageReplyScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     replies = True
     listed = False
 
+    def get_materialized_annotation(self, relation):
+        return materialized_average(relation + '__replies_sum', relation + '__replies_count')
+
 
 class StandardDeviationReplyScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     """Metric annotator for standard deviation of reply score."""
@@ -203,6 +221,9 @@ class StandardDeviationReplyScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnnot
     listed = False
     ascending = True
 
+    def get_materialized_annotation(self, relation):
+        return materialized_stddev(relation + '__replies_sum', relation + '__replies_sumsq', relation + '__replies_count')
+
 
 class NumberOfRepliesMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     """Metric annotator for number of replies given."""
@@ -213,6 +234,9 @@ class NumberOfRepliesMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     replies = True
     listed = False
 
+    def get_materialized_annotation(self, relation):
+        return Coalesce(F(relation + '__replies_count'), 0, output_field=IntegerField())
+
 
 class TrimmedMeanSpeakerScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     """Metric annotator for trimmed mean speaker score."""
@@ -248,6 +272,14 @@ class TrimmedMeanSpeakerScoreMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator
             output_field=FloatField(),
         )
 
+    def get_materialized_annotation(self, relation):
+        total, count = F(relation + '__total'), F(relation + '__count')
+        return Case(
+            When(**{relation + '__count__gt': 2, 'then': (total - F(relation + '__highest') - F(relation + '__lowest')) / (count - 2)}),
+            When(**{relation + '__count__gt': 0, 'then': total / count}),
+            output_field=FloatField(),
+        )
+
 
 class SpeakerScoreRankingsMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     """Metric annotator for standard deviation of speaker score."""
@@ -258,6 +290,9 @@ class SpeakerScoreRankingsMetricAnnotator(SpeakerScoreQuerySetMetricAnnotator):
     ascending = True
     field = 'speakerscore__rank'
 
+    def get_materialized_annotation(self, relation):
+        return F(relation + '__rank_sum')
+
 
 # ==============================================================================
 # Standings generator
@@ -306,3 +341,4 @@ class SpeakerStandingsGenerator(BaseStandingsGenerator):
     }
 
     tournament_field = 'team__tournament'
+    metrics_relation = 'speakerroundmetrics'
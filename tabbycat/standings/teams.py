@@ -1,18 +1,21 @@
 """Standings generator for teams."""
 
 import logging
-from statistics import mean
 
-from django.contrib.postgres.aggregates import ArrayAgg
-from django.db.models import Avg, Count, F, FloatField, PositiveIntegerField, Q, StdDev, Sum
-from django.db.models.functions import Cast, NullIf
+import numpy as np
+from django.db.models import (Avg, Count, F, FilteredRelation, FloatField, IntegerField,
+                              PositiveIntegerField, Q, StdDev, Sum)
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.utils.translation import gettext_lazy as _
 
+from draw.models import DebateTeam
 from results.models import TeamScore
 from tournaments.models import Round
 
 from .base import BaseStandingsGenerator
-from .metrics import BaseMetricAnnotator, metricgetter, QuerySetMetricAnnotator, RepeatedMetricAnnotator
+from .materialized import get_metrics_round
+from .metrics import (BaseMetricAnnotator, materialized_average, materialized_stddev, metricgetter,
+                      QuerySetMetricAnnotator, RepeatedMetricAnnotator)
 from .ranking import BasicRankAnnotator, RankFromInstitutionAnnotator, SubrankAnnotator
 
 logger = logging.getLogger(__name__)
@@ -33,6 +36,7 @@ class TeamScoreQuerySetMetricAnnotator(QuerySetMetricAnnotator):
     where_value = None
 
     exclude_unconfirmed = True
+    materialized_count = None  # field of TeamRoundMetrics holding this count, if it is one
 
     def get_field(self):
         """Subclasses with complicated fields override this method."""
@@ -56,6 +60,11 @@ class TeamScoreQuerySetMetricAnnotator(QuerySetMetricAnnotator):
     def get_annotation(self, round=None):
         return self.function(self.get_field(), filter=self.get_annotation_filter(round), output_field=self.output_field)
 
+    def get_materialized_annotation(self, relation):
+        if self.materialized_count is None:
+            return None
+        return Coalesce(F(relation + '__' + self.materialized_count), 0, output_field=IntegerField())
+
 
 class PointsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     """Metric annotator for total number of points."""
@@ -70,6 +79,10 @@ class PointsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     def get_field(self):
         return F(super().get_field()) * F('debateteam__debate__round__weight')
 
+    def get_materialized_annotation(self, relation):
+        # Round metrics store points as a float, but they're always whole
+        return Cast(F(relation + '__points'), output_field=self.output_field)
+
 
 class WinsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     """Metric annotator for total number of wins."""
@@ -80,6 +93,7 @@ class WinsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     function = Count
     field = "win"
     where_value = True
+    materialized_count = "wins"
 
 
 class TotalSpeakerScoreMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
@@ -91,6 +105,9 @@ class TotalSpeakerScoreMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     function = Sum
     field = "score"
 
+    def get_materialized_annotation(self, relation):
+        return F(relation + '__speaks_sum')
+
 
 class AverageSpeakerScoreMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     """Metric annotator for total speaker score."""
@@ -101,6 +118,9 @@ class AverageSpeakerScoreMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     function = Avg
     field = "score"
 
+    def get_materialized_annotation(self, relation):
+        return materialized_average(relation + '__speaks_sum', relation + '__speaks_count')
+
 
 class SpeakerScoreStandardDeviationMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     """Metric annotator for total speaker score."""
@@ -112,6 +132,9 @@ class SpeakerScoreStandardDeviationMetricAnnotator(TeamScoreQuerySetMetricAnnota
     function = StdDev
     field = "score"
 
+    def get_materialized_annotation(self, relation):
+        return materialized_stddev(relation + '__speaks_sum', relation + '__speaks_sumsq', relation + '__speaks_count')
+
 
 class SumMarginMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     """Metric annotator for sum of margins."""
@@ -122,6 +145,9 @@ class SumMarginMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     function = Sum
     field = "margin"
 
+    def get_materialized_annotation(self, relation):
+        return F(relation + '__margin_sum')
+
 
 class AverageMarginMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     """Metric annotator for average margin."""
@@ -132,6 +158,9 @@ class AverageMarginMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     function = Avg
     field = "margin"
 
+    def get_materialized_annotation(self, relation):
+        return materialized_average(relation + '__margin_sum', relation + '__margin_count')
+
 
 class AverageIndividualScoreMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     """Metric annotator for total substantive speaker score."""
@@ -172,39 +201,80 @@ class AverageIndividualScoreMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
         return super().get_annotated_queryset(queryset, round)
 
 
+def get_opponent_index(queryset, round=None):
+    """Returns a pair of arrays `(team_ids, opponent_ids)`, with an element for
+    each time a team in `queryset` faced an opponent in a preliminary round up
+    to and including `round` (or all preliminary rounds if `round` is None).
+    A team that faced the same opponent twice appears twice."""
+    debateteams = DebateTeam.objects.filter(
+        debate__debateteam__team__in=queryset.values('id'),
+        debate__round__stage=Round.Stage.PRELIMINARY,
+    )
+    if round is not None:
+        debateteams = debateteams.filter(debate__round__seq__lte=round.seq)
+
+    # The first field follows the join in the filter, so each row pairs a
+    # team being ranked with a team (maybe itself) in the same debate.
+    pairs = np.array(list(debateteams.values_list('debate__debateteam__team_id', 'team_id').order_by()),
+                     dtype=int).reshape(-1, 2)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    return pairs[:, 0], pairs[:, 1]
+
+
+def sum_over_opponents(team_ids, opponent_ids, values):
+    """Returns a dict mapping each of `team_ids` to the sum of `values` over
+    its opponents and the number of opponents counted, where `values` maps
+    opponent IDs to values. Opponents whose value is None or missing are left
+    out, and teams with no opponents counted are left out of the dict. Sums are
+    ints if every value counted is an int, so that they're displayed as such."""
+    opponent_ids_unique, opponent_index = np.unique(opponent_ids, return_inverse=True)
+    opponent_values = [values.get(opp_id) for opp_id in opponent_ids_unique.tolist()]
+    integral = all(isinstance(value, int) for value in opponent_values if value is not None)
+    opponent_values = np.array(opponent_values, dtype=float)
+    counted = ~np.isnan(opponent_values[opponent_index])
+
+    teams_unique, team_index = np.unique(team_ids[counted], return_inverse=True)
+    sums = np.bincount(team_index, weights=opponent_values[opponent_index][counted], minlength=len(teams_unique))
+    counts = np.bincount(team_index, minlength=len(teams_unique))
+
+    if integral:
+        sums = sums.round().astype(int)
+    return {team_id: (total, count) for team_id, total, count in
+            zip(teams_unique.tolist(), sums.tolist(), counts.tolist())}
+
+
 class BaseDrawStrengthMetricAnnotator(BaseMetricAnnotator):
 
     opponent_annotator = None
 
+    def get_opponent_metrics(self, queryset, opponent_ids, round=None):
+        """Returns a dict mapping each of `opponent_ids` to their metric, read
+        from round metrics if they're current."""
+        annotator = self.opponent_annotator()
+        teams = queryset.model.objects.filter(id__in=opponent_ids.tolist())
+
+        tournament = round.tournament if round is not None else queryset[0].tournament
+        metrics_round_id = get_metrics_round(tournament, round)
+        if metrics_round_id is not None:
+            relation = TeamStandingsGenerator.metrics_relation
+            teams = teams.annotate(**{TeamStandingsGenerator.METRICS_ALIAS: FilteredRelation(
+                relation, condition=Q(**{relation + '__round_id': metrics_round_id}))})
+            teams = annotator.get_materialized_queryset(teams, TeamStandingsGenerator.METRICS_ALIAS)
+        else:
+            teams = annotator.get_annotated_queryset(teams, round)
+        return dict(teams.values_list('id', annotator.key))
+
     def annotate(self, queryset, standings, round=None):
         if not queryset.exists():
             return
 
         logger.info("Running opponents query for draw strength:")
+        team_ids, opponent_ids = get_opponent_index(queryset, round)
+        opp_metrics = self.get_opponent_metrics(queryset, np.unique(opponent_ids), round)
 
-        # Make a copy of teams queryset and annotate with opponents
-        opponents_filter = ~Q(debateteam__debate__debateteam__team_id=F('id'))
-        opponents_filter &= Q(debateteam__debate__round__stage=Round.Stage.PRELIMINARY)
-        if round is not None:
-            opponents_filter &= Q(debateteam__debate__round__seq__lte=round.seq)
-        opponents_annotation = ArrayAgg('debateteam__debate__debateteam__team_id',
-                filter=opponents_filter)
-        logger.info("Opponents annotation: %s", str(opponents_annotation))
-        teams_with_opponents = queryset.model.objects.annotate(opponent_ids=opponents_annotation)
-        opponents_by_team = {team.id: team.opponent_ids or [] for team in teams_with_opponents}
-
-        opp_metric_queryset = self.opponent_annotator().get_annotated_queryset(
-                queryset[0].tournament.team_set.all(), round)
-        opp_metric_queryset_teams = {team.id: team for team in opp_metric_queryset}
-
+        draw_strengths = sum_over_opponents(team_ids, opponent_ids, opp_metrics)
         for team in queryset:
-            draw_strength = 0
-            for opponent_id in opponents_by_team[team.id]:
-                if opponent_id not in opp_metric_queryset_teams:
-                    continue
-                opp_metric = getattr(opp_metric_queryset_teams[opponent_id], self.opponent_annotator.key)
-                if opp_metric is not None: # opp_metric is None when no debates have happened
-                    draw_strength += opp_metric
+            draw_strength, _count = draw_strengths.get(team.id, (0, 0))
             standings.add_metric(team, self.key, draw_strength)
 
 
@@ -221,31 +291,14 @@ class DrawStrengthByRankMetricAnnotator(BaseMetricAnnotator):
             return
 
         logger.info("Running opponents query for rank draw strength:")
+        team_ids, opponent_ids = get_opponent_index(queryset, round)
+        ranks = {info.instance_id: info.rankings['rank'][0] for info in standings.infoview()
+                 if 'rank' in info.rankings}
 
-        team_filter = Q()
-        # Make a copy of teams queryset and annotate with opponents
-        opponents_filter = ~Q(debateteam__debate__debateteam__team_id=F('id'))
-        opponents_filter &= Q(debateteam__debate__round__stage=Round.Stage.PRELIMINARY)
-        if round is not None:
-            opponents_filter &= Q(debateteam__debate__round__seq__lte=round.seq)
-            team_filter &= Q(tournament=round.tournament)
-
-        opponents_annotation = ArrayAgg('debateteam__debate__debateteam__team_id',
-                filter=opponents_filter)
-        logger.info("Opponents annotation: %s", str(opponents_annotation))
-        teams_with_opponents = queryset.model.objects.filter(team_filter).annotate(opponent_ids=opponents_annotation)
-        opponents_by_team = {team.id: team.opponent_ids or [] for team in teams_with_opponents}
-        teams_by_id = {team.id: team for team in teams_with_opponents}
-
+        rank_sums = sum_over_opponents(team_ids, opponent_ids, ranks)
         for team in queryset:
-            ranks = []
-            for opponent_id in opponents_by_team[team.id]:
-                if opponent_id not in teams_by_id:
-                    continue
-                if opponent := standings.infos.get(teams_by_id[opponent_id]):
-                    ranks.append(opponent.rankings['rank'][0])
-            ranks_without_none = [rank for rank in ranks if rank is not None]
-            standings.add_metric(team, self.key, mean(ranks_without_none))
+            total, count = rank_sums.get(team.id, (0, 0))
+            standings.add_metric(team, self.key, total / count if count else None)
 
 
 class DrawStrengthByWinsMetricAnnotator(BaseDrawStrengthMetricAnnotator):
@@ -321,6 +374,9 @@ class NumberOfAdjudicatorsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
             NullIf('debateteam__teamscore__votes_possible', 0, output_field=FloatField()) *
             self.adjs_per_debate)
 
+    def get_materialized_annotation(self, relation):
+        return F(relation + '__votes') * self.adjs_per_debate
+
     def annotate_with_queryset(self, queryset, standings):
         # If the number of ballots carried by every team is an integer, then
         # it's probably (though not certainly) the case that there are no
@@ -340,6 +396,7 @@ class NumberOfFirstsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     function = Count
     field = "points"
     where_value = 3
+    materialized_count = "firsts"
 
 
 class NumberOfSecondsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
@@ -350,6 +407,7 @@ class NumberOfSecondsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     function = Count
     field = "points"
     where_value = 2
+    materialized_count = "seconds"
 
 
 class NumberOfThirdsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
@@ -360,6 +418,7 @@ class NumberOfThirdsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     function = Count
     field = "points"
     where_value = 1
+    materialized_count = "thirds"
 
 
 class IronsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
@@ -372,6 +431,7 @@ class IronsMetricAnnotator(TeamScoreQuerySetMetricAnnotator):
     function = Count
     field = "has_ghost"
     where_value = True
+    materialized_count = "irons"
 
 
 class WhoBeatWhomMetricAnnotator(RepeatedMetricAnnotator):
@@ -383,39 +443,47 @@ class WhoBeatWhomMetricAnnotator(RepeatedMetricAnnotator):
     abbr_prefix = _("WBW")
     choice_name = _("who-beat-whom")
 
-    def get_team_scores(self, key, equal_teams, tsi, round):
-        equal_teams.remove(tsi)
-        other = equal_teams[0]
-        ts = TeamScore.objects.filter(
+    def get_head_to_head_points(self, team_ids, round):
+        """Returns a dict mapping `(team_id, other_id)` to the total points
+        the first team earned in debates with the second, for all pairs of
+        teams in `team_ids`, in one query. Pairs that haven't met are absent."""
+        scores = TeamScore.objects.filter(
             ballot_submission__confirmed=True,
-            debate_team__team=tsi.team,
-            debate_team__debate__debateteam__team=other.team,
+            debate_team__team_id__in=team_ids,
+            debate_team__debate__debateteam__team_id__in=team_ids,
             debate_team__debate__round__stage=Round.Stage.PRELIMINARY,
         )
 
         if round is not None:
-            ts = ts.filter(debate_team__debate__round__seq__lte=round.seq)
+            scores = scores.filter(debate_team__debate__round__seq__lte=round.seq)
 
-        ts = ts.aggregate(Sum('points'))
-        logger.info("who beat whom, %s %s vs %s %s: %s",
-            tsi.team.short_name, key(tsi), other.team.short_name, key(other),
-            ts["points__sum"])
-        return ts
+        scores = scores.values_list('debate_team__team_id', 'debate_team__debate__debateteam__team_id').annotate(
+            Sum('points')).order_by()
+        return {(team_id, other_id): points for team_id, other_id, points in scores}
 
     def annotate(self, queryset, standings, round=None):
         key = metricgetter(self.keys)
 
-        def who_beat_whom(tsi):
-            equal_teams = [x for x in standings.infoview() if key(x) == key(tsi)]
-            if len(equal_teams) != 2:
-                return "n/a"  # fail fast if attempt to compare with an int
+        # Only teams tied with exactly one other team can be compared
+        tied = {}
+        for tsi in standings.infoview():
+            tied.setdefault(key(tsi), []).append(tsi)
+        pairs = [group for group in tied.values() if len(group) == 2]
 
-            ts = self.get_team_scores(key, equal_teams, tsi, round)
-            return ts["points__sum"] or 0
+        team_ids = [tsi.team.id for pair in pairs for tsi in pair]
+        points = self.get_head_to_head_points(team_ids, round) if team_ids else {}
 
         for tsi in standings.infoview():
-            wbw = who_beat_whom(tsi)
-            tsi.add_metric(self.key, wbw)
+            equal_teams = tied[key(tsi)]
+            if len(equal_teams) != 2:
+                tsi.add_metric(self.key, "n/a")  # fail fast if attempt to compare with an int
+                continue
+
+            other = equal_teams[1] if equal_teams[0] is tsi else equal_teams[0]
+            wbw = points.get((tsi.team.id, other.team.id))
+            logger.info("who beat whom, %s %s vs %s %s: %s",
+                tsi.team.short_name, key(tsi), other.team.short_name, key(other), wbw)
+            tsi.add_metric(self.key, wbw or 0)
 
 
 # ==============================================================================
@@ -470,3 +538,4 @@ class TeamStandingsGenerator(BaseStandingsGenerator):
     }
 
     tournament_field = 'tournament'
+    metrics_relation = 'teamroundmetrics'
@@ -0,0 +1,122 @@
+import logging
+import unittest
+from unittest.mock import patch
+
+from django.test import TestCase, TransactionTestCase
+
+from participants.models import Speaker
+from results.models import BallotSubmission
+from tournaments.models import Tournament
+from utils.tests import CompletedTournamentTestMixin, suppress_logs
+
+from ..materialized import _add, _max, _save_metrics, accumulate, get_metrics_round, rebuild_metrics
+from ..models import MetricsState
+from ..speakers import SpeakerStandingsGenerator
+from ..teams import TeamStandingsGenerator
+
+
+class TestAccumulate(unittest.TestCase):
+
+    def test_accumulate(self):
+        results = [
+            {'entity': 1, 'round': 10, 'total': 75.0, 'count': 1, 'highest': 75.0},
+            {'entity': 1, 'round': 12, 'total': None, 'count': 0, 'highest': None},
+            {'entity': 2, 'round': 11, 'total': 70.0, 'count': 1, 'highest': 70.0},
+            {'entity': 1, 'round': 11, 'total': 77.0, 'count': 1, 'highest': 77.0},
+        ]
+        fields = {'total': _add, 'count': _add, 'highest': _max}
+        initial = {'total': None, 'count': 0, 'highest': None}
+        cumulative = accumulate(results, [1, 2, 3], [10, 11, 12], fields, initial)
+
+        self.assertEqual(len(cumulative), 9)
+        self.assertEqual(cumulative[(1, 10)], {'total': 75.0, 'count': 1, 'highest': 75.0})
+        self.assertEqual(cumulative[(1, 12)], {'total': 152.0, 'count': 2, 'highest': 77.0})
+        self.assertEqual(cumulative[(2, 10)], initial)
+        self.assertEqual(cumulative[(2, 12)], {'total': 70.0, 'count': 1, 'highest': 70.0})
+        self.assertEqual(cumulative[(3, 12)], initial)
+
+
+class TestMaterializedStandings(CompletedTournamentTestMixin, TestCase):
+    """Checks that standings from round metrics are the same as standings
+    aggregated from scores."""
+
+    team_metrics = ('points', 'wins', 'speaks_sum', 'speaks_avg', 'speaks_stddev', 'margin_sum',
+                    'margin_avg', 'num_adjs', 'firsts', 'seconds', 'thirds', 'num_iron',
+                    'draw_strength', 'draw_strength_speaks')
+    speaker_metrics = ('total', 'average', 'trimmed_mean', 'stdev', 'count', 'srank')
+    reply_metrics = ('replies_sum', 'replies_avg', 'replies_stddev', 'replies_count')
+
+    def get_metrics(self, generator, queryset, round):
+        with suppress_logs('standings.metrics', logging.INFO):
+            standings = generator.generate(queryset, round=round)
+        return {info.instance_id: (info.metrics, info.rankings) for info in standings}
+
+    def assertMetricsEqual(self, actual, expected):  # noqa: N802
+        self.assertEqual(actual.keys(), expected.keys())
+        for instance_id, (metrics, rankings) in expected.items():
+            self.assertEqual(actual[instance_id][1], rankings)
+            for key, value in metrics.items():
+                if isinstance(value, float):
+                    self.assertAlmostEqual(actual[instance_id][0][key], value)
+                else:
+                    self.assertEqual(actual[instance_id][0][key], value)
+
+    def check_materialized(self, generator, queryset, round):
+        MetricsState.objects.filter(tournament=self.tournament).delete()
+        expected = self.get_metrics(generator, queryset, round)
+        rebuild_metrics(self.tournament)
+        self.assertIsNotNone(get_metrics_round(self.tournament, round))
+        actual = self.get_metrics(generator, queryset, round)
+        self.assertMetricsEqual(actual, expected)
+        return actual
+
+    def test_teams(self):
+        generator = TeamStandingsGenerator(self.team_metrics, ('rank',))
+        for round in self.tournament.round_set.all():
+            with self.subTest(round=round.seq):
+                metrics = self.check_materialized(generator, self.tournament.team_set.all(), round)
+                for team_metrics, rankings in metrics.values():
+                    self.assertIsInstance(team_metrics['draw_strength'], int)
+
+    def test_speakers(self):
+        speakers = Speaker.objects.filter(team__tournament=self.tournament)
+        for metrics in [self.speaker_metrics, self.reply_metrics]:
+            generator = SpeakerStandingsGenerator(metrics, ('rank',))
+            for round in self.tournament.round_set.all():
+                with self.subTest(metrics=metrics, round=round.seq):
+                    self.check_materialized(generator, speakers, round)
+
+    def test_not_current(self):
+        rebuild_metrics(self.tournament)
+        round = self.tournament.round_set.get(seq=2)
+        self.assertEqual(get_metrics_round(self.tournament, round), round.id)
+        self.tournament.preferences['debate_rules__substantive_speakers'] += 1
+        self.assertIsNone(get_metrics_round(Tournament.objects.get(pk=self.tournament.pk), round))
+
+    def test_unconfirm_ballot(self):
+        rebuild_metrics(self.tournament)
+        generator = TeamStandingsGenerator(('points', 'speaks_sum'), ('rank',))
+        round = self.tournament.round_set.get(seq=4)
+        ballot = BallotSubmission.objects.filter(debate__round=round, confirmed=True).first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ballot.confirmed = False
+            ballot.save()
+        self.assertIsNotNone(get_metrics_round(self.tournament, round))
+        actual = self.get_metrics(generator, self.tournament.team_set.all(), round)
+
+        MetricsState.objects.filter(tournament=self.tournament).delete()
+        self.assertMetricsEqual(actual, self.get_metrics(generator, self.tournament.team_set.all(), round))
+
+
+class TestMaterializedStandingsUpdates(CompletedTournamentTestMixin, TransactionTestCase):
+    """Checks how often metrics are updated when results are saved. This needs
+    real commits, since in a TestCase, every change is in one transaction."""
+
+    def test_one_update_per_ballot(self):
+        rebuild_metrics(self.tournament)
+        ballot = BallotSubmission.objects.filter(debate__round__tournament=self.tournament,
+                debate__round__seq=4, confirmed=True).first()
+        with patch('standings.materialized._save_metrics', wraps=_save_metrics) as save_metrics:
+            ballot.result.save()
+        save_metrics.assert_called_once()
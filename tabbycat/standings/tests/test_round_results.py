@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from results.models import BallotSubmission, TeamScore
+from utils.tests import CompletedTournamentTestMixin
+
+from ..round_results import add_team_round_results_public, RESULTS_MATRIX_KEY
+
+
+class TestTeamRoundResults(CompletedTournamentTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.delete(RESULTS_MATRIX_KEY % self.tournament.id)
+
+    def test_results_match_scores(self):
+        teams = list(self.tournament.team_set.prefetch_related('speaker_set'))
+        rounds = list(self.tournament.prelim_rounds().order_by('seq'))
+        add_team_round_results_public(teams, rounds)
+
+        for team in teams:
+            for round, ts in zip(rounds, team.round_results):
+                expected = TeamScore.objects.filter(ballot_submission__confirmed=True,
+                    debate_team__team=team, debate_team__debate__round=round).select_related('debate_team').first()
+                if expected is None:
+                    self.assertIsNone(ts)
+                    continue
+                self.assertEqual((ts.points, ts.win, ts.score), (expected.points, expected.win, expected.score))
+                self.assertEqual(ts.debate_team.side, expected.debate_team.side)
+                self.assertEqual(ts.debate_team.debate_id, expected.debate_team.debate_id)
+                self.assertEqual(ts.debate_team.opponent.team, expected.debate_team.opponent.team)
+
+    def test_unconfirm_ballot(self):
+        teams = list(self.tournament.team_set.all())
+        round = self.tournament.prelim_rounds().order_by('seq').last()
+        add_team_round_results_public(teams, [round])
+        self.assertIsNotNone(cache.get(RESULTS_MATRIX_KEY % self.tournament.id))
+        with self.assertNumQueries(0):
+            add_team_round_results_public(teams, [round])
+
+        ballot = BallotSubmission.objects.filter(debate__round=round, confirmed=True).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            ballot.confirmed = False
+            ballot.save()
+        self.assertIsNone(cache.get(RESULTS_MATRIX_KEY % self.tournament.id))
+
+        add_team_round_results_public(teams, [round])
+        for team in teams:
+            if ballot.debate.debateteam_set.filter(team=team).exists():
+                self.assertIsNone(team.round_results[0])
@@ -1,5 +1,7 @@
 import logging
+import unittest
 
+import numpy as np
 from django.test import TestCase
 
 from adjallocation.models import DebateAdjudicator
@@ -12,7 +14,7 @@ from utils.tests import suppress_logs
 from venues.models import Venue
 
 from ..base import StandingsError
-from ..teams import TeamStandingsGenerator
+from ..teams import sum_over_opponents, TeamStandingsGenerator
 
 
 class TestTrivialStandings(TestCase):
@@ -115,6 +117,9 @@ class TestTrivialStandings(TestCase):
     def test_draw_strength(self):
         # losing team has faced winning team twice, so draw strength is 2 * 2 = 4
         self._base_metric_test({'draw_strength': [0, 4]})
+        standings = self.get_standings(TeamStandingsGenerator(('draw_strength',), ()))
+        for team in [self.team1, self.team2]:
+            self.assertIsInstance(standings.get_standing(team).metrics['draw_strength'], int)
 
     def test_draw_strength_speaks(self):
         # teams have faced each other twice, so draw strength is twice opponent's score
@@ -386,3 +391,27 @@ class TestMissingStandings(TestCase):
         standings = self.get_standings(generator)
         self.assertEqual(standings.get_standing(self.team1).metrics['num_adjs'], 0)
         self.assertEqual(standings.get_standing(self.team2).metrics['num_adjs'], 0)
+
+
+class TestSumOverOpponents(unittest.TestCase):
+
+    def test_sum_over_opponents(self):
+        # Team 1 faced team 2 twice and team 3 once; team 2 faced team 1
+        # twice; team 3 has no metric
+        team_ids = np.array([1, 1, 1, 2, 2])
+        opponent_ids = np.array([2, 3, 2, 1, 1])
+        values = {1: 4.0, 2: 1.5, 3: None}
+        self.assertEqual(sum_over_opponents(team_ids, opponent_ids, values), {1: (3.0, 2), 2: (8.0, 2)})
+
+    def test_int_values(self):
+        team_ids = np.array([1, 1, 2])
+        opponent_ids = np.array([2, 3, 1])
+        values = {1: 4, 2: 1, 3: None}
+        sums = sum_over_opponents(team_ids, opponent_ids, values)
+        self.assertEqual(sums, {1: (1, 1), 2: (4, 1)})
+        for total, count in sums.values():
+            self.assertIsInstance(total, int)
+
+    def test_no_opponents(self):
+        empty = np.array([], dtype=int)
+        self.assertEqual(sum_over_opponents(empty, empty, {}), {})
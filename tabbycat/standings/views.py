@@ -444,8 +444,7 @@ class BaseTeamStandingsView(BaseStandingsView):
         self.limit_rank_display(standings)
 
         rounds = self.get_rounds()
-        opponents = self.tournament.pref('teams_in_debate') == 2
-        add_team_round_results(standings, rounds, opponents=opponents)
+        add_team_round_results(standings, rounds)
         self.populate_result_missing(standings)
 
         return standings, rounds
@@ -591,8 +590,7 @@ class PublicCurrentTeamStandingsView(PublicTournamentPageMixin, VueTableTemplate
 
         # Can't use prefetch.populate_win_counts, since that doesn't exclude
         # silent rounds and future rounds appropriately
-        opponents = self.tournament.pref('teams_in_debate') == 2
-        add_team_round_results_public(teams, rounds, opponents=opponents)
+        add_team_round_results_public(teams, rounds)
 
         # Pre-sort, as Vue tables can't do two sort keys
         teams = sorted(teams, key=lambda t: (-t.points, getattr(t, name_attr)))
@@ -17,6 +17,8 @@ export const useDragAndDropStore = defineStore('dragAndDrop', {
     wsBridge: null,
     wsPseudoComponentID: null,
     lastSaved: null,
+    // Debates whose importance changed since the last incremental allocation
+    changedImportanceIDs: [],
     // For hover panels
     hoverSubject: null,
     hoverType: null,
@@ -284,11 +286,31 @@ export const useDragAndDropStore = defineStore('dragAndDrop', {
     updateDebatesOrPanelsAttribute(updatedDebatesOrPanels) {
       // Mutate debate/panel state to reflect the sent attributes via data like:
       // { attributeKey: [{ id: debateID, attributeKey: attributeValue ], ... }
-      Object.entries(updatedDebatesOrPanels).forEach(([, changes]) => {
+      // Note the allocations being replaced, so that the server can merge the
+      // change with others made at the same time without losing any
+      const previousAllocations = {}
+      if (updatedDebatesOrPanels.adjudicators) {
+        updatedDebatesOrPanels.adjudicators.forEach((change) => {
+          const existing = this.debatesOrPanels[change.id]
+          previousAllocations[change.id] = existing ? JSON.parse(JSON.stringify(existing.adjudicators)) : null
+        })
+      }
+      Object.entries(updatedDebatesOrPanels).forEach(([attribute, changes]) => {
         this.setDebateOrPanelAttributes(changes)
+        if (attribute === 'importance') {
+          changes.forEach((change) => {
+            if (!this.changedImportanceIDs.includes(change.id)) {
+              this.changedImportanceIDs.push(change.id)
+            }
+          })
+        }
       })
       // Send the result over the websocket, like:
       // "importance": [{ "id": 71, "importance": "0"} ], "componentID": 1407 }
+      if (updatedDebatesOrPanels.adjudicators) {
+        updatedDebatesOrPanels.adjudicators = updatedDebatesOrPanels.adjudicators.map(
+          change => ({ ...change, previous: previousAllocations[change.id] }))
+      }
       updatedDebatesOrPanels['componentID'] = this.wsPseudoComponentID
       this.wsBridge.send(updatedDebatesOrPanels)
       this.updateSaveCounter()
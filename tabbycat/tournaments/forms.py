@@ -1,5 +1,6 @@
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
+from django.db import transaction
 from django.forms import CharField, ChoiceField, DateTimeInput, Form, HiddenInput, ModelChoiceField, ModelForm
 from django.forms.fields import IntegerField, NumberInput
 from django.forms.models import ModelChoiceIterator
@@ -8,6 +9,7 @@ from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 from django_summernote.widgets import SummernoteWidget
 
+from adjallocation.preformed.anticipated import invalidate_anticipated_draws
 from adjfeedback.models import AdjudicatorFeedbackQuestion
 from breakqual.models import BreakCategory
 from breakqual.utils import auto_make_break_rounds
@@ -293,6 +295,7 @@ class RoundWeightForm(Form):
         for round in rounds:
             round.weight = self.cleaned_data['round_weight_%d' % round.id]
         Round.objects.bulk_update(rounds, ['weight'])
+        transaction.on_commit(lambda: invalidate_anticipated_draws([self.tournament.id]))  # bulk_update() doesn't send signals
 
         return rounds
 
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0014_round_motions_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='draw_profile',
+            field=models.JSONField(blank=True, editable=False, help_text="Time taken and database queries run in each phase of generating this round's draw", null=True, verbose_name='draw profile'),
+        ),
+    ]
@@ -341,6 +341,9 @@ class Round(models.Model):
         verbose_name=_("motions status"),
         help_text=_("The release status of motions for this round"))
     starts_at = models.DateTimeField(verbose_name=_("starts at"), blank=True, null=True)
+    draw_profile = models.JSONField(blank=True, null=True, editable=False,
+        verbose_name=_("draw profile"),
+        help_text=_("Time taken and database queries run in each phase of generating this round's draw"))
 
     weight = models.IntegerField(default=1,
         verbose_name=_("weight"),
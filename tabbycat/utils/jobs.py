@@ -0,0 +1,211 @@
+"""A bounded process pool for CPU-heavy jobs run by worker consumers.
+
+Worker consumers (like the adjudicator allocation and venue workers) handle
+one message at a time, so a long allocation for one tournament would otherwise
+hold up every other tournament's allocations. If `WORKER_JOB_PROCESSES` is set,
+handlers decorated with `@run_in_job_pool` are instead queued in a pool of that
+many processes, and the consumer goes straight on to its next message.
+
+Queued jobs are kept in a separate queue for each tournament, and started from
+each tournament's queue in turn, with at most one job running per tournament
+at once. A job that is queued for the same round and action as a job that
+hasn't started yet replaces it, and queued jobs can be cancelled with
+`JobPool.cancel()`.
+
+Jobs run in spawned processes, so they must broadcast their results through a
+channel layer that works across processes (i.e. Redis). If
+`WORKER_JOB_PROCESSES` is 0 (the default), handlers run in the consumer as
+usual.
+"""
+
+import logging
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import wraps
+from importlib import import_module
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.translation import gettext as _, ngettext
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    def __init__(self, tournament_id, key, func, args, on_error=None):
+        self.tournament_id = tournament_id
+        self.key = key  # jobs with the same key replace each other while queued
+        self.func = func
+        self.args = args
+        self.on_error = on_error  # called with the exception if the job raises one
+
+    def __repr__(self):
+        return "<Job %s for tournament %s>" % (self.key, self.tournament_id)
+
+
+class JobPool:
+    """Runs jobs in a bounded pool of processes, taking turns between
+    tournaments. Callbacks run in a thread of the parent process."""
+
+    def __init__(self, max_processes, max_queued_per_tournament=10):
+        self.max_processes = max_processes
+        self.max_queued_per_tournament = max_queued_per_tournament
+        self._executor = None
+        self._lock = threading.RLock()  # a future that's already done runs its callback straight away
+        self._queues = OrderedDict()  # tournament ID: deque of jobs
+        self._running = {}  # tournament ID: job
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_processes,
+                    mp_context=get_context('spawn'), initializer=django.setup)
+        return self._executor
+
+    def _reset_executor(self, executor):
+        """Discards `executor` if it's still the current one, so that the next
+        job starts a new one. A process pool is broken for good once one of its
+        processes dies, and it shuts itself down. Must be called with the lock
+        held."""
+        if self._executor is executor:
+            logger.warning("Job pool is broken, starting a new one for later jobs")
+            self._executor = None
+
+    def submit(self, job):
+        """Queues `job`, replacing any queued job of the same tournament and key.
+        Returns the number of jobs that must finish or start before it, or None
+        if the tournament already has too many jobs queued."""
+        with self._lock:
+            queue = self._queues.setdefault(job.tournament_id, deque())
+            for queued in list(queue):
+                if queued.key == job.key:
+                    logger.info("Replacing queued %r", queued)
+                    queue.remove(queued)
+            if len(queue) >= self.max_queued_per_tournament:
+                return None
+
+            queue.append(job)
+            failed = self._dispatch()
+            if self._running.get(job.tournament_id) is job:
+                ahead = 0
+            elif job in self._queues.get(job.tournament_id, ()):
+                ahead = len(self._running) + self._queues[job.tournament_id].index(job)
+            else:
+                ahead = 0  # failed to start, and reported below
+
+        self._report(failed)
+        return ahead
+
+    def cancel(self, tournament_id, condition=None):
+        """Removes queued jobs of the given tournament, or only those for which
+        `condition(job)` is true, and returns the number removed. Jobs that have
+        already started run to completion."""
+        with self._lock:
+            queue = self._queues.get(tournament_id)
+            if not queue:
+                return 0
+            cancelled = [job for job in queue if condition is None or condition(job)]
+            for job in cancelled:
+                queue.remove(job)
+            if not queue:
+                del self._queues[tournament_id]
+            logger.info("Cancelled %d queued jobs for tournament %s", len(cancelled), tournament_id)
+            return len(cancelled)
+
+    def _dispatch(self):
+        """Starts queued jobs while there are free processes. Must be called
+        with the lock held. Returns a list of `(job, exception)` tuples for
+        jobs that couldn't be started, which the caller should pass to
+        `_report()` once it has released the lock."""
+        failed = []
+        for tournament_id in list(self._queues):
+            if len(self._running) >= self.max_processes:
+                break
+            if tournament_id in self._running:
+                continue
+            queue = self._queues.pop(tournament_id)
+            job = queue.popleft()
+            if queue:
+                self._queues[tournament_id] = queue  # moves to the back, so other tournaments go first
+
+            logger.info("Starting %r", job)
+            executor = self._get_executor()
+            try:
+                future = executor.submit(job.func, *job.args)
+            except (BrokenProcessPool, RuntimeError) as e:
+                self._reset_executor(executor)
+                failed.append((job, e))
+                continue
+            self._running[tournament_id] = job
+            future.add_done_callback(lambda future, job=job, executor=executor: self._done(job, executor, future))
+        return failed
+
+    def _done(self, job, executor, future):
+        exception = future.exception()
+        with self._lock:
+            del self._running[job.tournament_id]
+            if isinstance(exception, BrokenProcessPool):
+                self._reset_executor(executor)
+            failed = self._dispatch()
+
+        self._report([(job, exception)] if exception is not None else [])
+        self._report(failed)
+
+    def _report(self, failed):
+        for job, exception in failed:
+            logger.error("Error in %r", job, exc_info=exception)
+            if job.on_error is not None:
+                job.on_error(exception)
+
+
+_pool = None
+
+
+def get_job_pool():
+    """Returns the job pool for this process, or None if jobs should run in
+    the consumer."""
+    global _pool
+    if _pool is None and settings.WORKER_JOB_PROCESSES > 0:
+        _pool = JobPool(settings.WORKER_JOB_PROCESSES)
+    return _pool
+
+
+def _run_handler(module_name, class_name, handler_name, event):
+    """Runs a consumer's handler in a pool process."""
+    consumer_class = getattr(import_module(module_name), class_name)
+    handler = getattr(consumer_class, handler_name).__wrapped__
+    try:
+        handler(consumer_class(), event)
+    finally:
+        close_old_connections()
+
+
+def run_in_job_pool(handler):
+    """Decorator for handlers of worker consumers that use
+    `EditDebateOrPanelWorkerMixin`, which runs the handler in the job pool if
+    there is one. Jobs are keyed by handler and round, so a repeated request
+    replaces one that hasn't started yet."""
+
+    @wraps(handler)
+    def wrapper(self, event):
+        pool = get_job_pool()
+        if pool is None:
+            return handler(self, event)
+
+        extra = event['extra']
+        job = Job(extra['tournament_id'], (handler.__name__, extra['round_id']), _run_handler,
+                  (type(self).__module__, type(self).__name__, handler.__name__, event),
+                  on_error=lambda e: self.return_error(extra['group_name'], str(e)))
+        ahead = pool.submit(job)
+        if ahead is None:
+            self.return_error(extra['group_name'],
+                _("There are too many jobs queued for this tournament. Try again once they have finished."))
+        elif ahead > 0:
+            self.return_message(extra['group_name'], ngettext(
+                "Waiting for %(count)d other job to finish first.",
+                "Waiting for %(count)d other jobs to finish first.", ahead) % {'count': ahead}, 'info')
+
+    return wrapper
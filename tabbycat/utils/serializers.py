@@ -1,5 +1,6 @@
 import time
 
+from django.db.models import prefetch_related_objects, QuerySet
 from rest_framework import serializers
 from rest_framework.renderers import JSONRenderer
 
@@ -15,6 +16,18 @@ def django_rest_json_render(data):
     return bytes.decode(JSONRenderer().render(data))
 
 
+def prefetch_for_serializer(serializer_class, instances):
+    """Prefetches what `serializer_class` needs to serialize `instances`, so
+    that serializing them takes a fixed number of queries. `instances` may be
+    a queryset, in which case a new queryset is returned, or a list, which is
+    populated in place and returned."""
+    lookups = serializer_class.prefetch_lookups()
+    if isinstance(instances, QuerySet):
+        return instances.prefetch_related(*lookups)
+    prefetch_related_objects(instances, *lookups)
+    return instances
+
+
 class VueDraggableItemMixin(serializers.Serializer):
     """ Provides properties that the front end sets for draggable items """
     vue_is_locked = serializers.BooleanField(default=False)
@@ -62,6 +75,26 @@ class DebateSerializerMixin(serializers.ModelSerializer):
     round_name = serializers.SerializerMethodField(read_only=True)
     round_id = serializers.SerializerMethodField(read_only=True)
 
+    # Lookups that each field needs prefetched; subclasses that represent
+    # related objects differently should override the relevant entries
+    field_prefetches = {
+        'venue': ('venue__venuecategory_set',),
+        'teams': ('debateteam_set__team',),
+        'adjudicators': ('debateadjudicator_set__adjudicator',),
+        'round_seq': ('round',),
+        'round_name': ('round',),
+    }
+
+    @classmethod
+    def prefetch_lookups(cls):
+        """Returns the lookups to prefetch for the fields in `Meta.fields`."""
+        lookups = []
+        for field in cls.Meta.fields:
+            for lookup in cls.field_prefetches.get(field, ()):
+                if lookup not in lookups:
+                    lookups.append(lookup)
+        return lookups
+
     def adjudicator_representation(self, debate_or_panel_adj):
         return AdjudicatorSerializer(debate_or_panel_adj.adjudicator).data
 
@@ -95,7 +128,7 @@ class DebateSerializerMixin(serializers.ModelSerializer):
         return obj.round.name
 
     def get_round_id(self, obj):
-        return obj.round.id
+        return obj.round_id
 
     class Meta:
         model = Debate
@@ -431,7 +431,7 @@ class TabbycatTableBuilder(BaseTableBuilder):
         if not hasattr(ts, 'debate_team'):
             return {'text': self.BLANK_TEXT}
 
-        other_teams = {dt.side: self._team_short_name(dt.team) for dt in ts.debate_team.debate.debateteam_set.all()}
+        other_teams = {dt.side: self._team_short_name(dt.team) for dt in ts.debate_team.debate.debateteams}
         n_teams = max(other_teams.keys()) + 1
         other_team_strs = [_("Teams in debate:")]
         for side in range(n_teams):
@@ -1,177 +1,166 @@
 import itertools
 import logging
-import random
 
+import numpy as np
+from django.contrib.contenttypes.models import ContentType
 from django.db.models import Q
+from scipy.optimize import linear_sum_assignment
 
 from draw.models import Debate
 from draw.types import DebateSide
+from participants.models import Adjudicator, Institution, Team
 
-from .models import VenueConstraint
+from .models import VenueCategory, VenueConstraint
 
 logger = logging.getLogger(__name__)
 
 
 def allocate_venues(round, debates=None):
+    """Allocates venues to debates, and returns the debates whose venue
+    changed."""
     allocator = VenueAllocator()
-    allocator.allocate(round, debates)
+    return allocator.allocate(round, debates)
 
 
 class VenueAllocator:
     """Allocates venues in a draw to satisfy, as best it can, applicable venue
     constraints.
 
-    The algorithm naïvely allocates from the debate with the highest-priority
-    constraint to the debate with the lowest-priority constraint, choosing at
-    random if more than one is available. This isn't guaranteed to be optimal,
-    since a flexible high-priority debate might randomly choose a room demanded
-    by a picky low-priority room.
+    The allocation is solved as a single assignment problem between debates
+    and venues. Each subject (team, adjudicator or institution) in a debate
+    that has constraints adds to the cost of each venue according to the
+    highest-priority constraint that the venue meets: nothing if it meets the
+    subject's highest-priority constraint, and the full weight of that
+    constraint if it meets none. Weights grow with priority fast enough that
+    each priority level takes precedence over all lower levels combined.
+
+    Venues that aren't among the highest-priority venues (as many as there are
+    debates) cost a little more, and a small random cost breaks ties, so that
+    unconstrained debates are given the preferred venues at random.
     """
 
     def allocate(self, round, debates=None):
         if debates is None:
             debates = round.debate_set_with_prefetches(speakers=False, institutions=True, filter_args=[~Q(debateteam__side=DebateSide.BYE)])
-        self._all_venues = list(round.active_venues.order_by('-priority'))
-        self._preferred_venues = self._all_venues[:len(debates)]
+        debates = list(debates)
+        venues = list(round.active_venues.order_by('-priority'))
 
-        # take note of how many venues we expect to be short by (for error checking)
-        self._venue_shortage = max(0, len(debates) - len(self._all_venues))
+        if len(debates) > len(venues):
+            logger.warning("There are %d debates but only %d venues", len(debates), len(venues))
 
-        debate_constraints = self.collect_constraints(debates)
-        debate_venues = self.allocate_constrained_venues(debate_constraints)
+        groups = self.collect_constraints(debates)
+        membership = self.category_membership(groups, venues)
+        constraint_costs = self.constraint_costs(groups, membership, len(debates), len(venues))
+        costs = constraint_costs + self.preference_costs(len(debates), len(venues))
 
-        unconstrained_debates = [d for d in debates if d not in debate_venues]
-        unconstrained_venues = self.allocate_unconstrained_venues(unconstrained_debates)
-        debate_venues.update(unconstrained_venues)
+        debate_venues = {debate: None for debate in debates}
+        if debates and venues:
+            rows, cols = linear_sum_assignment(costs)
+            for i, j in zip(rows, cols):
+                debate_venues[debates[i]] = venues[j]
+            logger.info("Allocated venues to %d debates, with %d debates not meeting all constraints",
+                len(rows), np.count_nonzero(constraint_costs[rows, cols]))
 
-        # this set is only non-empty if there were too few venues overall
-        debates_without_venues = [d for d in debates if d not in debate_venues]
-        if len(debates_without_venues) != self._venue_shortage:
-            logger.error("Expected venue shortage %d, but %d debates without venues",
-                self._venue_shortage, len(debates_without_venues))
-        debate_venues.update({debate: None for debate in debates_without_venues})
-
-        self.save_venues(debate_venues)
+        return self.save_venues(debate_venues)
 
     def collect_constraints(self, debates):
-        """Returns a list of tuples `(debate, constraints)`, where `constraints`
-        is a list of constraints. Each list of constraints is sorted by
-        descending order of priority. Debates with no constraints are omitted
-        from the dict, so each list of constraints is guaranteed not to be
-        empty.
+        """Returns a list of tuples `(index, constraints)`, one for each subject
+        of each debate that has constraints, where `index` is the index of the
+        debate in `debates` and `constraints` is a list of tuples
+        `(priority, category_id)`, sorted by descending order of priority.
 
-        The constraints for each debate are just all the venue constraints
-        relating to the teams, adjudicators, and institutions of the debate."""
+        The subjects of each debate are its teams, its adjudicators and the
+        institutions of its teams."""
 
-        all_constraints = {}
-        for vc in VenueConstraint.objects.filter_for_debates(debates).prefetch_related('subject'):
-            all_constraints.setdefault(vc.subject, []).append(vc)
+        team_ct = ContentType.objects.get_for_model(Team).id
+        adj_ct = ContentType.objects.get_for_model(Adjudicator).id
+        inst_ct = ContentType.objects.get_for_model(Institution).id
 
-        debate_constraints = []
+        all_constraints = {}
+        for ct_id, subject_id, priority, category_id in VenueConstraint.objects.filter_for_debates(
+                debates).values_list('subject_content_type_id', 'subject_id', 'priority', 'category_id'):
+            all_constraints.setdefault((ct_id, subject_id), []).append((priority, category_id))
 
-        for debate in debates:
+        groups = []
+        for i, debate in enumerate(debates):
             subjects = itertools.chain(
-                debate.teams,
-                debate.adjudicators.all(),
-                [team.institution for team in debate.teams],
+                [(team_ct, team.id) for team in debate.teams],
+                [(adj_ct, adj.id) for adj in debate.adjudicators.all()],
+                [(inst_ct, team.institution_id) for team in debate.teams],
             )
-            constraints = [vc for subject in subjects for vc in all_constraints.get(subject, [])]
-
-            if len(constraints) > 0:
-                constraints.sort(key=lambda x: x.priority, reverse=True)
-                debate_constraints.append((debate, constraints))
-                logger.info("Constraints on %s: %s", debate, constraints)
-
-        debate_constraints.sort(key=lambda x: x[1][0].priority, reverse=True)
-
-        return debate_constraints
-
-    def allocate_constrained_venues(self, debate_constraints):
-        """Allocates venues for debates that have one or more constraints on
-        them. `debate_constraints` should be
-
-        For each debate, it finds the set of venues that meet all its
-        constraints, or if that set is empty, then it satisfies as many
-        constraints as it can, with higher-priority constraints taking absolute
-        precedence over lower-priority constraints. It then chooses a random
-        venue from the preferred venues in that set, or if there are no
-        preferred venues, then from all venues in that set.
-
-        It runs through debates in descending order of priority, where the
-        priority of a debate is the priority of its highest-priority constraint.
-        """
-
-        debate_venues = dict()
-
-        while len(debate_constraints) > 0:
-            debate, constraints = debate_constraints.pop(0)
-
-            highest_constraint = constraints.pop(0)
-            eligible_venues = set(highest_constraint.category.venues.all()) & set(self._all_venues)
-
-            # If we can't fulfil the highest constraint, bump it down the list.
-            if len(eligible_venues) == 0:
-                logger.debug("Unfulfilled (highest): %s", highest_constraint)
-                if len(constraints) == 0:
-                    logger.debug("%s is now unconstrained", debate)
-                    continue  # Failed all constraints, debate is now unconstrained
-                new_priority = constraints[0].priority
-                for i, dc in enumerate(debate_constraints):
-                    if new_priority >= dc[1][0].priority:
-                        break
-                else:
-                    i = 0
-                debate_constraints.insert(i, (debate, constraints))
-                continue
-
-            # If we get this far, we have at least one eligible venue.
-
-            # Find the set of eligible venues satisfying the best set of constraints.
-            satisified_constraints = []
-            for constraint in constraints:
-                if any(sc.subject == constraint.subject for sc in satisified_constraints):
-                    continue  # Skip if we've already done a constraint for this subject
-                constraint_venues = set(constraint.category.venues.all())
-                if eligible_venues.isdisjoint(constraint_venues):
-                    logger.debug("Unfilfilled: %s", constraint)
-                else:
-                    eligible_venues &= constraint_venues
-                    satisified_constraints.append(constraint)
-
-            # If no eligible venues are preferred venues, drop the last preferred venue.
-            preferred_venues = set(self._preferred_venues)
-            if eligible_venues.isdisjoint(preferred_venues):
-                logger.debug("No preferred venues available: %s", debate)
-                self._preferred_venues = self._preferred_venues[:-1]
-            else:
-                eligible_venues &= preferred_venues
-
-            # Finally, assign the venue.
-            venue = random.choice(list(eligible_venues))
-            debate_venues[debate] = venue
-            self._all_venues.remove(venue)
-            if venue in self._preferred_venues:
-                self._preferred_venues.remove(venue)
-            logger.debug("Assigning %s to %s", venue, debate)
-
-        return debate_venues
-
-    def allocate_unconstrained_venues(self, debates):
-        """Allocates unconstrained venues by randomly shuffling the remaining
-        preferred venues."""
-
-        if len(debates) - len(self._preferred_venues) != self._venue_shortage:
-            logger.error("preferred venues to unconstrained debates mismatch: "
-                "%s preferred venues, %d debates", len(self._preferred_venues), len(debates))
-            # we'll still keep going, since zip() stops at the end of the shorter list
-        elif len(debates) != len(self._preferred_venues):
-            logger.warning("%s preferred venues, %d debates, matches expected venue shortage %s",
-                len(self._preferred_venues), len(debates), self._venue_shortage)
-
-        random.shuffle(debates)
-        return {debate: venue for debate, venue in zip(debates, self._preferred_venues)}
+            for subject in subjects:
+                if subject in all_constraints:
+                    groups.append((i, sorted(all_constraints[subject], reverse=True)))
+
+        logger.info("%d constraints for %d subjects", sum(len(c) for i, c in groups), len(groups))
+        return groups
+
+    def category_membership(self, groups, venues):
+        """Returns a dict mapping the ID of each category in `groups` to a
+        boolean array, `True` where the venue in `venues` is in the category."""
+        category_ids = {category_id for i, constraints in groups for priority, category_id in constraints}
+        venue_indices = {venue.id: j for j, venue in enumerate(venues)}
+        membership = {category_id: np.zeros(len(venues), dtype=bool) for category_id in category_ids}
+        for category_id, venue_id in VenueCategory.venues.through.objects.filter(
+                venuecategory_id__in=category_ids).values_list('venuecategory_id', 'venue_id'):
+            if venue_id in venue_indices:
+                membership[category_id][venue_indices[venue_id]] = True
+        return membership
+
+    def constraint_weights(self, groups):
+        """Returns a dict mapping each priority to the weight of constraints of
+        that priority. Weights are powers of one more than the number of
+        subjects, so that each level outweighs all lower levels combined."""
+        priorities = sorted({priority for i, constraints in groups for priority, category_id in constraints})
+        base = float(len(groups) + 1)
+        if len(priorities) * np.log10(base) > 200:
+            logger.warning("Too many priority levels (%d) for exact precedence; using ranks as weights", len(priorities))
+            return {priority: float(k + 1) for k, priority in enumerate(priorities)}
+        return {priority: base ** k for k, priority in enumerate(priorities)}
+
+    def constraint_costs(self, groups, membership, ndebates, nvenues):
+        """Returns an array of shape `(ndebates, nvenues)` of the costs of
+        constraints not met by each venue."""
+        costs = np.zeros((ndebates, nvenues))
+        if not groups:
+            return costs
+
+        weights = self.constraint_weights(groups)
+        group_debates = []
+        group_starts = []
+        constraint_weights = []
+        constraint_members = []
+        for i, constraints in groups:
+            group_debates.append(i)
+            group_starts.append(len(constraint_weights))
+            for priority, category_id in constraints:
+                constraint_weights.append(weights[priority])
+                constraint_members.append(membership[category_id])
+
+        constraint_weights = np.array(constraint_weights)
+        met = np.array(constraint_members).reshape(len(constraint_weights), nvenues)
+        best_met = np.maximum.reduceat(np.where(met, constraint_weights[:, None], 0.0), group_starts, axis=0)
+        highest = np.maximum.reduceat(constraint_weights, group_starts)
+        np.add.at(costs, group_debates, highest[:, None] - best_met)
+        return costs
+
+    def preference_costs(self, ndebates, nvenues):
+        """Returns an array of small costs that favour the highest-priority
+        venues, with random tie-breaking. Venues must be in descending order of
+        priority. Added up over all debates, these are less than the cost of
+        any constraint."""
+        costs = np.zeros((ndebates, nvenues))
+        costs[:, ndebates:] = 1 / (ndebates + 1)
+        costs += np.random.random((ndebates, nvenues)) / (ndebates + 1) ** 2
+        return costs
 
     def save_venues(self, debate_venues):
+        """Saves the venues of debates whose venue changed, and returns those
+        debates."""
+        changed = []
         for debate, venue in debate_venues.items():
-            debate.venue = venue
-        Debate.objects.bulk_update(debate_venues.keys(), ['venue'])
+            if debate.venue_id != (venue.id if venue is not None else None):
+                debate.venue = venue
+                changed.append(debate)
+        Debate.objects.bulk_update(changed, ['venue'])
+        return changed
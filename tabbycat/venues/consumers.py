@@ -3,6 +3,7 @@ from django.utils.translation import gettext as _
 from actionlog.models import ActionLogEntry
 from draw.consumers import EditDebateOrPanelWorkerMixin
 from tournaments.models import Round
+from utils.jobs import run_in_job_pool
 
 from .allocator import allocate_venues
 from .serializers import SimpleDebateVenueSerializer
@@ -10,6 +11,7 @@ from .serializers import SimpleDebateVenueSerializer
 
 class VenuesWorkerConsumer(EditDebateOrPanelWorkerMixin):
 
+    @run_in_job_pool
     def allocate_debate_venues(self, event):
         round = Round.objects.get(pk=event['extra']['round_id'])
         group = event['extra']['group_name']
@@ -21,9 +23,9 @@ class VenuesWorkerConsumer(EditDebateOrPanelWorkerMixin):
             self.return_error(group, _("Draw is not confirmed, confirm draw to assign rooms."))
             return
 
-        allocate_venues(round)
+        changed = allocate_venues(round)
         self.log_action(event['extra'], round, ActionLogEntry.ActionType.VENUES_AUTOALLOCATE)
 
-        content = self.reserialize_debates(SimpleDebateVenueSerializer, round)
+        content = self.reserialize_debates(SimpleDebateVenueSerializer, round, changed)
         msg = _("Successfully auto-allocated rooms to debates.")
         self.return_response(content, group, msg, 'success')
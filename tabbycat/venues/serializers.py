@@ -8,9 +8,13 @@ class EditDebateVenuesDebateSerializer(DebateSerializerMixin):
     # Only need the PK of the venues as they are fetched separately
     venue = serializers.PrimaryKeyRelatedField(read_only=True)
 
+    field_prefetches = {
+        **DebateSerializerMixin.field_prefetches,
+        'venue': (),
+    }
 
-class SimpleDebateVenueSerializer(DebateSerializerMixin):
-    venue = serializers.PrimaryKeyRelatedField(read_only=True)
+
+class SimpleDebateVenueSerializer(EditDebateVenuesDebateSerializer):
 
     class Meta:
         model = DebateSerializerMixin.Meta.model
@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+from django.test import TestCase
+from scipy.optimize import linear_sum_assignment
+
+from utils.tests import CompletedTournamentTestMixin
+
+from ..allocator import allocate_venues, VenueAllocator
+from ..models import VenueCategory, VenueConstraint
+
+
+class TestVenueAllocatorCosts(unittest.TestCase):
+
+    def setUp(self):
+        self.allocator = VenueAllocator()
+        # Five venues; category 1 is venues 0 and 1, category 2 is venue 1,
+        # category 3 is venue 4
+        self.membership = {
+            1: np.array([True, True, False, False, False]),
+            2: np.array([False, True, False, False, False]),
+            3: np.array([False, False, False, False, True]),
+        }
+
+    def test_constraint_costs(self):
+        groups = [
+            (0, [(10, 2), (5, 1)]),  # prefers venue 1, but venue 0 will do
+            (2, [(5, 3)]),
+        ]
+        costs = self.allocator.constraint_costs(groups, self.membership, 3, 5)
+        weights = self.allocator.constraint_weights(groups)
+        self.assertEqual(weights, {5: 1.0, 10: 3.0})
+        np.testing.assert_array_equal(costs, [
+            [2.0, 0.0, 3.0, 3.0, 3.0],
+            [0.0, 0.0, 0.0, 0.0, 0.0],
+            [1.0, 1.0, 1.0, 1.0, 0.0],
+        ])
+
+    def test_precedence(self):
+        # Debate 0 has a high-priority constraint for venue 1; debates 1 and 2
+        # both have lower-priority constraints that venue 1 would satisfy
+        groups = [
+            (0, [(10, 2)]),
+            (1, [(1, 2)]),
+            (2, [(1, 2)]),
+        ]
+        costs = self.allocator.constraint_costs(groups, self.membership, 3, 5)
+        costs += self.allocator.preference_costs(3, 5)
+        rows, cols = linear_sum_assignment(costs)
+        self.assertEqual(dict(zip(rows, cols))[0], 1)
+
+    def test_preference_costs(self):
+        costs = self.allocator.preference_costs(4, 6)
+        self.assertTrue(np.all(costs[:, :4] < costs[:, 4:].min()))
+        self.assertLess(costs.max() * 4, 1.0)
+
+    def test_not_greedy(self):
+        # Debate 0 has the higher-priority constraint, satisfied by venues 0
+        # or 1; debate 1 can only use venue 1. A greedy allocator might give
+        # venue 1 to debate 0.
+        groups = [(0, [(10, 1)]), (1, [(5, 2)])]
+        for _ in range(10):
+            costs = self.allocator.constraint_costs(groups, self.membership, 2, 5)
+            costs += self.allocator.preference_costs(2, 5)
+            rows, cols = linear_sum_assignment(costs)
+            self.assertEqual(list(cols), [0, 1])
+
+
+class AllocateVenuesTests(CompletedTournamentTestMixin, TestCase):
+    round_seq = 4
+
+    def test_constraints_met(self):
+        venues = list(self.round.active_venues.order_by('id'))
+        debates = list(self.round.debate_set_with_prefetches(speakers=False, institutions=True))
+        category = VenueCategory.objects.create(name="Step-free", tournament=self.tournament)
+        category.venues.set(venues[:2])
+        teams = [debates[0].teams[0], debates[1].teams[0]]
+        for team in teams:
+            VenueConstraint.objects.create(category=category, priority=1, subject=team)
+
+        allocate_venues(self.round)
+        for team in teams:
+            venue = self.round.debate_set.get(debateteam__team=team).venue
+            self.assertIn(venue, venues[:2])
+
+        venue_ids = list(self.round.debate_set.filter(venue__isnull=False).values_list('venue_id', flat=True))
+        self.assertEqual(len(venue_ids), len(set(venue_ids)))